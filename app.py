@@ -1,16 +1,27 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from typing import List
+import asyncio
+import json
+import multiprocessing
 import os
-import tempfile
-import shutil
 import logging
-import numpy as np
 import time
-import librosa
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 
-# Custom modules (adjust paths as needed)
-from src.feature_extraction import count_pauses, extract_text_features, semantic_coherence
-from src.modeling import run_modeling
+from src.pipeline import (analyze_audio_bytes, prepare_upload, finish_upload, complete_features,
+                          extract_upload_features, init_scoring_worker)
+from src.batch import collect_clips, score_cohort
+from src.modeling import load_anomaly_model
+from src.model_registry import get_whisper_model, get_model_stats
+from src.transcription import WHISPER_SR, get_transcription_service
+from src.metrics import call_with_metrics, merge, observe, render_prometheus
+from src.streaming import StreamingSession
+from src.config import (WHISPER_MODEL_SIZE, API_WORKERS, API_QUEUE_SIZE, API_MAX_STREAMS, STREAM_UPDATE_SECONDS,
+                        TRANSCRIPTION_BATCHING)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,13 +29,114 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Cognitive Decline Detection API", description="Upload an audio file and optional transcript to get cognitive decline analysis.")
 
+def _start_executor():
+    """
+    Start the worker pool and wait until every worker has warmed its models.
+    Workers are spawned rather than forked, since the event loop process has threads.
+    With TRANSCRIPTION_BATCHING, Whisper runs in this process instead, so workers skip it.
+    """
+    num_threads = max(1, (os.cpu_count() or 1) // API_WORKERS)
+    model_size = None if TRANSCRIPTION_BATCHING else WHISPER_MODEL_SIZE
+    executor = ProcessPoolExecutor(max_workers=API_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_scoring_worker, initargs=(model_size, num_threads))
+    for future in [executor.submit(get_model_stats) for _ in range(API_WORKERS)]:
+        future.result()
+    return executor
+
+async def _restart_executor(broken):
+    """
+    Replace a broken worker pool (e.g. a worker was killed for memory). Requests
+    failing on the same pool at once restart it only once, and its remaining
+    processes are shut down.
+    """
+    async with app.state.executor_lock:
+        if app.state.executor is not broken:
+            return
+        logger.error("Analysis worker crashed; restarting the worker pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        app.state.executor = await asyncio.get_running_loop().run_in_executor(None, _start_executor)
+
+async def _run_in_worker(func, *args):
+    """
+    Run func(*args) in the analysis worker pool, adding the stage metrics the
+    worker recorded to this process's. A BrokenProcessPool is re-raised after the
+    pool has been replaced.
+    """
+    loop = asyncio.get_running_loop()
+    executor = app.state.executor
+    try:
+        result, worker_metrics = await loop.run_in_executor(executor, partial(call_with_metrics, func, *args))
+    except BrokenProcessPool:
+        await _restart_executor(executor)
+        raise
+    merge(worker_metrics)
+    return result
+
+async def _batched_transcription(audio):
+    """
+    Transcribe 16 kHz audio through the batching service in this process.
+    Returns:
+        tuple: Lower-cased transcript and seconds spent.
+    """
+    start = time.perf_counter()
+    text = (await asyncio.wrap_future(get_transcription_service().submit(audio))).lower()
+    elapsed = time.perf_counter() - start
+    observe('transcription', elapsed, len(audio) / WHISPER_SR)
+    return text, elapsed
+
+@app.on_event("startup")
+def load_models():
+    """
+    Start the analysis workers (each warms Whisper and the reference anomaly model)
+    and set up admission control.
+    """
+    start_time = time.time()
+    app.state.executor = _start_executor()
+    app.state.executor_lock = asyncio.Lock()
+    app.state.slots = asyncio.Semaphore(API_WORKERS)
+    app.state.pending = 0
+    app.state.streams = 0
+    # Streaming sessions and batched uploads score in this process, so it keeps its own reference model
+    app.state.anomaly_model = load_anomaly_model()
+    if TRANSCRIPTION_BATCHING:
+        get_whisper_model()
+    logger.info(f"Started {API_WORKERS} analysis workers in {time.time() - start_time:.1f}s "
+                f"(queue size {API_QUEUE_SIZE})")
+
+@app.on_event("shutdown")
+def stop_workers():
+    app.state.executor.shutdown(cancel_futures=True)
+
+@app.get("/models")
+async def model_stats():
+    """
+    Report load time and memory use of the models loaded in an analysis worker.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(app.state.executor, get_model_stats)
+
+@app.get("/status")
+def status():
+    """
+    Report worker capacity and current load.
+    """
+    return {
+        "workers": API_WORKERS,
+        "queue_size": API_QUEUE_SIZE,
+        "pending": app.state.pending,
+        "queued": max(0, app.state.pending - API_WORKERS),
+        "streams": app.state.streams
+    }
+
 @app.post("/upload")
 async def upload_audio(file: UploadFile = File(...), transcript: str = Form(default=None)):
     """
     Upload a single audio file (WAV, MP3, or FLAC) and optional transcript to analyze for cognitive decline.
-    Returns a JSON object with feature values and risk score.
+    Returns a JSON object with feature values, risk score and per-stage timings.
+    Analysis runs in a worker process; when every worker is busy and the queue is
+    full, the request is rejected with 503 instead of piling up.
     """
-    start_time = time.time()
+    start_time = time.perf_counter()
     logger.info(f"Processing uploaded file: {file.filename or 'No filename provided'} (content_type: {file.content_type})")
 
     # Validate filename
@@ -32,130 +144,196 @@ async def upload_audio(file: UploadFile = File(...), transcript: str = Form(defa
         logger.error(f"Invalid or missing filename: {file.filename}, content_type: {file.content_type}")
         raise HTTPException(status_code=400, detail={"error": "Invalid or missing audio file"})
 
+    # Admission control: at most API_WORKERS running plus API_QUEUE_SIZE waiting
+    if app.state.pending >= API_WORKERS + API_QUEUE_SIZE:
+        logger.warning(f"Rejecting {file.filename}: {app.state.pending} requests already in flight")
+        raise HTTPException(status_code=503, detail={"error": "Server busy, retry later"}, headers={"Retry-After": "5"})
+    app.state.pending += 1
     try:
-        # Create a temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            audio_path = os.path.join(temp_dir, file.filename)
-            logger.info(f"Attempting to save file to: {audio_path}")
-
-            # Save uploaded audio
-            with open(audio_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            logger.info(f"Loaded file: {audio_path}")
-
-            # Generate transcript if not provided
-            if transcript is None:
-                try:
-                    import whisper  # Assuming whisper is used for speech_to_text
-                    model = whisper.load_model("base")  # Adjust model size as needed
-                    result = model.transcribe(audio_path)
-                    transcript = result["text"]
-                    logger.info("Generated transcript using Whisper")
-                except Exception as e:
-                    logger.error(f"Failed to generate transcript: {str(e)}")
-                    raise HTTPException(status_code=400, detail={"error": "Failed to generate transcript"})
+        data = await file.read()
+        read_time = time.perf_counter() - start_time
+        queued_at = time.perf_counter()
+        async with app.state.slots:
+            queue_wait = time.perf_counter() - queued_at
+            if TRANSCRIPTION_BATCHING:
+                prepared = await _run_in_worker(prepare_upload, data, transcript or None)
             else:
-                logger.info("Using provided transcript")
-
-            # Save transcript temporarily
-            text_path = os.path.join(temp_dir, file.filename.replace(".wav", ".txt"))
-            with open(text_path, "w", encoding="utf-8") as f:
-                f.write(transcript)
-
-            # Feature extraction
-            pause_count, pause_avg = count_pauses(audio_path)
-            hesitations, lexical_div, incomplete = extract_text_features(transcript)
-            semantic_sim = semantic_coherence(transcript)
-            duration = librosa.get_duration(filename=audio_path)
-            if duration == 0:
-                logger.error("Audio file has zero duration")
-                raise HTTPException(status_code=400, detail={"error": "Audio file has zero duration"})
-
-            speech_rate = len(transcript.split()) / (duration / 60)
-            pitch_variability = 0  # Placeholder; replace with actual pitch variability calculation if available
-
-            # Prepare feature data
-            file_basename = os.path.basename(file.filename)
-            features = {
-                file_basename: {
-                    "pause_co": pause_count,
-                    "pause_avg": pause_avg,
-                    "avg_spec": 0,  # Placeholder; replace with actual spectral analysis if available
-                    "ra_pitch": 0,  # Placeholder; replace with actual pitch range if available
-                    "vari": pitch_variability,
-                    "hesitation": hesitations,
-                    "lexical_div": lexical_div,
-                    "incompleteness": incomplete,
-                    "semantic": semantic_sim
-                }
-            }
-            logger.info(f"Features after extraction: {features}")
-
-            # Validate features
-            feature_values = features[file_basename]
-            if any(np.isnan(v) or np.isinf(v) for v in feature_values.values()):
-                logger.error(f"Invalid values in features for {file_basename}: {feature_values}")
-                raise HTTPException(status_code=400, detail={"error": "Invalid feature values"})
-
-            logger.info(f"Extracted features for {file_basename}")
-
-            # Run modeling to get anomaly and risk score
-            df = pd.DataFrame([{
-                "sample_id": file_basename,
-                "pause_count": pause_count,
-                "pause_avg_duration": pause_avg,
-                "speech_rate": speech_rate,
-                "pitch_variability": pitch_variability,
-                "hesitation_count": hesitations,
-                "lexical_diversity": lexical_div,
-                "incomplete_sentences": incomplete,
-                "semantic_similarity": semantic_sim
-            }])
-            final_df = run_modeling(df)
-            anomaly_score = final_df["anomaly_score"].iloc[0] if "anomaly_score" in final_df.columns else 0
-            is_anomaly = bool(final_df["is_anomaly"].iloc[0]) if "is_anomaly" in final_df.columns else False
-            risk_score = final_df["risk_score"].iloc[0] if "risk_score" in final_df.columns else 0
-
-            anomaly_results = {file_basename: {"anomaly_score": anomaly_score, "is_anomaly": is_anomaly}}
-            risk_scores = {file_basename: risk_score}
-            logger.info(f"Anomaly results: {anomaly_results}")
-            logger.info(f"Risk scores: {risk_scores}")
-
-            # Prepare response
-            response = {
-                "sample_id": os.path.splitext(file.filename)[0],
-                "pause_co": feature_values.get("pause_co", 0),
-                "pause_avg": feature_values.get("pause_avg", 0),
-                "avg_spec": feature_values.get("avg_spec", 0),
-                "ra_pitch": feature_values.get("ra_pitch", 0),
-                "vari": feature_values.get("vari", 0),
-                "hesitation": feature_values.get("hesitation", 0),
-                "lexical_div": feature_values.get("lexical_div", 0),
-                "incompleteness": feature_values.get("incompleteness", 0),
-                "semantic": feature_values.get("semantic", 0),
-                "anomaly": anomaly_results[file_basename]["is_anomaly"],
-                "risk_score": risk_scores[file_basename]
-            }
-            logger.info(f"Response types before serialization: { {k: type(v) for k, v in response.items()} }")
-            logger.info(f"Response prepared: {response}")
-            end_time = time.time()
-            logger.info(f"Processing completed in {end_time - start_time:.2f} seconds")
-
-            # Save to CSV (optional, based on old code)
-            output_csv = os.path.join(temp_dir, "features_output.csv")
-            final_df.to_csv(output_csv, index=False)
-            logger.info(f"Saved results to {output_csv}")
-
-            return JSONResponse(content=response)
-
-    except HTTPException as e:
-        logger.error(f"HTTP Exception: {str(e.detail)}")
-        raise e
+                response = await _run_in_worker(analyze_audio_bytes, data, file.filename, transcript or None)
+        if TRANSCRIPTION_BATCHING:
+            # The worker slot is free again; Whisper batches this clip with other requests'
+            response = await _transcribe_and_score(prepared, file.filename)
+    except ValueError as e:
+        logger.error(f"Analysis failed for {file.filename}: {e}")
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); _run_in_worker has replaced the pool so later requests succeed
+        logger.error(f"Analysis worker crashed while processing {file.filename}", exc_info=True)
+        raise HTTPException(status_code=503, detail={"error": "Analysis worker crashed, retry later"})
     except Exception as e:
         logger.error(f"Internal server error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail={"error": f"Internal Server Error: {str(e)}"})
+    finally:
+        app.state.pending -= 1
+
+    response['timings'] = {'read': read_time, 'queue_wait': queue_wait, **response['timings'],
+                           'total': time.perf_counter() - start_time}
+    logger.info(f"Processed {file.filename} ({len(data)} bytes) in {response['timings']['total']:.2f}s, "
+                f"risk score {response['risk_score']}")
+    return response
+
+async def _extract_clip(clip):
+    """
+    Feature values and timings of one clip of a bulk request, using the worker pool
+    (and the batching transcription service when enabled).
+    """
+    loop = asyncio.get_running_loop()
+    async with app.state.slots:
+        if not TRANSCRIPTION_BATCHING:
+            return await _run_in_worker(extract_upload_features, clip['data'], clip['transcript'])
+        prepared = await _run_in_worker(prepare_upload, clip['data'], clip['transcript'])
+    whisper_transcript = None
+    if prepared['transcript'] is None:
+        whisper_transcript, prepared['timings']['transcription'] = await _batched_transcription(prepared.pop('audio'))
+    features = await loop.run_in_executor(None, partial(complete_features, prepared, whisper_transcript))
+    return features, prepared['timings']
+
+@app.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...), scoring: str = Form(default='reference')):
+    """
+    Score many clips in one request. Files may be audio clips, .txt transcripts
+    (matched to clips by base name) or zip/tar archives of both.
+    Streams newline-delimited JSON: a 'features' (or 'error') record as each clip
+    finishes, then one 'score' record per clip from a single cohort scoring pass,
+    then a 'summary'. scoring='reference' scores against the reference model (fitting
+    on the batch if there is none); scoring='cohort' always fits on the batch.
+    Admission control counts every clip of the batch as a pending request.
+    """
+    start_time = time.perf_counter()
+    if scoring not in ('reference', 'cohort'):
+        raise HTTPException(status_code=400, detail={"error": "scoring must be 'reference' or 'cohort'"})
+    if app.state.pending >= API_WORKERS + API_QUEUE_SIZE:
+        raise HTTPException(status_code=503, detail={"error": "Server busy, retry later"}, headers={"Retry-After": "5"})
+    try:
+        clips = collect_clips([(file.filename or '', await file.read()) for file in files])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    # Each clip counts as one request; a batch larger than the whole queue only runs alone
+    if app.state.pending and app.state.pending + len(clips) > API_WORKERS + API_QUEUE_SIZE:
+        logger.warning(f"Rejecting a batch of {len(clips)} clips: {app.state.pending} requests already in flight")
+        raise HTTPException(status_code=503, detail={"error": "Server busy, retry later"}, headers={"Retry-After": "5"})
+    logger.info(f"Bulk request with {len(clips)} clips ({sum(len(c['data']) for c in clips)} bytes of audio)")
+    app.state.pending += len(clips)
+
+    async def run(clip):
+        try:
+            return clip, await _extract_clip(clip), None
+        except Exception as e:
+            return clip, None, e
+
+    async def generate():
+        try:
+            tasks = [asyncio.create_task(run(clip)) for clip in clips]
+            features = {}
+            for next_done in asyncio.as_completed(tasks):
+                clip, result, error = await next_done
+                if error is not None:
+                    logger.error(f"Bulk clip {clip['file_name']} failed: {error}")
+                    yield json.dumps({'type': 'error', 'sample_id': clip['sample_id'], 'error': str(error)}) + '\n'
+                    continue
+                features[clip['sample_id']], timings = result
+                yield json.dumps({'type': 'features', 'sample_id': clip['sample_id'],
+                                  'features': features[clip['sample_id']], 'timings': timings}) + '\n'
+
+            anomaly_model = app.state.anomaly_model if scoring == 'reference' else None
+            start = time.perf_counter()
+            scores = await asyncio.get_running_loop().run_in_executor(None, score_cohort, features, anomaly_model)
+            scoring_time = time.perf_counter() - start
+            for sample_id, score in scores.items():
+                yield json.dumps({'type': 'score', 'sample_id': sample_id, **score}) + '\n'
+            yield json.dumps({
+                'type': 'summary',
+                'clips': len(clips),
+                'scored': len(scores),
+                'failed': len(clips) - len(features),
+                'scoring': 'reference' if anomaly_model is not None else 'cohort',
+                'scoring_time': scoring_time,
+                'total_time': time.perf_counter() - start_time
+            }) + '\n'
+        finally:
+            app.state.pending -= len(clips)
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+async def _transcribe_and_score(prepared, file_name):
+    """
+    Finish a prepared upload in this process, transcribing through the batching service.
+    """
+    loop = asyncio.get_running_loop()
+    whisper_transcript = None
+    if prepared['transcript'] is None:
+        try:
+            whisper_transcript, prepared['timings']['transcription'] = await _batched_transcription(prepared.pop('audio'))
+        except Exception as e:
+            logger.error(f"Batched transcription failed for {file_name}: {e}")
+            raise ValueError("Failed to generate transcript")
+    return await loop.run_in_executor(
+        None, partial(finish_upload, prepared, file_name, whisper_transcript, app.state.anomaly_model))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Per-stage latency histograms (by stage and audio length) in the Prometheus text format,
+    including stages run in the analysis workers.
+    """
+    return PlainTextResponse(render_prometheus(), media_type='text/plain; version=0.0.4')
+
+@app.get("/transcription")
+def transcription_stats():
+    """
+    Report batching counters of the transcription service in this process.
+    """
+    return get_transcription_service().stats()
+
+@app.websocket("/ws/stream")
+async def stream_audio(websocket: WebSocket, sr: int = 16000, interval: float = STREAM_UPDATE_SECONDS,
+                       transcript: str = None, transcribe: bool = True):
+    """
+    Live analysis over a WebSocket. The client sends binary messages of raw mono
+    16-bit little-endian PCM and a text message 'end' when done; the server sends a
+    JSON 'update' record every interval seconds of audio and a 'final' record.
+    Concurrent streams transcribe in turn on this process's Whisper model (through
+    the batching service, or under whisper_lock).
+    """
+    if app.state.streams >= API_MAX_STREAMS:
+        await websocket.close(code=1013)  # Try again later
+        return
+    await websocket.accept()
+    app.state.streams += 1
+    loop = asyncio.get_running_loop()
+    session = StreamingSession(sr, interval, app.state.anomaly_model, transcript, transcribe)
+    pending = b''
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message.get('bytes'):
+                pending += message['bytes']
+                usable = len(pending) - len(pending) % 2
+                samples = np.frombuffer(pending[:usable], dtype='<i2').astype(np.float32) / 32768
+                pending = pending[usable:]
+                # Feature updates and Whisper run off the event loop
+                for update in await loop.run_in_executor(None, session.feed, samples):
+                    await websocket.send_json(update)
+            elif message.get('text') == 'end':
+                await websocket.send_json(await loop.run_in_executor(None, session.finish))
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        logger.info("Streaming client disconnected")
+    finally:
+        app.state.streams -= 1
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
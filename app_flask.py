@@ -1,21 +1,47 @@
-from flask import Flask, request, render_template
-import os
-import tempfile
-import shutil
+from flask import Flask, Request, request, render_template, Response, stream_with_context
+import io
+import json
 import logging
 import numpy as np
 import time
-import librosa
-from src.pipeline import load_audio
-from src.feature_extraction import extract_features
-from src.modeling import detect_anomalies, calculate_risk_score
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.pipeline import analyze_audio_bytes, extract_upload_features
+from src.batch import collect_clips, score_cohort
+from src.modeling import load_anomaly_model
+from src.model_registry import get_whisper_model, get_model_stats
+from src.config import STREAM_UPDATE_SECONDS, UPLOAD_MAX_MB, BATCH_WORKERS
+from src.streaming import StreamingSession
+from src.metrics import flush, render_prometheus
+
+class InMemoryRequest(Request):
+    """
+    Keep uploaded files in memory instead of Werkzeug's temp file for uploads over
+    500 KB; MAX_CONTENT_LENGTH bounds the memory a request can take.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+    @property
+    def max_content_length(self):
+        # Live /stream bodies are consumed incrementally, so they are not size-limited
+        if self.endpoint == 'stream':
+            return None
+        return super().max_content_length
 
 app = Flask(__name__, template_folder='templates')
+app.request_class = InMemoryRequest
+app.config['MAX_CONTENT_LENGTH'] = int(UPLOAD_MAX_MB * 1024 * 1024)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Reference anomaly model, loaded once per worker; requests only call decision_function
+anomaly_model = load_anomaly_model()
+if anomaly_model is None:
+    logger.warning("No reference anomaly model; single-file anomaly scores default to 0. Run the batch pipeline to train one.")
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
@@ -27,111 +53,156 @@ def index():
             return render_template('index.html', error="No file selected")
         if not any(file.filename.lower().endswith(ext) for ext in ['wav', 'mp3', 'flac']):
             return render_template('index.html', error="Invalid file format. Use WAV, MP3, or FLAC")
-        if not transcript:
-            return render_template('index.html', error="Please provide a transcript")
 
         try:
             start_time = time.time()
             logger.info(f"Processing uploaded file: {file.filename}")
 
-            # Save file temporarily
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                file.save(temp_file.name)
-                file_path = temp_file.name
-            logger.info(f"Saved file to: {file_path}")
-
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Copy file to temp dir for processing
-                processed_audio_path = os.path.join(temp_dir, os.path.basename(file_path))
-                shutil.copy(file_path, processed_audio_path)
-
-                logger.info(f"Loaded file for processing: {processed_audio_path}")
-
-                # Preprocess audio
-                audio, sr = load_audio(processed_audio_path)
-                if audio is None:
-                    logger.error("Failed to load audio file")
-                    os.unlink(file_path)
-                    return render_template('index.html', error="Failed to load audio file")
-
-                # Prepare processed data
-                file_basename = os.path.basename(processed_audio_path)
-                processed_data = {file_basename: {'audio': audio, 'sr': sr, 'text': transcript}}
-                logger.info("Prepared processed data")
-
-                # Extract features
-                features = extract_features(processed_data)
-                logger.info(f"Features after extraction: {features}")
-                if not features or file_basename not in features:
-                    logger.error(f"Feature extraction failed for {file_basename}. Features: {features}")
-                    os.unlink(file_path)
-                    return render_template('index.html', error="Failed to extract features")
-
-                # Validate features
-                feature_values = features[file_basename]
-                if any(np.isnan(v) or np.isinf(v) for v in feature_values.values()):
-                    logger.error(f"Invalid values in features for {file_basename}: {feature_values}")
-                    os.unlink(file_path)
-                    return render_template('index.html', error="Invalid feature values")
-
-                logger.info(f"Extracted features for {file_basename}")
-
-                # Detect anomalies and calculate risk score
-                anomaly_results = detect_anomalies(features)
-                logger.info(f"Anomaly results: {anomaly_results}")
-                if not anomaly_results or file_basename not in anomaly_results:
-                    logger.warning("Anomaly detection failed for single file, using default values")
-                    anomaly_results = {file_basename: {'anomaly_score': 0, 'is_anomaly': False}}
-
-                risk_scores = calculate_risk_score(features, anomaly_results)
-                logger.info(f"Risk scores: {risk_scores}")
-                if file_basename not in risk_scores:
-                    logger.warning("Risk score calculation failed, using default value")
-                    risk_scores[file_basename] = 0
-
-                logger.info(f"Anomaly score: {anomaly_results[file_basename]['anomaly_score']}, Risk score: {risk_scores[file_basename]}")
-
-                # Prepare response
-                result = {
-                    "sample_id": os.path.splitext(file.filename)[0],
-                    "pause_co": feature_values.get("pause_co", 0),
-                    "pause_avg": feature_values.get("pause_avg", 0),
-                    "avg_spec": feature_values.get("avg_spec", 0),
-                    "ra_pitch": feature_values.get("ra_pitch", 0),
-                    "vari": feature_values.get("vari", 0),
-                    "hesitation": feature_values.get("hesitation", 0),
-                    "lexical_div": feature_values.get("lexical_div", 0),
-                    "incompleteness": feature_values.get("incompleteness", 0),
-                    "semantic": feature_values.get("semantic", 0),
-                    "anomaly": anomaly_results[file_basename]["is_anomaly"],
-                    "risk_score": risk_scores[file_basename]
-                }
-                processing_time = time.time() - start_time
-                logger.info(f"Response prepared: {result}")
-                logger.info(f"Processing completed in {processing_time:.2f} seconds")
-
-                # Save to CSV (optional)
-                output_csv = os.path.join(temp_dir, "features_output.csv")
-                import pandas as pd
-                df = pd.DataFrame([feature_values])
-                df["sample_id"] = file_basename
-                df["anomaly"] = anomaly_results[file_basename]["is_anomaly"]
-                df["risk_score"] = risk_scores[file_basename]
-                df.to_csv(output_csv, index=False)
-                logger.info(f"Saved results to {output_csv}")
-
-                # Clean up temporary file
-                os.unlink(file_path)
-
-                return render_template('result.html', result=result, processing_time=processing_time)
+            # Decode straight from the in-memory upload; nothing touches the disk
+            data = file.stream.read()
+            logger.info(f"Read {len(data)} bytes from {file.filename} in {time.time() - start_time:.3f}s")
+
+            try:
+                result = analyze_audio_bytes(data, file.filename, transcript or None, anomaly_model=anomaly_model)
+            except ValueError as e:
+                logger.error(f"Analysis failed for {file.filename}: {e}")
+                return render_template('index.html', error=str(e))
+
+            timings = result.pop('timings')
+            anomaly_score = result.pop('anomaly_score')
+            logger.info("Stage timings: " + ", ".join(f"{stage}={seconds:.3f}s" for stage, seconds in timings.items()))
+            logger.info(f"Anomaly score: {anomaly_score}, Risk score: {result['risk_score']}")
+
+            processing_time = time.time() - start_time
+            logger.info(f"Processing completed in {processing_time:.2f} seconds")
+            return render_template('result.html', result=result, processing_time=processing_time)
 
         except Exception as e:
             logger.error(f"Internal error: {str(e)}", exc_info=True)
-            if file_path and os.path.exists(file_path):
-                os.unlink(file_path)
             return render_template('index.html', error=f"Internal Error: {str(e)}")
 
     return render_template('index.html')
 
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    Score many clips in one request. The 'files' field may hold audio clips, .txt
+    transcripts (matched to clips by base name) or zip/tar archives of both.
+    Clips are decoded and their audio features extracted on BATCH_WORKERS threads,
+    which take turns on the shared Whisper model, and the features are streamed back as
+    newline-delimited JSON as each clip finishes ('features' or 'error' records),
+    followed by one 'score' record per clip from a single cohort scoring pass and a
+    'summary'. The 'scoring' field selects 'reference' (default; fits on the batch
+    when there is no reference model) or 'cohort'.
+    """
+    start_time = time.time()
+    scoring = request.form.get('scoring', 'reference')
+    if scoring not in ('reference', 'cohort'):
+        return {'error': "scoring must be 'reference' or 'cohort'"}, 400
+    try:
+        clips = collect_clips([(file.filename or '', file.stream.read()) for file in request.files.getlist('files')])
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    logger.info(f"Bulk request with {len(clips)} clips ({sum(len(c['data']) for c in clips)} bytes of audio)")
+
+    def generate():
+        features = {}
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(clips))) as executor:
+            futures = {executor.submit(extract_upload_features, clip['data'], clip['transcript']): clip for clip in clips}
+            for future in as_completed(futures):
+                clip = futures[future]
+                try:
+                    features[clip['sample_id']], timings = future.result()
+                except Exception as e:
+                    logger.error(f"Bulk clip {clip['file_name']} failed: {e}")
+                    yield json.dumps({'type': 'error', 'sample_id': clip['sample_id'], 'error': str(e)}) + '\n'
+                    continue
+                yield json.dumps({'type': 'features', 'sample_id': clip['sample_id'],
+                                  'features': features[clip['sample_id']], 'timings': timings}) + '\n'
+
+        reference = anomaly_model if scoring == 'reference' else None
+        scoring_start = time.time()
+        scores = score_cohort(features, reference)
+        scoring_time = time.time() - scoring_start
+        for sample_id, score in scores.items():
+            yield json.dumps({'type': 'score', 'sample_id': sample_id, **score}) + '\n'
+        logger.info(f"Bulk request scored {len(scores)}/{len(clips)} clips in {time.time() - start_time:.2f}s")
+        yield json.dumps({
+            'type': 'summary',
+            'clips': len(clips),
+            'scored': len(scores),
+            'failed': len(clips) - len(features),
+            'scoring': 'reference' if reference is not None else 'cohort',
+            'scoring_time': scoring_time,
+            'total_time': time.time() - start_time
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Bytes of 16-bit PCM read from the request body per iteration
+STREAM_READ_BYTES = 16384
+
+@app.route('/stream', methods=['POST'])
+def stream():
+    """
+    Live analysis of a chunked upload of raw mono 16-bit little-endian PCM.
+    Query parameters: sr (default 16000), interval (seconds between provisional
+    scores), transcript (skips Whisper) and transcribe=0 (audio features only).
+    Responds with newline-delimited JSON: an 'update' record every interval and a
+    'final' record once the body ends.
+    """
+    try:
+        sr = int(request.args.get('sr', 16000))
+        interval = float(request.args.get('interval', STREAM_UPDATE_SECONDS))
+    except ValueError:
+        return {'error': "sr and interval must be numbers"}, 400
+    if sr <= 0 or interval <= 0:
+        return {'error': "sr and interval must be positive"}, 400
+    transcript = request.args.get('transcript', '').strip()
+    transcribe = request.args.get('transcribe', '1') != '0'
+    model = get_whisper_model() if transcribe and not transcript else None
+    session = StreamingSession(sr, interval, anomaly_model, transcript or None, transcribe, model)
+    logger.info(f"Streaming session started (sr={sr}, interval={interval}s, transcribe={session.transcribe})")
+
+    def generate():
+        start_time = time.time()
+        pending = b''
+        while True:
+            chunk = request.stream.read(STREAM_READ_BYTES)
+            if not chunk:
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % 2  # Keep an odd trailing byte for the next chunk
+            samples = np.frombuffer(pending[:usable], dtype='<i2').astype(np.float32) / 32768
+            pending = pending[usable:]
+            for update in session.feed(samples):
+                yield json.dumps(update) + '\n'
+        final = session.finish()
+        final['processing_time'] = time.time() - start_time
+        logger.info(f"Streaming session finished: {final['seconds']}s of audio, risk score {final['risk_score']}")
+        yield json.dumps(final) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.after_request
+def flush_metrics(response):
+    # With METRICS_DIR set, share this worker's stage metrics with the other gunicorn workers
+    flush()
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Per-stage latency histograms (by stage and audio length) in the Prometheus text format.
+    """
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/models', methods=['GET'])
+def model_stats():
+    """
+    Report load time and memory use of the models loaded in this worker.
+    """
+    return get_model_stats()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import sys
+import os
+import argparse
+import time
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.feature_extraction import compute_spectrogram, pitch_features
+from src.pitch import PITCH_BACKENDS
+
+def synthetic_speech(duration, sr, seed=0):
+    """
+    Speech-like test signal: gliding harmonic tone in bursts separated by noisy gaps.
+    Args:
+        duration (float): Length in seconds.
+        sr (int): Sampling rate.
+        seed (int): Random seed.
+    Returns:
+        np.array: float32 audio.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voiced = 0.5 * np.sin(phase) + 0.25 * np.sin(2 * phase) + 0.1 * np.sin(3 * phase)
+    envelope = (np.sin(2 * np.pi * 0.4 * t) > -0.3).astype(np.float64)
+    audio = voiced * envelope + 0.003 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+def bench_backend(audio, sr, backend):
+    """
+    Time and trace peak allocations of one pitch backend, including the shared STFT
+    that piptrack needs.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    S = compute_spectrogram(audio, sr) if backend == 'piptrack' else None
+    ra_pitch, vari = pitch_features(audio, S, sr, backend=backend)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), ra_pitch, vari
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pitch backends on long synthetic clips.")
+    parser.add_argument('--minutes', type=float, default=10.0)
+    parser.add_argument('--sr', type=int, nargs='+', default=[16000, 44100])
+    parser.add_argument('--backends', nargs='+', default=list(PITCH_BACKENDS))
+    args = parser.parse_args()
+
+    print(f"{'sr':>6} {'backend':<9} {'time (s)':>9} {'peak MB':>9} {'ra_pitch':>9} {'vari':>10}")
+    for sr in args.sr:
+        audio = synthetic_speech(args.minutes * 60, sr)
+        for backend in args.backends:
+            bench_backend(audio[:sr], sr, backend)  # Warm up numba/FFT caches outside the timing
+            elapsed, peak_mb, ra_pitch, vari = bench_backend(audio, sr, backend)
+            print(f"{sr:>6} {backend:<9} {elapsed:9.2f} {peak_mb:9.1f} {ra_pitch:9.1f} {vari:10.1f}")
+
+if __name__ == "__main__":
+    main()
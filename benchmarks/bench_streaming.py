@@ -0,0 +1,62 @@
+import sys
+import os
+import argparse
+import tempfile
+import time
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import soundfile as sf
+from src.config import ANALYSIS_SR
+from src.preprocess import load_audio
+from src.feature_extraction import extract_audio_features
+from src.streaming import extract_audio_features_streaming
+from bench_pitch import synthetic_speech
+
+def measure(func, *args, **kwargs):
+    """
+    Run func and return its result, wall time and peak traced allocations in MB.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+def whole_file_features(path):
+    audio, sr = load_audio(path)
+    return extract_audio_features(audio, sr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare block-wise and whole-file audio feature extraction.")
+    parser.add_argument('--minutes', type=float, default=20.0)
+    parser.add_argument('--sr', type=int, default=16000)
+    parser.add_argument('--format', choices=['wav', 'flac'], default='wav')
+    parser.add_argument('--block-seconds', type=float, default=30.0)
+    parser.add_argument('--rtol', type=float, default=1e-2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"synthetic.{args.format}")
+        sf.write(path, synthetic_speech(args.minutes * 60, args.sr), args.sr)
+
+        whole, whole_time, whole_mb = measure(whole_file_features, path)
+        streamed, stream_time, stream_mb = measure(extract_audio_features_streaming, path,
+                                                   block_seconds=args.block_seconds, target_sr=ANALYSIS_SR)
+
+    print(f"{'path':<10} {'time (s)':>9} {'peak MB':>9}")
+    print(f"{'whole':<10} {whole_time:9.2f} {whole_mb:9.1f}")
+    print(f"{'streaming':<10} {stream_time:9.2f} {stream_mb:9.1f}")
+    mismatched = []
+    for name in whole:
+        ok = np.isclose(streamed[name], whole[name], rtol=args.rtol, atol=1e-6)
+        print(f"{name:<10} {float(whole[name]):14.4f} {float(streamed[name]):14.4f} {'ok' if ok else 'MISMATCH'}")
+        if not ok:
+            mismatched.append(name)
+    sys.exit(1 if mismatched else 0)
+
+if __name__ == "__main__":
+    main()
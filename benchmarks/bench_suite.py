@@ -0,0 +1,275 @@
+import sys
+import os
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+import numpy as np
+import soundfile as sf
+from bench_pitch import synthetic_speech
+from src.config import PITCH_BACKEND, PLOT_WORKERS
+from src.feature_extraction import extract_audio_features, extract_text_features, FEATURE_SIGNATURE
+from src.modeling import detect_anomalies, calculate_risk_score
+from src.preprocess import load_audio
+from src.results_store import results_table
+from src.schema import FeatureTable, FEATURE_NAMES, FEATURE_SCHEMA
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ("the cat sat on a mat and then we went to see my old friend at the market "
+         "because it was a sunny day so I think that was nice").split()
+HESITATIONS = ('uh', 'um', 'er', 'ah')
+
+def synthetic_clip(duration, sr, seed=0):
+    """
+    Speech-like clip: harmonic tone bursts with silence gaps of random length and
+    a few broadband noise bursts.
+    """
+    rng = np.random.default_rng(seed)
+    audio = synthetic_speech(duration, sr, seed)
+    for _ in range(int(duration / 4)):
+        start = int(rng.uniform(0, duration) * sr)
+        audio[start:start + int(rng.uniform(0.2, 1.5) * sr)] = 0.0
+    for _ in range(int(duration / 10)):
+        start = int(rng.uniform(0, duration) * sr)
+        burst = audio[start:start + int(rng.uniform(0.05, 0.3) * sr)]
+        burst += (0.2 * rng.standard_normal(len(burst))).astype(np.float32)
+    return audio
+
+def synthetic_transcript(duration, seed=0):
+    """
+    Transcript of about 2.5 words per second with hesitations and some unfinished sentences.
+    """
+    rng = np.random.default_rng(seed)
+    sentences = []
+    for _ in range(max(1, int(duration * 2.5 / 12))):
+        words = list(rng.choice(WORDS, size=int(rng.integers(6, 18))))
+        for _ in range(int(rng.integers(0, 3))):
+            words.insert(int(rng.integers(0, len(words))), str(rng.choice(HESITATIONS)))
+        end = '.' if rng.random() > 0.2 else ''
+        sentences.append(' '.join(words).capitalize() + end)
+    return ' '.join(sentences)
+
+def generate_corpus(corpus_dir, lengths, count, sr):
+    """
+    Write count WAV clips and transcripts for every length (seconds); existing files are reused.
+    Returns:
+        list: (audio_path, transcript, duration) tuples.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = []
+    for duration in lengths:
+        for i in range(count):
+            seed = int(duration * 1000) + i
+            path = os.path.join(corpus_dir, f"clip_{duration:g}s_{i}_{sr}.wav")
+            if not os.path.exists(path):
+                sf.write(path, synthetic_clip(duration, sr, seed), sr)
+            corpus.append((path, synthetic_transcript(duration, seed), duration))
+    return corpus
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far in MB, or None if unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def time_stage(func, items, repeat):
+    """
+    Run func over all items repeat times.
+    Returns:
+        tuple: Fastest total seconds and the results of the last repetition.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(item) for item in items]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+def cohort_features(features, size, seed=0):
+    """
+    Scale the extracted features up to a cohort of `size` samples by resampling
+    rows with 5% multiplicative jitter (counts stay whole numbers).
+    """
+    rng = np.random.default_rng(seed)
+    base = np.nan_to_num(features.matrix)
+    rows = base[rng.integers(0, len(base), size)] * rng.normal(1.0, 0.05, (size, len(FEATURE_NAMES)))
+    for column, (_, dtype) in enumerate(FEATURE_SCHEMA):
+        if dtype.startswith('int'):
+            rows[:, column] = np.round(rows[:, column])
+    return FeatureTable.from_matrix([f"sample_{i}" for i in range(size)], rows)
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                  capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{revision}{'-dirty' if dirty else ''}" if revision else None
+    except OSError:
+        return None
+
+def run_suite(args):
+    """
+    Time every stage on the synthetic corpus.
+    Returns:
+        dict: History entry with the configuration and per-stage results.
+    """
+    corpus_dir = args.corpus_dir or os.path.join(tempfile.gettempdir(), 'cognitive_bench_corpus')
+    corpus = generate_corpus(corpus_dir, args.lengths, args.count, args.sr)
+    audio_seconds = sum(duration for _, _, duration in corpus)
+    stages = {}
+
+    def record(name, seconds, items, unit, amount):
+        stages[name] = {
+            'seconds': seconds,
+            'items': items,
+            'throughput': amount / seconds if seconds else None,
+            'throughput_unit': unit,
+            'peak_rss_mb': peak_rss_mb()
+        }
+        print(f"  {name:<24} {seconds:8.3f}s  {amount / seconds if seconds else 0:10.1f} {unit}")
+
+    # Warm up numba-compiled librosa code and the tokenizers outside the timings
+    warm_audio, warm_sr = load_audio(corpus[0][0])
+    extract_audio_features(warm_audio[:warm_sr], warm_sr)
+    extract_text_features(corpus[0][1])
+
+    print(f"Corpus: {len(corpus)} clips, {audio_seconds / 60:.1f} min of audio at {args.sr} Hz in {corpus_dir}")
+    seconds, decoded = time_stage(lambda item: load_audio(item[0]), corpus, args.repeat)
+    record('load_audio', seconds, len(corpus), 'audio s/s', audio_seconds)
+
+    seconds, audio_features = time_stage(lambda pair: extract_audio_features(*pair), decoded, args.repeat)
+    record('extract_audio_features', seconds, len(corpus), 'audio s/s', audio_seconds)
+    del decoded
+
+    transcripts = [transcript for _, transcript, _ in corpus]
+    seconds, text_features = time_stage(extract_text_features, transcripts, args.repeat)
+    record('extract_text_features', seconds, len(corpus), 'words/s', sum(len(t.split()) for t in transcripts))
+
+    features = FeatureTable(len(corpus))
+    for (path, _, _), audio, text in zip(corpus, audio_features, text_features):
+        features[os.path.basename(path)] = {**(audio or {}), **text}
+    cohort = cohort_features(features, args.cohort)
+
+    seconds, (anomaly_results,) = time_stage(detect_anomalies, [cohort], args.repeat)
+    record('detect_anomalies', seconds, args.cohort, 'samples/s', args.cohort)
+
+    seconds, (risk_scores,) = time_stage(lambda table: calculate_risk_score(table, anomaly_results), [cohort], args.repeat)
+    record('calculate_risk_score', seconds, args.cohort, 'samples/s', args.cohort)
+
+    if not args.skip_plots:
+        # Imported here like run_pipeline does, so the plotting import cost is not hidden in startup
+        from src.visualization import save_all_plots, PLOT_COLUMNS
+        df = results_table(cohort, anomaly_results, risk_scores).to_pandas()[PLOT_COLUMNS]
+        with tempfile.TemporaryDirectory() as plot_dir:
+            # A fresh directory each time, so no plot is skipped as unchanged
+            def render(frame):
+                for name in os.listdir(plot_dir):
+                    os.remove(os.path.join(plot_dir, name))
+                return save_all_plots(frame, plot_dir, num_workers=args.plot_workers)
+            seconds, _ = time_stage(render, [df], args.repeat)
+        record('save_all_plots', seconds, args.cohort, 'samples/s', args.cohort)
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'revision': git_revision(),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {
+            'lengths': args.lengths, 'count': args.count, 'sr': args.sr, 'cohort': args.cohort,
+            'repeat': args.repeat, 'plot_workers': args.plot_workers, 'pitch_backend': PITCH_BACKEND,
+            'feature_signature': FEATURE_SIGNATURE
+        },
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def compare(entry, baseline, tolerance, min_seconds):
+    """
+    Compare stage times with a baseline entry.
+    Returns:
+        list: Names of stages slower than the baseline by more than tolerance
+            and by more than min_seconds (timer noise on very short stages).
+    """
+    if baseline['config'] != entry['config']:
+        print("Warning: baseline was recorded with a different configuration; comparison is approximate")
+    regressions = []
+    print(f"Against baseline {baseline.get('revision')} ({baseline['timestamp']}), tolerance {tolerance:.0%}:")
+    for name, result in entry['stages'].items():
+        reference = baseline['stages'].get(name)
+        if reference is None:
+            print(f"  {name:<24} (no baseline)")
+            continue
+        change = result['seconds'] / reference['seconds'] - 1 if reference['seconds'] else 0.0
+        significant = abs(result['seconds'] - reference['seconds']) > min_seconds
+        flag = 'ok'
+        if significant and change > tolerance:
+            flag = 'REGRESSION'
+        elif significant and change < -tolerance:
+            flag = 'faster'
+        print(f"  {name:<24} {reference['seconds']:8.3f}s -> {result['seconds']:8.3f}s  {change:+7.1%}  {flag}")
+        if flag == 'REGRESSION':
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic speech corpus.")
+    parser.add_argument('--lengths', type=float, nargs='+', default=[10, 60, 300], help="Clip lengths in seconds")
+    parser.add_argument('--count', type=int, default=3, help="Clips per length")
+    parser.add_argument('--sr', type=int, default=16000)
+    parser.add_argument('--cohort', type=int, default=2000, help="Samples for anomaly, risk and plot stages")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions per stage; the fastest counts")
+    parser.add_argument('--plot-workers', type=int, default=PLOT_WORKERS)
+    parser.add_argument('--skip-plots', action='store_true')
+    parser.add_argument('--corpus-dir', help="Where to keep the generated corpus (default: a temp directory)")
+    parser.add_argument('--history', default='results/benchmarks/history.json', help="JSON history to append to")
+    parser.add_argument('--baseline', default='results/benchmarks/baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help="Make this run the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown before a stage is flagged")
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help="Slowdowns smaller than this many seconds are never flagged")
+    args = parser.parse_args()
+
+    entry = run_suite(args)
+    print(f"Peak RSS: {entry['peak_rss_mb']:.0f} MB" if entry['peak_rss_mb'] is not None else "Peak RSS: n/a")
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history, encoding='utf-8') as f:
+            history = json.load(f)
+    history.append(entry)
+    os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+    with open(args.history, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+    print(f"Appended run {len(history)} to {args.history}")
+
+    regressions = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(entry, json.load(f), args.tolerance, args.min_seconds)
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
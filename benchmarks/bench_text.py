@@ -0,0 +1,66 @@
+import sys
+import os
+import argparse
+import glob
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import synthetic_transcript
+from src.config import NUM_WORKERS, TEXT_TOKENIZER
+from src.text_features import text_features, extract_text_features_batch, ensure_tokenizer_data
+
+# Features compared between the 'nltk' and 'regex' tokenizers
+COMPARED = ('hesitation', 'lexical_div', 'ttr', 'mattr', 'incompleteness', 'semantic')
+
+def load_corpus(args):
+    """
+    Transcripts from --transcript-dir, or --count synthetic ones of --seconds each.
+    """
+    if args.transcript_dir:
+        texts = []
+        for path in sorted(glob.glob(os.path.join(args.transcript_dir, '*.txt'))):
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+        return texts
+    return [synthetic_transcript(args.seconds, seed) for seed in range(args.count)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NLTK and regex text feature tokenizers and the batch API.")
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--seconds', type=float, default=60.0)
+    parser.add_argument('--transcript-dir', default='')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    args = parser.parse_args()
+
+    texts = load_corpus(args)
+    n_words = sum(len(text.split()) for text in texts)
+    print(f"Corpus: {len(texts)} transcripts, {n_words} words")
+
+    results = {}
+    tokenizers = ['regex']
+    if ensure_tokenizer_data(download=False):
+        tokenizers.insert(0, 'nltk')
+    else:
+        print("NLTK punkt_tab data not installed; skipping the nltk tokenizer")
+    for tokenizer in tokenizers:
+        text_features(texts[0], tokenizer)
+        start = time.perf_counter()
+        results[tokenizer] = [text_features(text, tokenizer) for text in texts]
+        seconds = time.perf_counter() - start
+        print(f"  {tokenizer:<16} {seconds:8.3f}s  {n_words / seconds:12.0f} words/s")
+
+    # The batch API runs the configured tokenizer, or regex if NLTK's data is missing
+    tokenizer = TEXT_TOKENIZER if TEXT_TOKENIZER in results else 'regex'
+    start = time.perf_counter()
+    batch = extract_text_features_batch(texts, args.workers, tokenizer=tokenizer)
+    seconds = time.perf_counter() - start
+    print(f"  {f'batch x{args.workers} {tokenizer}':<16} {seconds:8.3f}s  {n_words / seconds:12.0f} words/s")
+    assert batch == results[tokenizer], "batch features differ from per-call features"
+
+    if 'nltk' in results:
+        for name in COMPARED:
+            same = sum(a[name] == b[name] for a, b in zip(results['nltk'], results['regex']))
+            print(f"  {name:<16} identical for {same}/{len(texts)} transcripts")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import librosa
+from src.model_registry import get_whisper_model
+from src.transcription import TranscriptionService, WHISPER_SR
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one-at-a-time and batched Whisper transcription throughput.")
+    parser.add_argument('audio_paths', nargs='+', help="Clips to transcribe (repeated to reach --clips)")
+    parser.add_argument('--clips', type=int, default=32)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--max-wait-ms', type=float, default=50.0)
+    parser.add_argument('--model', default=None, help="Whisper model size (default WHISPER_MODEL_SIZE)")
+    args = parser.parse_args()
+
+    audios = [librosa.load(path, sr=WHISPER_SR)[0] for path in args.audio_paths]
+    clips = [audios[i % len(audios)] for i in range(args.clips)]
+    seconds = sum(len(clip) for clip in clips) / WHISPER_SR
+    model = get_whisper_model(args.model)
+    model.transcribe(clips[0], fp16=False)  # Warm-up outside the timing
+
+    start = time.perf_counter()
+    for clip in clips:
+        model.transcribe(clip, fp16=False)
+    sequential = time.perf_counter() - start
+    print(f"{'mode':<18} {'time (s)':>9} {'clips/s':>8} {'audio x':>8}")
+    print(f"{'transcribe()':<18} {sequential:9.2f} {len(clips) / sequential:8.2f} {seconds / sequential:8.1f}")
+
+    for batch_size in args.batch_sizes:
+        service = TranscriptionService(model, batch_size=batch_size, max_wait=args.max_wait_ms / 1000)
+        service.transcribe(clips[0])
+        start = time.perf_counter()
+        futures = [service.submit(clip) for clip in clips]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+        service.shutdown()
+        print(f"{f'batched x{batch_size}':<18} {elapsed:9.2f} {len(clips) / elapsed:8.2f} {seconds / elapsed:8.1f}"
+              f"  (mean batch {service.stats()['mean_batch_size']:.1f})")
+
+if __name__ == "__main__":
+    main()
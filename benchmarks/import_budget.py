@@ -0,0 +1,74 @@
+import sys
+import os
+import argparse
+import json
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points and their import-time budget in seconds (best of several cold runs)
+BUDGETS = {
+    'src.pipeline': 0.6,
+    'app_flask': 1.0,
+    'app': 1.5
+}
+
+# Heavy modules that must only load on first use, never at import time
+DEFERRED = ('nltk', 'sklearn', 'pandas', 'pyarrow', 'matplotlib', 'seaborn', 'torch', 'whisper',
+            'scipy.signal', 'scipy.stats')
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}}))
+"""
+
+def measure(module):
+    """
+    Import a module in a fresh interpreter.
+    Returns:
+        tuple: Import seconds, loaded module names, and the heaviest direct
+            dependencies as (cumulative microseconds, name) pairs from -X importtime.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD.format(module=module)],
+                            cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    heavy = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Direct imports of the measured module are indented by three spaces
+        if cumulative.strip().isdigit() and name.startswith('   ') and not name.startswith('    '):
+            heavy.append((int(cumulative), name.strip()))
+    return report['seconds'], set(report['modules']), sorted(heavy, reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time and deferred heavy imports of the entry points.")
+    parser.add_argument('modules', nargs='*', help="Modules to check (default: all budgeted entry points)")
+    parser.add_argument('--runs', type=int, default=3, help="Cold imports per module; the fastest counts")
+    parser.add_argument('--top', type=int, default=5, help="Heaviest direct imports to list")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget, e.g. for slow CI machines")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<14} {'import (s)':>10} {'budget (s)':>10}  heaviest direct imports")
+    for module in args.modules or list(BUDGETS):
+        runs = [measure(module) for _ in range(args.runs)]
+        seconds, loaded, heavy = min(runs, key=lambda run: run[0])
+        budget = BUDGETS.get(module, 1.0) * args.scale
+        top = ', '.join(f"{name} {cumulative / 1e6:.2f}s" for cumulative, name in heavy[:args.top])
+        over = seconds > budget
+        print(f"{module:<14} {seconds:10.2f} {budget:10.2f}  {top}{'  OVER BUDGET' if over else ''}")
+        eager = [name for name in DEFERRED if name in loaded]
+        if eager:
+            print(f"  imported eagerly: {', '.join(eager)}")
+        failed = failed or over or bool(eager)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import sys
+import os
+import argparse
+import http.client
+import io
+import json
+import subprocess
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import soundfile as sf
+from bench_pitch import synthetic_speech
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def multipart_body(file_name, data, transcript=None):
+    """
+    Encode an upload as multipart/form-data.
+    Returns:
+        tuple: Body bytes and Content-Type header value.
+    """
+    boundary = uuid.uuid4().hex
+    parts = [(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+              'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n']
+    if transcript:
+        parts.append((f'--{boundary}\r\nContent-Disposition: form-data; name="transcript"\r\n\r\n'
+                      f'{transcript}\r\n').encode())
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def post_upload(url, body, content_type):
+    """
+    Send one upload and return (status, latency in seconds, parsed JSON or None).
+    """
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=600)
+    start = time.perf_counter()
+    try:
+        conn.request('POST', url.path, body=body, headers={'Content-Type': content_type})
+        response = conn.getresponse()
+        payload = response.read()
+        latency = time.perf_counter() - start
+        return response.status, latency, json.loads(payload) if response.status == 200 else None
+    except OSError:
+        return 0, time.perf_counter() - start, None
+    finally:
+        conn.close()
+
+def wait_for_server(url, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=2)
+            conn.request('GET', '/status')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def run_load(url, body, content_type, requests, concurrency):
+    """
+    Fire `requests` uploads from `concurrency` client threads.
+    Returns:
+        dict: Throughput, latency percentiles, status counts and mean stage timings.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: post_upload(url, body, content_type), range(requests)))
+    elapsed = time.perf_counter() - start
+    ok = [r for r in results if r[0] == 200]
+    latencies = np.array([r[1] for r in ok]) if ok else np.zeros(1)
+    stages = {}
+    for _, _, payload in ok:
+        for stage, seconds in payload['timings'].items():
+            stages.setdefault(stage, []).append(seconds)
+    return {
+        'ok': len(ok),
+        'rejected': sum(r[0] == 503 for r in results),
+        'errors': sum(r[0] not in (200, 503) for r in results),
+        'throughput': len(ok) / elapsed,
+        'p50': float(np.percentile(latencies, 50)),
+        'p95': float(np.percentile(latencies, 95)),
+        'stages': {stage: float(np.mean(values)) for stage, values in stages.items()}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the FastAPI service at several worker counts.")
+    parser.add_argument('--audio', help="Audio file to upload (default: a synthetic speech clip)")
+    parser.add_argument('--seconds', type=float, default=30.0, help="Length of the synthetic clip")
+    parser.add_argument('--transcript', default=None, help="Send this transcript instead of using Whisper")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--queue-size', type=int, default=64, help="API_QUEUE_SIZE for the spawned servers")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--url', help="Test an already running server instead of spawning one per worker count")
+    args = parser.parse_args()
+
+    if args.audio:
+        file_name = os.path.basename(args.audio)
+        with open(args.audio, 'rb') as f:
+            data = f.read()
+    else:
+        file_name = 'synthetic.wav'
+        buffer = io.BytesIO()
+        sf.write(buffer, synthetic_speech(args.seconds, 16000), 16000, format='WAV')
+        data = buffer.getvalue()
+    body, content_type = multipart_body(file_name, data, args.transcript)
+
+    if args.url:
+        targets = [(None, urlparse(args.url))]
+    else:
+        targets = [(workers, urlparse(f"http://127.0.0.1:{args.port}/upload")) for workers in args.workers]
+
+    print(f"{'workers':>7} {'ok':>4} {'503':>4} {'err':>4} {'req/s':>7} {'p50 (s)':>8} {'p95 (s)':>8}  mean stage times")
+    for workers, url in targets:
+        server = None
+        if workers is not None:
+            # Cache off so every request does the full analysis
+            env = {**os.environ, 'API_WORKERS': str(workers), 'API_QUEUE_SIZE': str(args.queue_size),
+                   'CACHE_ENABLED': '0'}
+            log = tempfile.TemporaryFile()
+            server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(url.port)],
+                                      cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+            if not wait_for_server(url):
+                server.terminate()
+                log.seek(0)
+                print(log.read().decode(errors='replace')[-2000:])
+                sys.exit(f"Server with {workers} workers did not start")
+        try:
+            post_upload(url, body, content_type)  # Warm-up request outside the measurement
+            stats = run_load(url, body, content_type, args.requests, args.concurrency)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        stages = ' '.join(f"{stage}={seconds:.2f}" for stage, seconds in stats['stages'].items())
+        print(f"{workers or '-':>7} {stats['ok']:>4} {stats['rejected']:>4} {stats['errors']:>4} "
+              f"{stats['throughput']:7.2f} {stats['p50']:8.2f} {stats['p95']:8.2f}  {stages}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import sys
+import argparse
+import http.client
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+import librosa
+import numpy as np
+
+def pcm_chunks(audio_path, sr, chunk_seconds, realtime):
+    """
+    Yield an audio file as 16-bit PCM chunks, optionally paced at real time.
+    """
+    audio, _ = librosa.load(audio_path, sr=sr)
+    pcm = (np.clip(audio, -1, 1) * 32767).astype('<i2')
+    step = max(1, int(chunk_seconds * sr))
+    for start in range(0, len(pcm), step):
+        if realtime and start:
+            time.sleep(chunk_seconds)
+        yield pcm[start:start + step].tobytes()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream an audio file to the /stream endpoint and print the scores.")
+    parser.add_argument('audio_path')
+    parser.add_argument('--url', default='http://localhost:5000/stream')
+    parser.add_argument('--sr', type=int, default=16000)
+    parser.add_argument('--interval', type=float, default=5.0)
+    parser.add_argument('--chunk-seconds', type=float, default=0.5)
+    parser.add_argument('--transcript', default=None)
+    parser.add_argument('--no-transcribe', action='store_true')
+    parser.add_argument('--realtime', action='store_true', help="Send audio at playback speed, like a live call")
+    args = parser.parse_args()
+
+    url = urlparse(args.url)
+    params = {'sr': args.sr, 'interval': args.interval}
+    if args.transcript:
+        params['transcript'] = args.transcript
+    if args.no_transcribe:
+        params['transcribe'] = '0'
+
+    # Send the body from a thread and read the response as it arrives (http.client
+    # only reads the response once the whole request has been sent)
+    sock = socket.create_connection((url.hostname, url.port or 80))
+    head = (f"POST {url.path}?{urlencode(params)} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+            "Content-Type: application/octet-stream\r\nTransfer-Encoding: chunked\r\n"
+            "Connection: close\r\n\r\n")
+
+    def send_body():
+        sock.sendall(head.encode())
+        for chunk in pcm_chunks(args.audio_path, args.sr, args.chunk_seconds, args.realtime):
+            sock.sendall(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        sock.sendall(b"0\r\n\r\n")
+
+    start = time.perf_counter()
+    sender = threading.Thread(target=send_body, daemon=True)
+    sender.start()
+    response = http.client.HTTPResponse(sock)
+    response.begin()
+    if response.status != 200:
+        print(f"HTTP {response.status}: {response.read().decode()}")
+        sys.exit(1)
+    for line in response:
+        record = json.loads(line)
+        print(f"{time.perf_counter() - start:7.2f}s  {record['type']:<6} audio={record['seconds']:7.1f}s "
+              f"risk={record['risk_score']:.3f} anomaly={record['is_anomaly']} "
+              f"pauses={record['features']['pause_co']} hesitations={record['features']['hesitation']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+
+# Gunicorn settings for the Flask app: gunicorn app_flask:app -c gunicorn.conf.py
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Import the app once in the master process instead of in every worker
+preload_app = True
+
+def on_starting(server):
+    """
+    Clear stage metrics left in METRICS_DIR by the workers of an earlier server.
+    """
+    from src.config import METRICS_DIR
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if name.startswith('metrics-'):
+                os.remove(os.path.join(METRICS_DIR, name))
+
+def when_ready(server):
+    """
+    Runs in the master after the app is loaded and before workers are forked:
+    warm Whisper, the reference anomaly model, tokenizer data and the compiled
+    feature code once, so every worker (including respawned ones) starts warm and
+    shares the model weights copy-on-write.
+    """
+    from src.pipeline import warm_up
+    warm_up()
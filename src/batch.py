@@ -0,0 +1,114 @@
+import io
+import os
+import tarfile
+import zipfile
+
+from src.config import BATCH_MAX_CLIPS, UPLOAD_MAX_MB
+from src.modeling import detect_anomalies, calculate_risk_score
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+def _archive_members(file_name, data, max_member_bytes):
+    """
+    Yield (name, bytes) for the regular files in a zip or tar archive, skipping
+    hidden files, macOS resource forks and members larger than max_member_bytes.
+    """
+    def wanted(name, size):
+        base = os.path.basename(name)
+        return base and not base.startswith('.') and '__MACOSX' not in name and size <= max_member_bytes
+
+    if file_name.lower().endswith('.zip'):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and wanted(info.filename, info.file_size):
+                    yield os.path.basename(info.filename), archive.read(info)
+    else:
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as archive:
+            for member in archive:
+                if member.isfile() and wanted(member.name, member.size):
+                    yield os.path.basename(member.name), archive.extractfile(member).read()
+
+def collect_clips(uploads, max_clips=BATCH_MAX_CLIPS, max_member_mb=UPLOAD_MAX_MB):
+    """
+    Turn the files of a bulk request into clips with their transcripts.
+    Uploads may be audio files, .txt transcripts or zip/tar archives of both; a
+    transcript belongs to the audio file with the same base name.
+    Args:
+        uploads (list): (file_name, bytes) pairs from the request.
+        max_clips (int): Largest number of audio clips accepted.
+        max_member_mb (float): Archive members above this size are skipped.
+    Returns:
+        list: Dicts with 'sample_id', 'file_name', 'data' and 'transcript' (None for Whisper).
+    Raises:
+        ValueError: If there are no audio clips, too many clips, or an archive is unreadable.
+    """
+    files, n_clips = [], 0
+
+    def add(file_name, data):
+        nonlocal n_clips
+        if file_name.lower().endswith(AUDIO_EXTENSIONS):
+            n_clips += 1
+            # Checked as members are read, so an oversized archive is rejected before it is buffered
+            if n_clips > max_clips:
+                raise ValueError(f"Too many clips: more than {max_clips}")
+        files.append((file_name, data))
+
+    for file_name, data in uploads:
+        if file_name.lower().endswith(ARCHIVE_EXTENSIONS):
+            try:
+                for member_name, member_data in _archive_members(file_name, data, max_member_mb * 1024 * 1024):
+                    add(member_name, member_data)
+            except (zipfile.BadZipFile, tarfile.TarError) as e:
+                raise ValueError(f"Could not read archive {file_name}: {e}")
+        else:
+            add(os.path.basename(file_name), data)
+
+    transcripts = {}
+    for file_name, data in files:
+        if file_name.lower().endswith('.txt'):
+            transcripts[os.path.splitext(file_name)[0]] = data.decode('utf-8', errors='replace').strip()
+
+    clips, issued = [], set()
+    for file_name, data in files:
+        if not file_name.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        stem = os.path.splitext(file_name)[0]
+        # Same base name in several uploads: keep both under distinct sample ids,
+        # never reusing an id already given to another clip (e.g. a real a-2.wav)
+        sample_id, n = stem, 1
+        while sample_id in issued:
+            n += 1
+            sample_id = f"{stem}-{n}"
+        issued.add(sample_id)
+        clips.append({'sample_id': sample_id, 'file_name': file_name, 'data': data,
+                      'transcript': transcripts.get(stem) or None})
+    if not clips:
+        raise ValueError("No audio clips (WAV, MP3 or FLAC) in the request")
+    return clips
+
+def score_cohort(features, anomaly_model=None):
+    """
+    Score all clips of a bulk request together.
+    With a reference model every clip is scored against the reference cohort;
+    without one, the anomaly model is fitted on the batch itself (at least two clips).
+    Args:
+        features (dict): Mapping of sample ids to feature values.
+        anomaly_model (dict): Reference anomaly model, or None to fit on the batch.
+    Returns:
+        dict: Mapping of sample ids to 'anomaly', 'anomaly_score' and 'risk_score'.
+    """
+    if not features:
+        return {}
+    anomaly_results = detect_anomalies(features, anomaly_model)
+    score_range = anomaly_model['score_range'] if anomaly_model is not None else None
+    ranges = anomaly_model['feature_ranges'] if anomaly_model is not None else None
+    risk_scores = calculate_risk_score(features, anomaly_results, score_range, ranges)
+    return {
+        sample_id: {
+            'anomaly': bool(anomaly_results[sample_id]['is_anomaly']),
+            'anomaly_score': float(anomaly_results[sample_id]['anomaly_score']),
+            'risk_score': float(risk_scores[sample_id])
+        }
+        for sample_id in features
+    }
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.config import CACHE_DIR, CACHE_MAX_ENTRIES, WHISPER_MODEL_SIZE
+from src.feature_extraction import FEATURE_SIGNATURE
+
+def _to_builtin(value):
+    """
+    Convert NumPy scalars and one-element arrays to plain Python values for JSON.
+    """
+    if isinstance(value, dict):
+        return {k: _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        return value.item() if value.size == 1 else value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's contents, read in chunks.
+    Args:
+        file_path (str): Path to file.
+        chunk_size (int): Bytes read per chunk.
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FeatureCache:
+    """
+    Content-addressed on-disk cache of transcripts and audio/text feature dicts.
+
+    Entries are keyed by the audio content hash plus the feature signature (code
+    version and feature settings) and the Whisper model size, so changing any of
+    them invalidates old entries automatically. Stale entries are never returned
+    and are removed by prune_stale() or by the least-recently-used eviction that
+    keeps the cache under max_entries.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=CACHE_MAX_ENTRIES,
+                 feature_signature=FEATURE_SIGNATURE, model_size=WHISPER_MODEL_SIZE):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.feature_signature = feature_signature
+        self.model_size = model_size
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for_bytes(self, data):
+        """
+        Cache key for in-memory audio content.
+        """
+        return self._key(hashlib.sha256(data).hexdigest())
+
+    def key_for_file(self, file_path):
+        """
+        Cache key for an audio file's content.
+        """
+        return self._key(hash_file(file_path))
+
+    def _key(self, content_hash):
+        return f"{content_hash}-v{self.feature_signature}-{self.model_size}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Look up a cached record.
+        Args:
+            key (str): Cache key.
+        Returns:
+            dict: Record with 'text', 'audio_features' and 'text_features', or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry['record']
+
+    def put(self, key, record):
+        """
+        Store a record, replacing any existing entry atomically.
+        Args:
+            key (str): Cache key.
+            record (dict): Transcript and feature dicts to store.
+        """
+        entry = {
+            'feature_signature': self.feature_signature,
+            'model_size': self.model_size,
+            'created': time.time(),
+            'record': _to_builtin(record)
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write cache entry {key}: {e}")
+            return
+        with self._lock:
+            self.writes += 1
+            writes = self.writes
+        if writes % 100 == 0:
+            self.evict()
+
+    def invalidate(self, key):
+        """
+        Remove a single entry.
+        """
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        return [e for e in os.scandir(self.cache_dir) if e.name.endswith('.json')]
+
+    def evict(self):
+        """
+        Drop least-recently-used entries beyond max_entries.
+        Returns:
+            int: Number of entries removed.
+        """
+        entries = self._entries()
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return 0
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        removed = 0
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def prune_stale(self):
+        """
+        Remove entries written with another feature signature or model size.
+        Returns:
+            int: Number of entries removed.
+        """
+        suffix = f"-v{self.feature_signature}-{self.model_size}.json"
+        removed = 0
+        for entry in self._entries():
+            if not entry.name.endswith(suffix):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+        Hit/miss counters for this process.
+        Returns:
+            dict: Hits, misses, writes, evictions and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_feature_cache():
+    """
+    Return the process-wide feature cache shared by the CLI and the web apps.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FeatureCache()
+    return _cache
@@ -0,0 +1,103 @@
+import os
+
+# Whisper model size shared by the batch pipeline and the web apps
+# ('tiny' for speed, 'base' or larger for better accuracy).
+WHISPER_MODEL_SIZE = os.environ.get('WHISPER_MODEL_SIZE', 'tiny')
+
+# Worker processes for batch preprocessing (1 disables the process pool).
+NUM_WORKERS = int(os.environ.get('NUM_WORKERS', os.cpu_count() or 1))
+
+# On-disk cache of transcripts and features, keyed by audio content hash.
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', '1') != '0'
+CACHE_DIR = os.environ.get('CACHE_DIR', 'data/cache')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 50000))
+
+# Scaler + Isolation Forest fitted on a reference cohort by run_pipeline and
+# loaded once per web worker for single-sample scoring.
+ANOMALY_MODEL_PATH = os.environ.get('ANOMALY_MODEL_PATH', 'models/anomaly_model.joblib')
+
+# Shared spectral front end for audio features (float32 magnitude STFT).
+STFT_N_FFT = int(os.environ.get('STFT_N_FFT', 2048))
+STFT_HOP_LENGTH = int(os.environ.get('STFT_HOP_LENGTH', 512))
+
+# Pitch estimator for ra_pitch/vari: 'yin' or 'autocorr' give one f0 per voiced
+# frame; 'piptrack' keeps the original dense pitch-matrix behaviour.
+PITCH_BACKEND = os.environ.get('PITCH_BACKEND', 'yin')
+
+# Block-wise (memory-mapped WAV / streamed FLAC) feature extraction for long
+# recordings: block length, and the duration above which process_file uses it.
+STREAM_BLOCK_SECONDS = float(os.environ.get('STREAM_BLOCK_SECONDS', 30))
+STREAMING_MIN_SECONDS = float(os.environ.get('STREAMING_MIN_SECONDS', 600))
+
+# Rate audio is decoded and resampled to, once, for both feature analysis and
+# Whisper (16 kHz, Whisper's rate, by default); 0 keeps each file's native rate.
+ANALYSIS_SR = int(os.environ.get('ANALYSIS_SR', 16000)) or None
+
+# Timing feature mode: Whisper keeps word timestamps, speech rate (avg_spec)
+# becomes words per minute instead of a beat-tracking tempo estimate, and inter-word
+# pause and hesitation-position features are added to the feature schema.
+TIMING_FEATURES = os.environ.get('TIMING_FEATURES', '0') == '1'
+
+# Voice-activity gate in front of Whisper: silences of at least VAD_MIN_SILENCE_SECONDS
+# (and leading/trailing silence) are cut before transcription, keeping
+# VAD_PAD_SECONDS of each silence next to the speech; word timestamps are mapped
+# back to the original timeline.
+VAD_ENABLED = os.environ.get('VAD_ENABLED', '1') != '0'
+VAD_MIN_SILENCE_SECONDS = float(os.environ.get('VAD_MIN_SILENCE_SECONDS', 1.0))
+VAD_PAD_SECONDS = float(os.environ.get('VAD_PAD_SECONDS', 0.2))
+
+# Live streaming endpoint: seconds of audio between provisional scores, each of
+# which also transcribes the new audio when Whisper transcription is on.
+STREAM_UPDATE_SECONDS = float(os.environ.get('STREAM_UPDATE_SECONDS', 5))
+
+# FastAPI service (app.py): worker processes for CPU-bound analysis, requests
+# allowed to wait for a worker before new ones get 503, and concurrent
+# WebSocket streaming sessions.
+API_WORKERS = int(os.environ.get('API_WORKERS', min(4, os.cpu_count() or 1)))
+API_QUEUE_SIZE = int(os.environ.get('API_QUEUE_SIZE', 8))
+API_MAX_STREAMS = int(os.environ.get('API_MAX_STREAMS', 4))
+
+# Batched Whisper transcription service (src/transcription.py). When enabled,
+# in-memory transcriptions from concurrent callers are split into 30-second
+# segments and decoded in batches of up to WHISPER_BATCH_SIZE; a batch starts
+# at most WHISPER_MAX_WAIT_MS after its first segment arrives.
+TRANSCRIPTION_BATCHING = os.environ.get('TRANSCRIPTION_BATCHING', '0') == '1'
+WHISPER_BATCH_SIZE = int(os.environ.get('WHISPER_BATCH_SIZE', 8))
+WHISPER_MAX_WAIT_MS = float(os.environ.get('WHISPER_MAX_WAIT_MS', 50))
+
+# Largest upload the Flask app accepts, in MB; uploads are held in memory.
+UPLOAD_MAX_MB = float(os.environ.get('UPLOAD_MAX_MB', 50))
+
+# Bulk scoring endpoints: most clips per request, and threads the Flask app uses
+# to extract features of one request's clips in parallel.
+BATCH_MAX_CLIPS = int(os.environ.get('BATCH_MAX_CLIPS', 200))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Append-only Parquet store of pipeline results and run metadata, partitioned by run id.
+RESULTS_STORE_DIR = os.environ.get('RESULTS_STORE_DIR', 'results/store')
+
+# Opt-in plotting stage of run_pipeline: worker processes rendering plots in
+# parallel, and most samples drawn in scatter-heavy plots (a fixed random sample).
+VISUALIZATION_ENABLED = os.environ.get('VISUALIZATION_ENABLED', '0') == '1'
+PLOT_WORKERS = int(os.environ.get('PLOT_WORKERS', min(4, os.cpu_count() or 1)))
+PLOT_MAX_POINTS = int(os.environ.get('PLOT_MAX_POINTS', 2000))
+
+# Transcript tokenizer for text features: 'regex' (compiled regular expressions
+# following NLTK's punkt/Treebank splitting rules, no NLTK import) or 'nltk'
+# (NLTK's sent_tokenize/word_tokenize, as originally).
+TEXT_TOKENIZER = os.environ.get('TEXT_TOKENIZER', 'regex')
+
+# Directory for NLTK tokenizer data (punkt_tab), searched in addition to NLTK's
+# defaults; fill it at build time with ensure_tokenizer_data() (see render.yaml) so
+# workers never download it at runtime. Only used by the 'nltk' tokenizer.
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR', 'data/nltk_data')
+
+# Per-stage latency metrics served by the web apps at /metrics. With several
+# worker processes (gunicorn), set METRICS_DIR so each process writes its
+# metrics there and /metrics reports all of them.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
+# Profiling mode: when set, run_pipeline profiles one run in a single process with
+# cProfile and writes run-<run_id>.prof (plus a top-functions .txt) to this directory.
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
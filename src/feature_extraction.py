@@ -1,105 +1,226 @@
 import librosa
-import nltk
 import numpy as np
-from nltk.tokenize import sent_tokenize, word_tokenize
-nltk.download('punkt', quiet=True)
+from src.config import (STFT_N_FFT, STFT_HOP_LENGTH, PITCH_BACKEND, ANALYSIS_SR, TEXT_TOKENIZER, TIMING_FEATURES,
+                        VAD_ENABLED, VAD_MIN_SILENCE_SECONDS, VAD_PAD_SECONDS)
+from src.metrics import timed, signal_seconds
+from src.pauses import pause_stats
+from src.pitch import estimate_f0
+from src.schema import FeatureTable
+from src.text_features import extract_text_features, HESITATION_MARKERS
 
-def extract_audio_features(audio, sr):
+# Bump whenever feature code changes so cached features are recomputed
+FEATURE_VERSION = 8
+
+# Feature code version plus the settings that change feature values; cached
+# features and trained anomaly models are only reused when this matches. The
+# voice-activity gate changes what Whisper hears, so transcripts and text features.
+FEATURE_SIGNATURE = (f"{FEATURE_VERSION}.{PITCH_BACKEND}.{STFT_N_FFT}.{STFT_HOP_LENGTH}.{ANALYSIS_SR or 'native'}"
+                     f".{TEXT_TOKENIZER}"
+                     + (f".vad{VAD_MIN_SILENCE_SECONDS:g}-{VAD_PAD_SECONDS:g}" if VAD_ENABLED else '.novad')
+                     + ('.words' if TIMING_FEATURES else ''))
+
+# Shortest gap between two Whisper words (seconds) counted as a pause by timing_features
+WORD_PAUSE_SECONDS = 0.25
+
+# Onset frames per tempogram batch in tempo_from_onset
+_TEMPO_BATCH = 2048
+
+def compute_spectrogram(audio, sr, n_fft=STFT_N_FFT, hop_length=STFT_HOP_LENGTH):
     """
-    Extract audio-based features (pause count, average pause, speech rate, pitch range, variance).
+    Compute the shared magnitude spectrogram used by every audio feature.
     Args:
         audio (np.array): Audio time series.
         sr (int): Sampling rate.
+        n_fft (int): FFT window size (also the RMS frame length).
+        hop_length (int): Hop between frames in samples.
     Returns:
-        dict: Audio features, or None if extraction fails.
+        np.array: float32 magnitude spectrogram of shape (1 + n_fft // 2, n_frames).
+    """
+    stft = librosa.stft(np.asarray(audio, dtype=np.float32), n_fft=n_fft, hop_length=hop_length)
+    return np.abs(stft).astype(np.float32, copy=False)
+
+def frame_rms(S, n_fft=STFT_N_FFT):
+    """
+    Frame RMS envelope of a magnitude spectrogram, as used by the pause features
+    and the voice-activity gate.
+    """
+    return librosa.feature.rms(S=S, frame_length=n_fft)[0]
+
+def mel_db(S, sr):
+    """
+    Log-power mel spectrogram (dB, not yet clipped) used for the onset envelope.
+    """
+    return librosa.power_to_db(librosa.feature.melspectrogram(S=S ** 2, sr=sr), top_db=None)
+
+def onset_envelope(S, sr, n_fft=STFT_N_FFT, hop_length=STFT_HOP_LENGTH):
+    """
+    Onset strength envelope of a magnitude spectrogram, as librosa.beat.beat_track
+    computes it (median over mel bands).
+    """
+    mel = mel_db(S, sr)
+    mel = np.maximum(mel, mel.max() - 80.0)  # power_to_db's default top_db clipping
+    return librosa.onset.onset_strength(S=mel, sr=sr, n_fft=n_fft, hop_length=hop_length, aggregate=np.median)
+
+def tempo_from_onset(onset_env, sr, hop_length=STFT_HOP_LENGTH, ac_size=8.0):
+    """
+    Speech rate proxy (tempo in BPM) from an onset envelope.
+    Same result as librosa.feature.tempo, but the time-averaged tempogram is
+    accumulated in batches of frames instead of materialising the full
+    (window x frames) tempogram, which is hundreds of MB for long recordings.
+    """
+    onset_env = np.asarray(onset_env, dtype=np.float64)
+    n_frames = len(onset_env)
+    win_length = librosa.time_to_frames(ac_size, sr=sr, hop_length=hop_length).item()
+    padded = np.pad(onset_env, win_length // 2, mode='linear_ramp', end_values=[0, 0])
+    frames = librosa.util.frame(padded, frame_length=win_length, hop_length=1)[:, :n_frames]
+    import scipy.signal  # Slow to import; load it on first use
+    window = scipy.signal.get_window('hann', win_length, fftbins=True)[:, None]
+    mean_tg = np.zeros((win_length, 1))
+    for start in range(0, n_frames, _TEMPO_BATCH):
+        ac = librosa.autocorrelate(frames[:, start:start + _TEMPO_BATCH] * window, axis=0)
+        mean_tg[:, 0] += librosa.util.normalize(ac, norm=np.inf, axis=0).sum(axis=1)
+    mean_tg /= max(n_frames, 1)
+    tempo = librosa.feature.tempo(tg=mean_tg, sr=sr, hop_length=hop_length, aggregate=None)[0]
+    return float(tempo) if tempo > 0 else 0
+
+def pitch_stats(pitch_values):
+    """
+    Pitch range (peak-to-peak, Hz) and variance (Hz^2) of a set of pitch values.
+    """
+    ra_pitch = np.ptp(pitch_values) if len(pitch_values) > 0 else 0  # Peak-to-peak range in Hz
+    vari = np.var(pitch_values) if len(pitch_values) > 0 else 0  # Variance in Hz^2
+    return ra_pitch, vari
+
+def pitch_features(audio, S, sr, n_fft=STFT_N_FFT, hop_length=STFT_HOP_LENGTH, backend=PITCH_BACKEND):
+    """
+    Pitch range (Hz) and variance (Hz^2).
+    Args:
+        audio (np.array): Audio time series (used by the per-frame backends).
+        S (np.array): Shared magnitude spectrogram (used by 'piptrack').
+        sr (int): Sampling rate.
+        n_fft (int): FFT window size / analysis frame length.
+        hop_length (int): Hop between frames in samples.
+        backend (str): 'yin' or 'autocorr' (one f0 per voiced frame), or 'piptrack'
+            (every bin of the dense pitch matrix with non-zero magnitude).
+    Returns:
+        tuple: Pitch range and variance.
+    """
+    if backend == 'piptrack':
+        pitches, magnitudes = librosa.piptrack(S=S, sr=sr, n_fft=n_fft, hop_length=hop_length)
+        pitch_values = pitches[magnitudes > 0]
+    else:
+        f0 = estimate_f0(audio, sr, backend, frame_length=n_fft, hop_length=hop_length)
+        pitch_values = f0[~np.isnan(f0)]
+    return pitch_stats(pitch_values)
+
+@timed('extract_audio_features', audio_seconds=signal_seconds)
+def extract_audio_features(audio, sr, n_fft=STFT_N_FFT, hop_length=STFT_HOP_LENGTH, pitch_backend=PITCH_BACKEND,
+                           speech_rate=not TIMING_FEATURES, return_rms=False):
+    """
+    Extract audio-based features (pauses, speech rate, pitch range, variance).
+    One STFT is computed per file and shared by the RMS, onset/tempo and pitch features.
+    Args:
+        audio (np.array): Audio time series.
+        sr (int): Sampling rate.
+        n_fft (int): FFT window size.
+        hop_length (int): Hop between frames in samples.
+        pitch_backend (str): Pitch estimator, see pitch_features.
+        speech_rate (bool): Estimate the speech rate (avg_spec) from the onset tempo;
+            off in the timing feature mode, where timing_features provides it.
+        return_rms (bool): Also return the frame RMS envelope, e.g. for the
+            voice-activity gate (src/vad.py).
+    Returns:
+        dict: Audio features, or None if extraction fails; with return_rms, a tuple
+            of the features and the RMS envelope (None, None on failure).
     """
     try:
-        # Pause detection (count and average duration of silent regions)
-        frame_length = 2048
-        hop_length = 512
-        rms = librosa.feature.rms(y=audio, frame_length=frame_length, hop_length=hop_length)[0]
-        silence_threshold = 0.05 * np.max(rms)  # Increased threshold to reduce noise detection
-        pauses = np.where(rms < silence_threshold)[0]
-        pause_co = len(pauses) if len(pauses) > 0 else 0
-        pause_avg = np.mean(hop_length / sr * np.diff(pauses)) if len(pauses) > 1 else 0
-        
-        # Speech rate (average tempo)
-        tempo, _ = librosa.beat.beat_track(y=audio, sr=sr)
-        avg_spec = tempo if tempo > 0 else 0
+        S = compute_spectrogram(audio, sr, n_fft, hop_length)
+
+        # Pauses (count, length distribution and speech ratio of silent runs)
+        rms = frame_rms(S, n_fft)
+        features = pause_stats(rms, sr, hop_length)
         
         # Pitch range and variance
-        pitches, magnitudes = librosa.piptrack(y=audio, sr=sr)
-        pitch_values = pitches[magnitudes > 0]
-        ra_pitch = np.ptp(pitch_values) if len(pitch_values) > 0 else 0  # Peak-to-peak range in Hz
-        vari = np.var(pitch_values) if len(pitch_values) > 0 else 0  # Variance in Hz^2
-        
-        return {
-            'pause_co': pause_co,
-            'pause_avg': pause_avg,
-            'avg_spec': avg_spec,
-            'ra_pitch': ra_pitch,
-            'vari': vari
-        }
+        features['ra_pitch'], features['vari'] = pitch_features(audio, S, sr, n_fft, hop_length, pitch_backend)
+
+        if speech_rate:
+            # Speech rate (average tempo)
+            features['avg_spec'] = tempo_from_onset(onset_envelope(S, sr, n_fft, hop_length), sr, hop_length)
+        return (features, rms) if return_rms else features
     except Exception as e:
         print(f"Error extracting audio features: {e}")
-        return None
+        return (None, None) if return_rms else None
 
-def extract_text_features(text):
+def timing_features(words, text=None, duration=None, pause_seconds=WORD_PAUSE_SECONDS):
     """
-    Extract text-based features (hesitations, lexical diversity, incompleteness, semantic).
+    Timing features of the timing feature mode, from Whisper word timestamps.
+    Without timestamps (user-supplied or batch-decoded transcripts) the speech rate
+    is estimated from the transcript's word count and the audio duration, and the
+    pause features are 0.
     Args:
-        text (str): Transcribed text.
+        words (list): (word, start, end) tuples in seconds, or None.
+        text (str): Transcript, for the estimate without timestamps.
+        duration (float): Audio length in seconds, likewise.
+        pause_seconds (float): Shortest gap between words counted as a pause.
     Returns:
-        dict: Text features.
+        dict: 'avg_spec' (words per minute over the spoken span), 'word_pause_avg'
+            (mean length of the pauses between words) and 'hesitation_pause' (share
+            of hesitation markers next to such a pause).
     """
-    if not text:
+    if not words:
+        n_words = len(text.split()) if text else 0
         return {
-            'hesitation': 0,
-            'lexical_div': 0,
-            'incompleteness': 0,
-            'semantic': 0
+            'avg_spec': 60.0 * n_words / duration if duration else 0.0,
+            'word_pause_avg': 0.0,
+            'hesitation_pause': 0.0
         }
-    
-    sentences = sent_tokenize(text)
-    words = word_tokenize(text)
-    
-    # Hesitation markers
-    hesitation_markers = ['uh', 'um', 'er', 'ah']
-    hesitation = sum(1 for word in words if word in hesitation_markers)
-    
-    # Lexical diversity (approximated as pauses per sentence)
-    lexical_div = hesitation / len(sentences) if sentences else 0
-    
-    # Incompleteness (inverse of sentence completion)
-    complete_sentences = sum(1 for s in sentences if s.endswith(('.', '!', '?')))
-    sentence_completion = complete_sentences / len(sentences) if sentences else 0
-    incompleteness = 1 - sentence_completion if sentence_completion < 1 else 0
-    
-    # Semantic (placeholder, based on incompleteness threshold)
-    semantic = 1 if incompleteness > 0.5 else 0
-    
+    starts = np.array([start for _, start, _ in words], dtype=np.float64)
+    ends = np.array([end for _, _, end in words], dtype=np.float64)
+    span = ends[-1] - starts[0]
+    gaps = np.maximum(starts[1:] - ends[:-1], 0)
+    is_pause = gaps >= pause_seconds
+    # A word is next to a pause when the gap before or after it is one
+    near_pause = np.zeros(len(words), dtype=bool)
+    near_pause[1:] |= is_pause
+    near_pause[:-1] |= is_pause
+    is_hesitation = np.array([word.strip(' .,!?;:"\'-').lower() in HESITATION_MARKERS for word, _, _ in words])
     return {
-        'hesitation': hesitation,
-        'lexical_div': lexical_div,
-        'incompleteness': incompleteness,
-        'semantic': semantic
+        'avg_spec': 60.0 * len(words) / span if span > 0 else 0.0,
+        'word_pause_avg': float(gaps[is_pause].mean()) if is_pause.any() else 0.0,
+        'hesitation_pause': float(near_pause[is_hesitation].mean()) if is_hesitation.any() else 0.0
     }
 
+def transcript_features(text, words=None, duration=None):
+    """
+    Text features of a transcript, plus its timing features in the timing feature mode.
+    Args:
+        text (str): Transcribed text.
+        words (list): Whisper word timestamps, see timing_features.
+        duration (float): Audio length in seconds.
+    Returns:
+        dict: Text (and timing) features.
+    """
+    features = extract_text_features(text)
+    if TIMING_FEATURES:
+        features.update(timing_features(words, text, duration))
+    return features
+
 def extract_features(processed_data):
     """
     Extract features for all processed audio files.
     Args:
         processed_data (dict): Output from preprocess_audio_files.
     Returns:
-        dict: Mapping of file names to feature dictionaries.
+        FeatureTable: Features of every file, keyed by file name.
     """
-    features = {}
+    features = FeatureTable(len(processed_data))
     for file_name, data in processed_data.items():
-        audio_features = extract_audio_features(data['audio'], data['sr'])
+        # preprocess_file already extracts them (its voice-activity gate shares their RMS envelope)
+        audio_features = data['audio_features'] if 'audio_features' in data else extract_audio_features(data['audio'], data['sr'])
         if audio_features is None:
             print(f"Skipping feature extraction for {file_name} due to audio processing error")
             continue
-        text_features = extract_text_features(data['text'])
+        text_features = transcript_features(data['text'], data.get('words'), len(data['audio']) / data['sr'])
         features[file_name] = {**audio_features, **text_features}
         print(f"Extracted features for {file_name}")
     return features
\ No newline at end of file
@@ -0,0 +1,243 @@
+import cProfile
+import functools
+import glob
+import json
+import math
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+from src.config import METRICS_ENABLED, METRICS_DIR
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, math.inf)
+
+# Audio length label of an observation: (upper bound in seconds, label)
+AUDIO_LENGTH_BUCKETS = ((10, '0-10s'), (60, '10-60s'), (300, '1-5m'), (1200, '5-20m'), (math.inf, '20m+'))
+
+_lock = threading.Lock()
+# (stage, audio length label) -> [bucket counts..., sum, count]
+_histograms = {}
+# stage -> number of calls that raised
+_errors = {}
+
+def audio_length_label(audio_seconds):
+    """
+    Histogram label for an audio length in seconds ('none' when there is no audio).
+    """
+    if audio_seconds is None:
+        return 'none'
+    for bound, label in AUDIO_LENGTH_BUCKETS:
+        if audio_seconds < bound:
+            return label
+
+def observe(stage, seconds, audio_seconds=None):
+    """
+    Record one stage latency.
+    Args:
+        stage (str): Stage name, e.g. 'extract_audio_features'.
+        seconds (float): Wall time of the call.
+        audio_seconds (float): Length of the audio the call processed, if any.
+    """
+    if not METRICS_ENABLED:
+        return
+    key = (stage, audio_length_label(audio_seconds))
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+                break
+        values[-2] += seconds
+        values[-1] += 1
+
+def record_error(stage):
+    if METRICS_ENABLED:
+        with _lock:
+            _errors[stage] = _errors.get(stage, 0) + 1
+
+@contextmanager
+def timer(stage, audio_seconds=None):
+    """
+    Time the enclosed block as one observation of `stage`; exceptions are counted
+    as stage errors and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record_error(stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, audio_seconds)
+
+def signal_seconds(result, audio, sr, *args, **kwargs):
+    """
+    Audio length for timed functions called with (audio, sr, ...).
+    """
+    return len(audio) / sr
+
+def loaded_seconds(result, *args, **kwargs):
+    """
+    Audio length for timed functions returning (audio, sr).
+    """
+    audio, sr = result
+    return len(audio) / sr
+
+def file_seconds(result, audio_path, *args, **kwargs):
+    """
+    Audio length for timed functions called with (audio_path, ...), from the file header.
+    """
+    import soundfile as sf  # Only needed when such a call is timed
+    return sf.info(audio_path).duration
+
+def timed(stage, audio_seconds=None):
+    """
+    Decorator timing every call of a function as one observation of `stage`.
+    Args:
+        stage (str): Stage name.
+        audio_seconds (callable): Optional function of (result, *args, **kwargs)
+            returning the audio length the call processed, for the length label.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                record_error(stage)
+                observe(stage, time.perf_counter() - start)
+                raise
+            elapsed = time.perf_counter() - start
+            length = None
+            if audio_seconds is not None:
+                try:
+                    length = audio_seconds(result, *args, **kwargs)
+                except Exception:
+                    length = None
+            observe(stage, elapsed, length)
+            return result
+        return wrapper
+    return decorator
+
+def snapshot(reset=False):
+    """
+    Copy of this process's metrics as JSON-serializable data.
+    Args:
+        reset (bool): Clear the metrics after copying (see merge).
+    """
+    with _lock:
+        data = {
+            'histograms': [[stage, label, list(values)] for (stage, label), values in _histograms.items()],
+            'errors': dict(_errors)
+        }
+        if reset:
+            _histograms.clear()
+            _errors.clear()
+    return data
+
+def merge(data):
+    """
+    Add a snapshot taken in another process (e.g. an analysis worker) to this one.
+    """
+    with _lock:
+        for stage, label, values in data['histograms']:
+            current = _histograms.setdefault((stage, label), [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for i, value in enumerate(values):
+                current[i] += value
+        for stage, count in data['errors'].items():
+            _errors[stage] = _errors.get(stage, 0) + count
+
+def call_with_metrics(func, *args, **kwargs):
+    """
+    Run func in a worker process and return (result, metrics recorded since the
+    last such call), so the parent can merge them into its own registry.
+    """
+    result = func(*args, **kwargs)
+    return result, snapshot(reset=True)
+
+def flush():
+    """
+    With METRICS_DIR set, write this process's metrics there so any process
+    (e.g. whichever gunicorn worker serves /metrics) can report all of them.
+    """
+    if not METRICS_DIR or not METRICS_ENABLED:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"metrics-{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp_path, path)
+
+def _combined():
+    if not METRICS_DIR:
+        return snapshot()
+    flush()
+    histograms, errors = {}, {}
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for stage, label, values in data['histograms']:
+            current = histograms.setdefault((stage, label), [0] * len(values))
+            for i, value in enumerate(values):
+                current[i] += value
+        for stage, count in data['errors'].items():
+            errors[stage] = errors.get(stage, 0) + count
+    return {'histograms': [[s, l, v] for (s, l), v in histograms.items()], 'errors': errors}
+
+def render_prometheus():
+    """
+    All stage metrics in the Prometheus text exposition format.
+    Returns:
+        str: cognitive_stage_seconds histograms by stage and audio length, and
+            cognitive_stage_errors_total counters by stage.
+    """
+    data = _combined()
+    lines = [
+        '# HELP cognitive_stage_seconds Wall time of pipeline stages.',
+        '# TYPE cognitive_stage_seconds histogram'
+    ]
+    for stage, label, values in sorted(data['histograms']):
+        labels = f'stage="{stage}",audio_length="{label}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, values):
+            cumulative += count
+            le = '+Inf' if bound == math.inf else repr(bound)
+            lines.append(f'cognitive_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f'cognitive_stage_seconds_sum{{{labels}}} {values[-2]}')
+        lines.append(f'cognitive_stage_seconds_count{{{labels}}} {values[-1]}')
+    lines += [
+        '# HELP cognitive_stage_errors_total Pipeline stage calls that raised.',
+        '# TYPE cognitive_stage_errors_total counter'
+    ]
+    for stage, count in sorted(data['errors'].items()):
+        lines.append(f'cognitive_stage_errors_total{{stage="{stage}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def profiled(output_path):
+    """
+    Profile the enclosed block with cProfile. Writes output_path (a .prof file for
+    snakeviz, or flameprof/gprof2dot for flame graphs and call graphs) and a text
+    summary of the top functions by cumulative time next to it.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        profiler.dump_stats(output_path)
+        with open(os.path.splitext(output_path)[0] + '.txt', 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(40)
+        print(f"Profile written to {output_path}")
@@ -0,0 +1,77 @@
+import sys
+import threading
+import time
+
+from src.config import WHISPER_MODEL_SIZE
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_models = {}
+_model_stats = {}
+_lock = threading.Lock()
+# Held around every inference call on a shared Whisper model: each transcribe or
+# decode call installs its own kv-cache hooks on the model, so calls overlapping in
+# several threads corrupt each other's decoding
+whisper_lock = threading.Lock()
+
+def _peak_rss_mb():
+    """
+    Peak resident set size of the current process in MB, or None if unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def get_whisper_model(size=None):
+    """
+    Return a warm Whisper model, loading it at most once per process.
+    Args:
+        size (str): Model size ('tiny', 'base', ...). Defaults to WHISPER_MODEL_SIZE.
+    Returns:
+        whisper.Whisper: The loaded model.
+    """
+    size = size or WHISPER_MODEL_SIZE
+    model = _models.get(size)
+    if model is not None:
+        _model_stats[size]['hits'] += 1
+        return model
+    with _lock:
+        model = _models.get(size)
+        if model is None:
+            import whisper
+            rss_before = _peak_rss_mb()
+            start = time.perf_counter()
+            model = whisper.load_model(size)
+            load_time = time.perf_counter() - start
+            rss_after = _peak_rss_mb()
+            param_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+            _model_stats[size] = {
+                'load_time_s': load_time,
+                'param_mb': param_bytes / (1024 * 1024),
+                'rss_delta_mb': rss_after - rss_before if rss_before is not None else None,
+                'hits': 0
+            }
+            _models[size] = model
+            print(f"Loaded Whisper '{size}' model in {load_time:.2f}s ({_model_stats[size]['param_mb']:.0f} MB of weights)")
+    return model
+
+def get_model_stats():
+    """
+    Load time and memory use of every model loaded in this process.
+    Returns:
+        dict: Mapping of model size to load statistics.
+    """
+    return {size: dict(stats) for size, stats in _model_stats.items()}
+
+def clear_models():
+    """
+    Drop all cached models (mainly useful to free memory in long-lived processes).
+    """
+    with _lock:
+        _models.clear()
+        _model_stats.clear()
@@ -1,87 +1,230 @@
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-import pandas as pd
 import numpy as np
+import joblib
+import os
+import time
+from src.config import ANOMALY_MODEL_PATH
+from src.feature_extraction import FEATURE_SIGNATURE
+from src.metrics import timed
+from src.schema import FEATURE_NAMES, as_feature_table
 
-def detect_anomalies(features):
+# Bump whenever the artifact layout changes so old artifacts are rejected on load
+ANOMALY_MODEL_VERSION = 3
+
+# Percentiles of the reference cohort that map each feature onto [0, 1] before the
+# risk weights apply; values outside them are clipped, so the outliers the anomaly
+# model looks for do not stretch the scale
+RISK_RANGE_PERCENTILES = (5, 95)
+
+def feature_ranges(matrix):
+    """
+    Reference (low, high) of every feature column for the risk score.
+    Args:
+        matrix (np.ndarray): Feature matrix of shape (n_samples, n_features).
+    Returns:
+        np.ndarray: Array of shape (2, n_features) with the low and high percentiles.
+    """
+    return np.percentile(np.nan_to_num(np.asarray(matrix, dtype=np.float64)), RISK_RANGE_PERCENTILES, axis=0)
+
+@timed('train_anomaly_model')
+def train_anomaly_model(features):
+    """
+    Fit the scaler and Isolation Forest once on a reference cohort, and keep the
+    cohort's anomaly score range and feature ranges for risk scoring.
+    Args:
+        features (FeatureTable or dict): Features of the cohort.
+    Returns:
+        dict: Model artifact, or None if there are fewer than 2 samples.
+    """
+    if len(features) < 2:
+        return None
+    # scikit-learn is only imported to train; loading a saved model imports what it needs
+    import sklearn
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+    table = as_feature_table(features)
+    scaler = StandardScaler()
+    X = scaler.fit_transform(np.nan_to_num(table.matrix))
+    contamination = min(0.3, max(0.1, 1.0 / len(table)))  # Between 0.1 and 0.3
+    forest = IsolationForest(contamination=contamination, random_state=42)
+    forest.fit(X)
+    scores = -forest.decision_function(X)
+    return {
+        'version': ANOMALY_MODEL_VERSION,
+        'feature_signature': FEATURE_SIGNATURE,
+        'sklearn_version': sklearn.__version__,
+        'feature_names': list(FEATURE_NAMES),
+        'scaler': scaler,
+        'forest': forest,
+        'score_range': (float(np.min(scores)), float(np.max(scores))),
+        'feature_ranges': feature_ranges(table.matrix),
+        'n_samples': len(table),
+        'trained_at': time.time()
+    }
+
+def save_anomaly_model(model, path=ANOMALY_MODEL_PATH):
+    """
+    Persist a trained anomaly model artifact.
+    Args:
+        model (dict): Artifact from train_anomaly_model.
+        path (str): Output path.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"Anomaly model v{model['version']} trained on {model['n_samples']} samples saved to {path}")
+
+def load_anomaly_model(path=ANOMALY_MODEL_PATH):
+    """
+    Load a persisted anomaly model artifact.
+    Args:
+        path (str): Artifact path.
+    Returns:
+        dict: Model artifact, or None if missing or built for other model/feature versions.
+    """
+    if not os.path.exists(path):
+        print(f"No anomaly model found at {path}")
+        return None
+    try:
+        model = joblib.load(path)
+    except Exception as e:
+        print(f"Failed to load anomaly model from {path}: {e}")
+        return None
+    if model.get('version') != ANOMALY_MODEL_VERSION or model.get('feature_signature') != FEATURE_SIGNATURE:
+        print(f"Ignoring anomaly model at {path}: built for model v{model.get('version')}, "
+              f"features {model.get('feature_signature')}; retrain with run_pipeline")
+        return None
+    return model
+
+@timed('score_anomalies')
+def score_anomalies(model, features):
+    """
+    Score samples against a trained anomaly model without refitting.
+    Args:
+        model (dict): Artifact from train_anomaly_model or load_anomaly_model.
+        features (FeatureTable or dict): Features to score.
+    Returns:
+        dict: Mapping of file names to anomaly scores and labels.
+    """
+    table = as_feature_table(features)
+    X = model['scaler'].transform(np.nan_to_num(table.matrix))
+    scores = -model['forest'].decision_function(X)  # Positive scores are outliers
+    return {
+        file_name: {'anomaly_score': scores[i], 'is_anomaly': bool(scores[i] > 0)}
+        for i, file_name in enumerate(table)
+    }
+
+def detect_anomalies(features, model=None):
     """
     Apply Isolation Forest to detect anomalous samples.
     Args:
-        features (dict): Feature dictionary from feature_extraction.
+        features (FeatureTable or dict): Features to score.
+        model (dict): Trained anomaly model; if given, samples are scored against it instead of refitting.
     Returns:
         dict: Mapping of file names to anomaly scores and labels.
     """
-    # Convert features to DataFrame
     if not features:
         return {file_name: {'anomaly_score': 0, 'is_anomaly': False} for file_name in features}
-    
-    feature_df = pd.DataFrame.from_dict(features, orient='index')
-    feature_df = feature_df.fillna(0)  # Handle missing values
-    
-    # Standardize features
-    scaler = StandardScaler()
-    X = scaler.fit_transform(feature_df)
+    features = as_feature_table(features)
+    if model is not None:
+        return score_anomalies(model, features)
     
     # Handle small sample sizes
-    if len(feature_df) < 2:
+    model = train_anomaly_model(features)
+    if model is None:
         return {file_name: {'anomaly_score': 0, 'is_anomaly': False} for file_name in features}
-    
-    # Dynamically adjust contamination based on sample size
-    contamination = min(0.3, max(0.1, 1.0 / len(feature_df)))  # Between 0.1 and 0.3
-    model = IsolationForest(contamination=contamination, random_state=42)
-    predictions = model.fit_predict(X)
-    scores = -model.decision_function(X)  # Negative for higher scores indicating anomalies
-    
-    # Map results to file names
-    results = {}
-    for i, file_name in enumerate(features.keys()):
-        results[file_name] = {
-            'anomaly_score': scores[i],
-            'is_anomaly': predictions[i] == -1
-        }
-    
-    return results
+    return score_anomalies(model, features)
+
+# Weighted contribution of each feature to the risk score
+RISK_WEIGHTS = {
+    'pause_co': 0.2,        # Higher pause count increases risk
+    'pause_avg': 0.1,       # Longer pauses increase risk
+    'avg_spec': -0.1,       # Higher speech rate reduces risk
+    'ra_pitch': 0.1,        # Higher pitch range increases risk
+    'vari': 0.1,            # Higher variance increases risk
+    'hesitation': 0.2,      # More hesitations increase risk
+    'lexical_div': 0.1,     # Higher lexical diversity reduces risk
+    'incompleteness': 0.2,  # Higher incompleteness increases risk
+    'semantic': 0.1         # Semantic issues increase risk
+}
+ANOMALY_WEIGHT = 0.3
+
+def risk_scores_from_matrix(X, anomaly_scores, feature_names, score_range=None, ranges=None):
+    """
+    Vectorized risk scores for a whole feature matrix in one pass.
+    Each feature is scaled onto [0, 1] by fixed reference ranges before the risk
+    weights apply, and anomaly scores are min-max normalized against a fixed range
+    (both the reference cohort's, or else the batch's own), so each score is
+    independent of row order.
+    Args:
+        X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+        anomaly_scores (np.ndarray): Anomaly score per sample.
+        feature_names (list): Column names of X; columns without a weight are ignored.
+        score_range (tuple): (min, max) anomaly score used for normalization.
+        ranges (np.ndarray): (low, high) of every column of X, shape (2, n_features),
+            from feature_ranges.
+    Returns:
+        np.ndarray: Risk scores in the [0, 1] range.
+    """
+    X = np.nan_to_num(np.asarray(X, dtype=np.float64))
+    anomaly_scores = np.nan_to_num(np.asarray(anomaly_scores, dtype=np.float64))
+    if X.shape[0] == 0:
+        return np.zeros(0)
+    low, high = ranges if ranges is not None else feature_ranges(X)
+    scaled = np.clip((X - low) / (high - low + 1e-10), 0, 1)
+    weights = np.array([RISK_WEIGHTS.get(name, 0.0) for name in feature_names])
+    base_scores = scaled @ weights
+
+    if score_range is None:
+        score_range = (anomaly_scores.min(), anomaly_scores.max())
+    low, high = score_range
+    normalized_anomaly = np.clip((anomaly_scores - low) / (high - low + 1e-10), 0, 1)
+
+    total_scores = base_scores + normalized_anomaly * ANOMALY_WEIGHT
+    return np.clip(total_scores / 2, 0, 1)
 
-def calculate_risk_score(features, anomaly_results):
+@timed('calculate_risk_score')
+def calculate_risk_score(features, anomaly_results, score_range=None, ranges=None):
     """
     Calculate a risk score based on features and anomaly results.
     Args:
-        features (dict): Feature dictionary.
+        features (FeatureTable or dict): Features of the samples.
         anomaly_results (dict): Anomaly detection results.
+        score_range (tuple): (min, max) anomaly score of a reference cohort used to
+            normalize anomaly scores; defaults to the range within anomaly_results.
+        ranges (np.ndarray): Feature ranges of a reference cohort (the model's
+            'feature_ranges'); defaults to the ranges within features.
     Returns:
         dict: Mapping of file names to risk scores (0 to 1 range).
     """
     if not features or not anomaly_results:
         return {file_name: 0 for file_name in features}
     
-    risk_scores = {}
-    for file_name in features.keys():
-        feature_values = features[file_name]
-        anomaly_score = anomaly_results[file_name]['anomaly_score']
-        
-        # Weighted risk score with updated feature names
-        weights = {
-            'pause_co': 0.2,        # Higher pause count increases risk
-            'pause_avg': 0.1,       # Longer pauses increase risk
-            'avg_spec': -0.1,       # Higher speech rate reduces risk
-            'ra_pitch': 0.1,        # Higher pitch range increases risk
-            'vari': 0.1,            # Higher variance increases risk
-            'hesitation': 0.2,      # More hesitations increase risk
-            'lexical_div': 0.1,     # Higher lexical diversity reduces risk
-            'incompleteness': 0.2,  # Higher incompleteness increases risk
-            'semantic': 0.1         # Semantic issues increase risk
-        }
-        
-        # Calculate base score from features
-        base_score = sum(feature_values.get(k, 0) * w for k, w in weights.items())
-        
-        # Normalize anomaly score to [0, 1] and incorporate
-        anomaly_weight = 0.3
-        normalized_anomaly = (anomaly_score - np.min(list(anomaly_results.values())[0]['anomaly_score'])) / \
-                           (np.max(list(anomaly_results.values())[0]['anomaly_score']) - np.min(list(anomaly_results.values())[0]['anomaly_score']) + 1e-10)
-        total_score = base_score + (normalized_anomaly * anomaly_weight)
-        
-        # Normalize to [0, 1] range
-        risk_scores[file_name] = max(0, min(1, (total_score + abs(np.min(list(risk_scores.values()) if risk_scores else 0))) / 2))
-    
-    return risk_scores
\ No newline at end of file
+    table = as_feature_table(features)
+    file_names = table.keys()
+    anomaly_scores = np.array([anomaly_results[file_name]['anomaly_score'] for file_name in file_names], dtype=np.float64)
+    scores = risk_scores_from_matrix(table.matrix, anomaly_scores, FEATURE_NAMES, score_range, ranges)
+    return dict(zip(file_names, scores.tolist()))
+
+def score_sample(feature_values, model=None):
+    """
+    Anomaly and risk score of a single sample against the reference model.
+    Args:
+        feature_values (dict): Audio and text features of one sample.
+        model (dict): Reference anomaly model; without one the anomaly score is 0.
+    Returns:
+        dict: anomaly_score, is_anomaly and risk_score.
+    """
+    features = as_feature_table({'sample': feature_values})
+    if model is not None:
+        anomaly = score_anomalies(model, features)['sample']
+    else:
+        anomaly = {'anomaly_score': 0, 'is_anomaly': False}
+    score_range = model['score_range'] if model is not None else None
+    ranges = model['feature_ranges'] if model is not None else None
+    risk_score = calculate_risk_score(features, {'sample': anomaly}, score_range, ranges)['sample']
+    return {
+        'anomaly_score': float(anomaly['anomaly_score']),
+        'is_anomaly': anomaly['is_anomaly'],
+        'risk_score': risk_score
+    }
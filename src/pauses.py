@@ -0,0 +1,159 @@
+import numpy as np
+
+# Hysteresis thresholds as fractions of the range between the noise floor and the
+# loudest frame: a silence starts below SILENCE_ENTER and ends above SILENCE_EXIT
+SILENCE_ENTER = 0.05
+SILENCE_EXIT = 0.10
+
+# Percentile of the frame RMS taken as the noise floor
+NOISE_FLOOR_PERCENTILE = 10
+
+# Shortest silence counted as a pause, and shortest sound that splits two silences
+# (shorter sounds, e.g. clicks or breaths, are absorbed into the pause)
+MIN_PAUSE_SECONDS = 0.25
+MIN_SPEECH_SECONDS = 0.05
+
+def noise_floor(rms, percentile=NOISE_FLOOR_PERCENTILE):
+    """
+    Noise floor estimate of an RMS envelope (a low percentile of the frame energies).
+    """
+    return float(np.percentile(rms, percentile)) if len(rms) else 0.0
+
+def silent_frames(rms, enter_ratio=SILENCE_ENTER, exit_ratio=SILENCE_EXIT, percentile=NOISE_FLOOR_PERCENTILE):
+    """
+    Silence mask of an RMS envelope with hysteresis, without a Python loop.
+    Frames below the enter threshold are silent and frames above the exit threshold
+    are sound; frames in between keep the state of the last frame outside the band.
+    Args:
+        rms (np.array): Frame RMS envelope.
+        enter_ratio (float): Silence threshold, as a fraction of the floor-to-peak range.
+        exit_ratio (float): Sound threshold, likewise (at least enter_ratio).
+        percentile (float): Percentile of rms used as the noise floor.
+    Returns:
+        np.array: Boolean mask, True for silent frames.
+    """
+    rms = np.asarray(rms, dtype=np.float64)
+    if len(rms) == 0:
+        return np.zeros(0, dtype=bool)
+    floor = noise_floor(rms, percentile)
+    span = rms.max() - floor
+    if span <= 0:
+        # A flat envelope is all silence if it is digital silence, else all sound
+        return np.full(len(rms), rms.max() <= 0)
+    low, high = floor + enter_ratio * span, floor + exit_ratio * span
+    decided = (rms < low) | (rms > high)
+    # Index of the last decided frame at or before each frame (0 before the first one)
+    last = np.maximum.accumulate(np.where(decided, np.arange(len(rms)), 0))
+    silent = rms[last] < low
+    # Undecided frames before any decided frame follow the first decision
+    if decided.any():
+        silent[:np.argmax(decided)] = rms[np.argmax(decided)] < low
+    return silent
+
+def silence_runs(silent):
+    """
+    Run-length encode a silence mask.
+    Returns:
+        tuple: Start and end frame (exclusive) arrays of the silent runs.
+    """
+    edges = np.diff(np.concatenate(([0], silent.view(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def segment_pauses(rms, sr, hop_length, min_pause=MIN_PAUSE_SECONDS, min_speech=MIN_SPEECH_SECONDS,
+                   enter_ratio=SILENCE_ENTER, exit_ratio=SILENCE_EXIT, percentile=NOISE_FLOOR_PERCENTILE):
+    """
+    Find the pauses of a recording from its RMS envelope in one O(n) pass.
+    Silence before the first and after the last sound is not a pause.
+    Args:
+        rms (np.array): Frame RMS envelope.
+        sr (int): Sampling rate.
+        hop_length (int): Hop between RMS frames in samples.
+        min_pause (float): Shortest silence (seconds) counted as a pause.
+        min_speech (float): Shortest sound (seconds) that separates two silences.
+        enter_ratio, exit_ratio, percentile: Hysteresis thresholds and noise floor, see silent_frames.
+    Returns:
+        dict: 'durations' (seconds of each pause, in order), 'starts' (pause start
+            times in seconds), 'speech_seconds', 'active_start' (time of the first
+            sound) and 'active_seconds' (first to last sound).
+    """
+    frame_seconds = hop_length / sr
+    silent = silent_frames(rms, enter_ratio, exit_ratio, percentile)
+    starts, ends = silence_runs(silent)
+    if len(starts) > 1:
+        # Merge silences separated by sound shorter than min_speech
+        split = starts[1:] - ends[:-1] >= min_speech / frame_seconds
+        starts = starts[np.concatenate(([True], split))]
+        ends = ends[np.concatenate((split, [True]))]
+    n_frames = len(silent)
+    inner = (starts > 0) & (ends < n_frames)
+    if not silent.all() and n_frames:
+        sound = np.flatnonzero(~silent)
+        active_start = sound[0] * frame_seconds
+        active = (sound[-1] + 1 - sound[0]) * frame_seconds
+    else:
+        active_start, active = 0.0, 0.0
+    durations = (ends - starts)[inner] * frame_seconds
+    keep = durations >= min_pause
+    durations = durations[keep]
+    return {
+        'durations': durations,
+        'starts': starts[inner][keep] * frame_seconds,
+        'speech_seconds': max(active - durations.sum(), 0.0),
+        'active_start': active_start,
+        'active_seconds': active
+    }
+
+def pause_stats(rms, sr, hop_length, **kwargs):
+    """
+    Pause features of an RMS envelope (see segment_pauses for the keyword arguments).
+    Returns:
+        dict: 'pause_co' (number of pauses), 'pause_avg' and 'pause_p90' (mean and
+            90th percentile pause length in seconds) and 'speech_ratio' (share of the
+            time from first to last sound that is not a pause).
+    """
+    pauses = segment_pauses(rms, sr, hop_length, **kwargs)
+    durations = pauses['durations']
+    return {
+        'pause_co': len(durations),
+        'pause_avg': float(durations.mean()) if len(durations) else 0.0,
+        'pause_p90': float(np.percentile(durations, 90)) if len(durations) else 0.0,
+        'speech_ratio': pauses['speech_seconds'] / pauses['active_seconds'] if pauses['active_seconds'] else 0.0
+    }
+
+class PauseTracker:
+    """
+    Pause features of a stream of RMS blocks.
+
+    Blocks are appended to one growing float32 envelope (4 bytes per frame, with
+    amortized growth), so the thresholds always use the noise floor and peak of
+    everything seen so far and the result equals pause_stats on the whole envelope.
+    """
+
+    def __init__(self, sr, hop_length, **kwargs):
+        self.sr = sr
+        self.hop_length = hop_length
+        self.kwargs = kwargs
+        self._rms = np.zeros(0, dtype=np.float32)
+        self.n_frames = 0
+
+    def update(self, rms_block):
+        """
+        Append the RMS values of the next frames.
+        """
+        rms_block = np.asarray(rms_block, dtype=np.float32)
+        if self.n_frames + len(rms_block) > len(self._rms):
+            grown = np.zeros(max(1024, 2 * len(self._rms), self.n_frames + len(rms_block)), dtype=np.float32)
+            grown[:self.n_frames] = self._rms[:self.n_frames]
+            self._rms = grown
+        self._rms[self.n_frames:self.n_frames + len(rms_block)] = rms_block
+        self.n_frames += len(rms_block)
+
+    @property
+    def rms(self):
+        return self._rms[:self.n_frames]
+
+    def stats(self):
+        """
+        Pause features over every frame so far, see pause_stats.
+        """
+        return pause_stats(self.rms, self.sr, self.hop_length, **self.kwargs)
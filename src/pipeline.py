@@ -1,57 +1,177 @@
 import sys
 import os
+import glob
+import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.preprocess import preprocess_audio_files, load_audio, speech_to_text
-from src.feature_extraction import extract_features
-from src.modeling import detect_anomalies, calculate_risk_score
-from src.visualization import save_all_plots
-import pandas as pd
+from functools import partial
+from src.preprocess import (preprocess_file, list_audio_files, map_audio_files, load_audio, load_audio_bytes,
+                            speech_to_text, transcribe_segment, transcribe_words, _init_worker)
+from src.model_registry import get_whisper_model, get_model_stats
+from src.config import (NUM_WORKERS, CACHE_ENABLED, ANOMALY_MODEL_PATH, ANALYSIS_SR, STREAMING_MIN_SECONDS,
+                        WHISPER_MODEL_SIZE, VISUALIZATION_ENABLED, PROFILE_DIR, TIMING_FEATURES)
+from src import metrics
+from src.schema import FeatureTable
+from src.cache import get_feature_cache
+from src.transcription import WHISPER_SR
+from src.vad import gate_for_whisper, map_words, report_saving
+from src.feature_extraction import extract_audio_features, extract_text_features, transcript_features, FEATURE_SIGNATURE
+from src.text_features import extract_text_features_batch
+from src.streaming import extract_audio_features_streaming, audio_duration
+from src.modeling import (detect_anomalies, calculate_risk_score, train_anomaly_model, save_anomaly_model,
+                          load_anomaly_model, score_sample, ANOMALY_MODEL_VERSION)
+import numpy as np
 
-def save_results(features, anomaly_results, risk_scores, output_path='results/results.csv'):
+def process_file(file_path, model=None):
     """
-    Save results to a CSV file with the specified format.
+    Decode, transcribe and extract features for one file, then drop the waveform.
+    WAV/FLAC recordings longer than STREAMING_MIN_SECONDS are never decoded whole:
+    their audio features are computed block by block instead.
     Args:
-        features (dict): Extracted features.
-        anomaly_results (dict): Anomaly detection results.
-        risk_scores (dict): Calculated risk scores.
-        output_path (str): Path to save CSV.
+        file_path (str): Path to audio file.
+        model (whisper.Whisper): Loaded model; defaults to the process-wide registry model.
     Returns:
-        pd.DataFrame: The saved DataFrame for visualization.
-    """
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    data = []
-    for file_name in features:
-        feature_values = features[file_name]
-        anomaly_value = anomaly_results[file_name]['is_anomaly']
-        risk_value = risk_scores[file_name]
-        row = {
-            'sample_id': file_name,
-            'pause_co': feature_values.get('pause_co', 0),
-            'pause_avg': feature_values.get('pause_avg', 0),
-            'avg_spec': feature_values.get('avg_spec', 0),
-            'ra_pitch': feature_values.get('ra_pitch', 0),
-            'vari': feature_values.get('vari', 0),
-            'hesitation': feature_values.get('hesitation', 0),
-            'lexical_div': feature_values.get('lexical_div', 0),
-            'incompleteness': feature_values.get('incompleteness', 0),
-            'semantic': feature_values.get('semantic', 0),
-            'anomaly': 1 if anomaly_value else 0,
-            'risk_score': risk_value
-        }
-        data.append(row)
-    df = pd.DataFrame(data)
-    df.to_csv(output_path, index=False, encoding='utf-8')
-    print(f"Results saved to {output_path}")
-    return df
-
-def run_pipeline(audio_dir):
+        dict: Transcript, audio features, text features (with the timing features in
+            the timing feature mode) and duration, or None if the file cannot be processed.
+    """
+    duration = audio_duration(file_path) if file_path.lower().endswith(('.wav', '.flac')) else None
+    if duration is not None and duration >= STREAMING_MIN_SECONDS:
+        audio_features = extract_audio_features_streaming(file_path, target_sr=ANALYSIS_SR)
+        if audio_features is None:
+            print(f"Skipping feature extraction for {os.path.basename(file_path)} due to audio processing error")
+            return None
+        if TIMING_FEATURES:
+            text, words = transcribe_words(file_path, model)
+        else:
+            text, words = speech_to_text(file_path, model), None
+        return {'text': text, 'audio_features': audio_features,
+                'text_features': transcript_features(text, words, duration), 'duration': duration}
+
+    data = preprocess_file(file_path, model)
+    if data is None:
+        return None
+    audio_features = data['audio_features']
+    if audio_features is None:
+        print(f"Skipping feature extraction for {os.path.basename(file_path)} due to audio processing error")
+        return None
+    duration = len(data['audio']) / data['sr']
+    text_features = transcript_features(data['text'], data['words'], duration)
+    return {'text': data['text'], 'audio_features': audio_features, 'text_features': text_features, 'duration': duration}
+
+def stream_features(audio_dir, num_workers=NUM_WORKERS, model=None, use_cache=CACHE_ENABLED):
+    """
+    Stream feature records for every audio file in a directory, one file at a time.
+    Only the small per-file record is kept, so memory stays flat with corpus size.
+    Files whose content is already in the feature cache are not decoded or transcribed again.
+    Args:
+        audio_dir (str): Directory containing audio files.
+        num_workers (int): Worker processes (1 runs sequentially in this process).
+        model (whisper.Whisper): Loaded model for sequential runs; defaults to the registry model.
+        use_cache (bool): Whether to read and write the on-disk feature cache.
+    Yields:
+        tuple: (file_name, record) in sorted file order, skipping files that failed.
+    """
+    audio_files = list_audio_files(audio_dir)
+    if not audio_files:
+        return
+    print(f"Found {len(audio_files)} audio files in {audio_dir}")
+    file_paths = [os.path.join(audio_dir, f) for f in audio_files]
+
+    cache = get_feature_cache() if use_cache else None
+    keys, cached = {}, {}
+    if cache is not None:
+        for file_path in file_paths:
+            try:
+                keys[file_path] = cache.key_for_file(file_path)
+            except OSError as e:
+                print(f"Could not hash {file_path}: {e}")
+                continue
+            record = cache.get(keys[file_path])
+            # Entries written by the web app for user-supplied transcripts lack Whisper text
+            if record is not None and record['text_features'] is not None:
+                cached[file_path] = record
+        print(f"Feature cache: {len(cached)}/{len(file_paths)} files already processed")
+
+    # Misses come back in the same relative order, so the two streams merge in sorted order
+    misses = [p for p in file_paths if p not in cached]
+    computed = map_audio_files(partial(process_file, model=model), misses, num_workers)
+    for file_path in file_paths:
+        if file_path in cached:
+            record = cached[file_path]
+        else:
+            _, record = next(computed)
+            if record is None:
+                continue
+            if cache is not None and file_path in keys:
+                cache.put(keys[file_path], record)
+            print(f"Extracted features for {os.path.basename(file_path)}")
+        yield os.path.basename(file_path), record
+
+def save_transcript(file_name, text, output_dir='data/processed'):
+    """
+    Save a transcript next to the other processed transcripts.
+    Args:
+        file_name (str): Audio file name.
+        text (str): Transcribed text.
+        output_dir (str): Directory for transcript files.
+    """
+    if not text:
+        return
+    try:
+        with open(os.path.join(output_dir, f'{file_name}.txt'), 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Saved transcript for {file_name}")
+    except Exception as e:
+        print(f"Failed to save transcript for {file_name}: {e}")
+
+def rescore_transcripts(transcript_dir='data/processed', num_workers=NUM_WORKERS):
+    """
+    Text features of every saved transcript, without the audio (e.g. after a change
+    to the text features), computed in one batch.
+    Args:
+        transcript_dir (str): Directory of <audio file name>.txt transcripts.
+        num_workers (int): Worker processes (1 runs sequentially in this process).
+    Returns:
+        dict: Mapping of audio file names to text features, in sorted file order.
+    """
+    paths = sorted(glob.glob(os.path.join(transcript_dir, '*.txt')))
+    texts = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            texts.append(f.read())
+    start = time.perf_counter()
+    features = extract_text_features_batch(texts, num_workers)
+    print(f"Re-scored {len(paths)} transcripts in {time.perf_counter() - start:.2f}s")
+    return {os.path.basename(path)[:-len('.txt')]: text_features for path, text_features in zip(paths, features)}
+
+def print_stage_timings(timings):
+    """
+    Print the wall time spent in each pipeline stage.
+    Args:
+        timings (dict): Mapping of stage names to seconds.
+    """
+    total = sum(timings.values())
+    print("Stage timings:")
+    for stage, seconds in timings.items():
+        share = 100 * seconds / total if total else 0
+        print(f"  {stage:<16} {seconds:8.2f}s ({share:4.1f}%)")
+    print(f"  {'total':<16} {total:8.2f}s")
+
+def run_pipeline(audio_dir, num_workers=NUM_WORKERS, use_cache=CACHE_ENABLED, model_path=ANOMALY_MODEL_PATH,
+                 visualize=VISUALIZATION_ENABLED, profile_dir=PROFILE_DIR):
     """
     Run the full pipeline for cognitive decline detection.
     Args:
         audio_dir (str): Directory containing audio files.
+        num_workers (int): Worker processes for preprocessing (1 runs sequentially).
+        use_cache (bool): Reuse transcripts and features of unchanged files from earlier runs.
+        model_path (str): Where to save the anomaly model fitted on this cohort, used as the
+            reference for single-file scoring (None to skip saving).
+        visualize (bool): Render plots of this run to results/plots once its results are stored.
+        profile_dir (str): Profile the run with cProfile and write run-<run_id>.prof there;
+            the run then uses a single process so worker code is profiled too.
     Returns:
-        tuple: Features, anomaly results, and risk scores.
+        tuple: Features (FeatureTable), anomaly results, and risk scores.
     """
     if not os.path.exists(audio_dir):
         print(f"Error: Audio directory {audio_dir} does not exist")
@@ -60,40 +180,93 @@ def run_pipeline(audio_dir):
     os.makedirs('data/processed', exist_ok=True)
     os.makedirs('results', exist_ok=True)
     
-    print("Starting preprocessing...")
-    processed_data = preprocess_audio_files(audio_dir)
-    if not processed_data:
+    # pyarrow, pandas and scikit-learn are only needed by batch runs, not by scoring
+    from src.results_store import new_run_id
+    run_id = new_run_id()
+    if profile_dir:
+        with metrics.profiled(os.path.join(profile_dir, f"run-{run_id}.prof")):
+            return _run_pipeline(audio_dir, run_id, 1, use_cache, model_path, visualize)
+    return _run_pipeline(audio_dir, run_id, num_workers, use_cache, model_path, visualize)
+
+def _run_pipeline(audio_dir, run_id, num_workers, use_cache, model_path, visualize):
+    """
+    The stages of run_pipeline, for one run id.
+    """
+    import sklearn
+    from src.results_store import ResultsStore
+    started_at = time.time()
+    timings = {}
+    print(f"Preprocessing and extracting features (run {run_id})...")
+    start = time.perf_counter()
+    features = FeatureTable()
+    for file_name, record in stream_features(audio_dir, num_workers, use_cache=use_cache):
+        save_transcript(file_name, record['text'])
+        features[file_name] = {**record['audio_features'], **record['text_features']}
+    timings['extraction'] = time.perf_counter() - start
+    if not features:
         print("No files processed. Exiting pipeline.")
         return {}, {}, {}
     
-    for file_name, data in processed_data.items():
-        if data['text']:
-            try:
-                with open(f'data/processed/{file_name}.txt', 'w', encoding='utf-8') as f:
-                    f.write(data['text'])
-                print(f"Saved transcript for {file_name}")
-            except Exception as e:
-                print(f"Failed to save transcript for {file_name}: {e}")
-    
-    print("Extracting features...")
-    features = extract_features(processed_data)
-    
     print("Detecting anomalies...")
-    anomaly_results = detect_anomalies(features)
+    start = time.perf_counter()
+    anomaly_model = train_anomaly_model(features)
+    if anomaly_model is not None and model_path:
+        save_anomaly_model(anomaly_model, model_path)
+    anomaly_results = detect_anomalies(features, anomaly_model)
+    timings['anomalies'] = time.perf_counter() - start
     
     print("Calculating risk scores...")
-    risk_scores = calculate_risk_score(features, anomaly_results)
-    
-    print("Generating visualizations...")
-    df = save_results(features, anomaly_results, risk_scores)
-    save_all_plots(df, 'results/plots')
+    start = time.perf_counter()
+    ranges = anomaly_model['feature_ranges'] if anomaly_model is not None else None
+    risk_scores = calculate_risk_score(features, anomaly_results, ranges=ranges)
+    timings['risk_scores'] = time.perf_counter() - start
     
     print("Saving results...")
-    save_results(features, anomaly_results, risk_scores)  # Ensure CSV is saved
+    start = time.perf_counter()
+    store = ResultsStore()
+    store.append(run_id, features, anomaly_results, risk_scores)
+    timings['saving'] = time.perf_counter() - start
     
+    if visualize:
+        print("Generating visualizations...")
+        start = time.perf_counter()
+        # Imported here so runs without plots never load matplotlib/seaborn
+        from src.visualization import save_all_plots, PLOT_COLUMNS
+        save_all_plots(store.read(columns=PLOT_COLUMNS, run_ids=[run_id]), 'results/plots')
+        timings['visualization'] = time.perf_counter() - start
+    
+    print_stage_timings(timings)
+    store.record_run(run_id, started_at, len(features), {
+        'whisper_model': WHISPER_MODEL_SIZE,
+        'feature_signature': FEATURE_SIGNATURE,
+        'anomaly_model_version': ANOMALY_MODEL_VERSION,
+        'sklearn_version': sklearn.__version__
+    }, timings)
+    print(f"Run {run_id} recorded in {store.root}")
+    if use_cache:
+        cache = get_feature_cache()
+        cache.evict()
+        print(f"Cache stats: {cache.stats()}")
+    if get_model_stats():
+        print(f"Model stats: {get_model_stats()}")
     print("Pipeline completed!")
     return features, anomaly_results, risk_scores
 
+_reference_model = None
+_reference_loaded = False
+
+def get_reference_model():
+    """
+    Load the persisted reference anomaly model once per process.
+    Returns:
+        dict: Model artifact, or None if no compatible artifact has been trained.
+    """
+    global _reference_model, _reference_loaded
+    if not _reference_loaded:
+        _reference_model = load_anomaly_model()
+        _reference_loaded = True
+    return _reference_model
+
 def get_risk_score(audio_path):
     """
     API-ready function to calculate risk score for a single audio file.
@@ -106,17 +279,249 @@ def get_risk_score(audio_path):
         print(f"Error: File {audio_path} does not exist")
         return None
     
-    audio, sr = load_audio(audio_path)
-    if audio is None:
-        return None
-    text = speech_to_text(audio_path)
-    processed_data = {os.path.basename(audio_path): {'audio': audio, 'sr': sr, 'text': text}}
-    
-    features = extract_features(processed_data)
-    anomaly_results = detect_anomalies(features)
-    risk_scores = calculate_risk_score(features, anomaly_results)
+    cache = get_feature_cache() if CACHE_ENABLED else None
+    key = cache.key_for_file(audio_path) if cache is not None else None
+    record = cache.get(key) if cache is not None else None
+    if record is None or record['text_features'] is None:
+        record = process_file(audio_path, get_whisper_model())
+        if record is None:
+            return None
+        if cache is not None:
+            cache.put(key, record)
+    features = {os.path.basename(audio_path): {**record['audio_features'], **record['text_features']}}
+    anomaly_model = get_reference_model()
+    anomaly_results = detect_anomalies(features, anomaly_model)
+    score_range = anomaly_model['score_range'] if anomaly_model is not None else None
+    ranges = anomaly_model['feature_ranges'] if anomaly_model is not None else None
+    risk_scores = calculate_risk_score(features, anomaly_results, score_range, ranges)
     
     return risk_scores.get(os.path.basename(audio_path))
 
+def prepare_upload(data, transcript=None, use_cache=CACHE_ENABLED):
+    """
+    CPU-bound first half of analyze_audio_bytes: cache lookup, decoding and audio
+    features. When a transcript is still needed, the 16 kHz audio for Whisper is kept.
+    Args:
+        data (bytes): Encoded audio file contents.
+        transcript (str): User-supplied transcript, if any.
+        use_cache (bool): Read the shared feature cache.
+    Returns:
+        dict: Cache key and hit, audio features, transcript (None if Whisper is needed),
+            cached text features of a cached transcript, audio duration, 'audio' for
+            Whisper (or None; voice-activity gated, see src/vad.py) with its kept
+            'vad_spans', and 'timings'.
+    Raises:
+        ValueError: If the audio cannot be decoded or its features extracted.
+    """
+    timings = {}
+    start = time.perf_counter()
+    cache = get_feature_cache() if use_cache else None
+    key = cache.key_for_bytes(data) if cache is not None else None
+    cached = cache.get(key) if cache is not None else None
+    timings['cache_lookup'] = time.perf_counter() - start
+
+    audio = sr = audio_features = text_features = None
+    if cached is not None:
+        audio_features = cached['audio_features']
+        if not transcript and cached['text']:
+            transcript = cached['text']
+            # Includes the timing features, which need Whisper's word timestamps
+            text_features = cached['text_features']
+    if cached is None or not transcript:
+        start = time.perf_counter()
+        audio, sr = load_audio_bytes(data)
+        timings['decode'] = time.perf_counter() - start
+        if audio is None:
+            raise ValueError("Failed to load audio file")
+    rms = None
+    if cached is None:
+        start = time.perf_counter()
+        audio_features, rms = extract_audio_features(audio, sr, return_rms=True)
+        timings['audio_features'] = time.perf_counter() - start
+        if audio_features is None:
+            raise ValueError("Failed to extract features")
+    whisper_audio = spans = None
+    if not transcript:
+        start = time.perf_counter()
+        # Reuses the RMS envelope of the audio features (computed here on a cache hit)
+        whisper_audio, spans = gate_for_whisper(audio, sr, rms)
+        timings['vad'] = time.perf_counter() - start
+    return {
+        'key': key,
+        'cache_hit': cached is not None,
+        'audio_features': audio_features,
+        'transcript': transcript or None,
+        'text_features': text_features,
+        'duration': len(audio) / sr if audio is not None else cached.get('duration'),
+        'audio': whisper_audio,
+        'vad_spans': spans,
+        'timings': timings
+    }
+
+def complete_features(prepared, whisper_transcript=None, use_cache=CACHE_ENABLED):
+    """
+    Text features and cache update for a prepared upload.
+    Args:
+        prepared (dict): Result of prepare_upload.
+        whisper_transcript (str): Whisper output when no transcript was supplied.
+        use_cache (bool): Write the shared feature cache.
+    Returns:
+        dict: Audio and text feature values as plain Python numbers.
+    Raises:
+        ValueError: If the features contain NaN or infinite values.
+    """
+    transcript = prepared['transcript'] or whisper_transcript
+    start = time.perf_counter()
+    text_features = prepared['text_features']
+    if text_features is None:
+        text_features = transcript_features(transcript, prepared.get('words'), prepared['duration'])
+    prepared['timings']['text_features'] = time.perf_counter() - start
+    audio_features = prepared['audio_features']
+    if use_cache and prepared['key'] is not None and (not prepared['cache_hit'] or whisper_transcript is not None):
+        # Only Whisper output is cached as the transcript; user text is per request
+        get_feature_cache().put(prepared['key'], {
+            'text': whisper_transcript,
+            'audio_features': audio_features,
+            'text_features': text_features if whisper_transcript else None,
+            'duration': prepared['duration']
+        })
+
+    feature_values = {**audio_features, **text_features}
+    if any(np.isnan(v) or np.isinf(v) for v in feature_values.values()):
+        raise ValueError(f"Invalid feature values: {feature_values}")
+    return {name: value.item() if isinstance(value, np.generic) else value for name, value in feature_values.items()}
+
+def finish_upload(prepared, file_name, whisper_transcript=None, anomaly_model=None, use_cache=CACHE_ENABLED):
+    """
+    Second half of analyze_audio_bytes: text features, cache update and scoring.
+    Args:
+        prepared (dict): Result of prepare_upload.
+        file_name (str): Uploaded file name, used for the sample id.
+        whisper_transcript (str): Whisper output when no transcript was supplied.
+        anomaly_model (dict): Reference anomaly model; defaults to get_reference_model().
+        use_cache (bool): Write the shared feature cache.
+    Returns:
+        dict: Sample id, feature values, anomaly flag and score, risk score and 'timings'.
+    Raises:
+        ValueError: If the features contain NaN or infinite values.
+    """
+    feature_values = complete_features(prepared, whisper_transcript, use_cache)
+    timings = prepared['timings']
+
+    start = time.perf_counter()
+    scores = score_sample(feature_values, anomaly_model if anomaly_model is not None else get_reference_model())
+    timings['scoring'] = time.perf_counter() - start
+
+    result = {'sample_id': os.path.splitext(file_name)[0], **feature_values}
+    result['anomaly'] = scores['is_anomaly']
+    result['anomaly_score'] = scores['anomaly_score']
+    result['risk_score'] = scores['risk_score']
+    result['timings'] = timings
+    return result
+
+def transcribe_prepared(prepared, model=None):
+    """
+    Run Whisper on a prepared upload that has no transcript yet.
+    Returns:
+        str: Whisper transcript, or None if a transcript was supplied.
+    Raises:
+        ValueError: If transcription fails.
+    """
+    if prepared['transcript'] is not None:
+        return None
+    start = time.perf_counter()
+    if TIMING_FEATURES:
+        whisper_transcript, words = transcribe_words(prepared.pop('audio'), model)
+        prepared['words'] = map_words(words, prepared['vad_spans'])
+    else:
+        whisper_transcript = transcribe_segment(prepared.pop('audio'), WHISPER_SR, model)
+    prepared['timings']['transcription'] = time.perf_counter() - start
+    report_saving(prepared['duration'], prepared['vad_spans'], prepared['timings']['transcription'], 'upload')
+    if whisper_transcript is None:
+        raise ValueError("Failed to generate transcript")
+    return whisper_transcript
+
+def extract_upload_features(data, transcript=None, model=None, use_cache=CACHE_ENABLED):
+    """
+    Feature values of one uploaded recording without scoring it, for cohort scoring.
+    Args:
+        data (bytes): Encoded audio file contents.
+        transcript (str): User-supplied transcript; Whisper is used when empty.
+        model (whisper.Whisper): Loaded model; defaults to the process-wide registry model.
+        use_cache (bool): Read and write the shared feature cache.
+    Returns:
+        tuple: Feature values and per-stage timings.
+    Raises:
+        ValueError: If the audio cannot be decoded, transcribed or yields invalid features.
+    """
+    prepared = prepare_upload(data, transcript, use_cache)
+    whisper_transcript = transcribe_prepared(prepared, model)
+    return complete_features(prepared, whisper_transcript, use_cache), prepared['timings']
+
+def analyze_audio_bytes(data, file_name, transcript=None, model=None, anomaly_model=None, use_cache=CACHE_ENABLED):
+    """
+    Analyze one uploaded recording held in memory (no temp files) and time each stage.
+    Shared by the web apps; safe to run in a worker process.
+    Args:
+        data (bytes): Encoded audio file contents.
+        file_name (str): Uploaded file name, used for the sample id.
+        transcript (str): User-supplied transcript; Whisper is used when empty.
+        model (whisper.Whisper): Loaded model; defaults to the process-wide registry model.
+        anomaly_model (dict): Reference anomaly model; defaults to get_reference_model().
+        use_cache (bool): Read and write the shared feature cache.
+    Returns:
+        dict: Sample id, feature values, anomaly flag and score, risk score and
+            'timings' (seconds per stage).
+    Raises:
+        ValueError: If the audio cannot be decoded, transcribed or yields invalid features.
+    """
+    prepared = prepare_upload(data, transcript, use_cache)
+    whisper_transcript = transcribe_prepared(prepared, model)
+    return finish_upload(prepared, file_name, whisper_transcript, anomaly_model, use_cache)
+
+def warm_up(whisper_model=True):
+    """
+    Pay every one-off cost of the first request up front: the text tokenizer (NLTK
+    and its data with TEXT_TOKENIZER=nltk), the lazily imported scipy/scikit-learn
+    modules, numba-compiled librosa code, the reference anomaly model and
+    (optionally) Whisper.
+    Args:
+        whisper_model (bool): Also load the Whisper model.
+    Returns:
+        dict: Seconds spent on each step.
+    """
+    timings = {}
+    start = time.perf_counter()
+    extract_text_features("Um, this is a warm-up sentence. It has two")
+    timings['text'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    t = np.arange(WHISPER_SR, dtype=np.float32) / WHISPER_SR
+    extract_audio_features(0.1 * np.sin(2 * np.pi * 220 * t), WHISPER_SR)
+    timings['audio'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_reference_model()
+    timings['anomaly_model'] = time.perf_counter() - start
+
+    if whisper_model:
+        start = time.perf_counter()
+        get_whisper_model()
+        timings['whisper'] = time.perf_counter() - start
+    # Warm-up calls are not requests; keep them out of the stage latency metrics
+    metrics.snapshot(reset=True)
+    print("Warm-up: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()))
+    return timings
+
+def init_scoring_worker(model_size=WHISPER_MODEL_SIZE, num_threads=1):
+    """
+    Pool initializer for web workers: pin torch threads and warm Whisper, the
+    reference anomaly model and the feature code, so requests never pay the load
+    cost. model_size None skips Whisper (when transcription runs in the batching
+    service instead).
+    """
+    _init_worker(model_size, num_threads)
+    warm_up(whisper_model=False)
+
 if __name__ == "__main__":
     run_pipeline('data/raw/')
\ No newline at end of file
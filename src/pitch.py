@@ -0,0 +1,236 @@
+import librosa
+import numpy as np
+
+PITCH_BACKENDS = ('yin', 'autocorr', 'piptrack')
+
+# Frames processed per FFT batch, bounding temporary memory on long recordings
+_FRAME_BATCH = 256
+
+def frame_audio(audio, frame_length, hop_length, center=True):
+    """
+    Split audio into overlapping frames without copying (a strided view).
+    Args:
+        audio (np.array): Audio time series.
+        frame_length (int): Samples per frame.
+        hop_length (int): Hop between frames in samples.
+        center (bool): Zero-pad so frame t is centred on sample t * hop_length, as librosa does.
+    Returns:
+        np.array: Array of shape (n_frames, frame_length).
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if center:
+        audio = np.pad(audio, frame_length // 2)
+    if len(audio) < frame_length:
+        return np.zeros((0, frame_length), dtype=np.float32)
+    return librosa.util.frame(audio, frame_length=frame_length, hop_length=hop_length, axis=0)
+
+def _frame_rms(frames, length=None):
+    """
+    RMS of each frame, computed in batches; only the first `length` samples if given.
+    """
+    length = length or frames.shape[1]
+    rms = np.empty(len(frames))
+    for start in range(0, len(frames), _FRAME_BATCH):
+        batch = frames[start:start + _FRAME_BATCH, :length]
+        rms[start:start + len(batch)] = np.sqrt(np.einsum('ij,ij->i', batch, batch, dtype=np.float64) / length)
+    return rms
+
+def yin_candidates(audio, sr, fmin=65.0, fmax=500.0, frame_length=2048, hop_length=512,
+                   threshold=0.2, center=True):
+    """
+    YIN fundamental frequency candidates per frame, before the energy gate.
+    The difference function is computed with FFTs in batches of frames, so memory
+    stays bounded regardless of clip length.
+    Args:
+        audio (np.array): Audio time series.
+        sr (int): Sampling rate.
+        fmin (float): Lowest f0 considered (Hz).
+        fmax (float): Highest f0 considered (Hz).
+        frame_length (int): Samples per analysis frame.
+        hop_length (int): Hop between frames in samples.
+        threshold (float): Aperiodicity below which a frame counts as voiced.
+        center (bool): Centre frames as librosa does.
+    Returns:
+        tuple: f0 per frame in Hz (NaN for aperiodic frames) and the RMS each frame is gated on.
+    """
+    frames = frame_audio(audio, frame_length, hop_length, center)
+    window = frame_length // 2
+    min_period = max(1, int(np.floor(sr / fmax)))
+    max_period = min(frame_length - window - 1, int(np.ceil(sr / fmin)))
+    f0 = np.full(len(frames), np.nan)
+    # YIN compares the first `window` samples with lagged copies, so gate on those
+    rms = _frame_rms(frames, length=window)
+    if len(frames) == 0 or max_period <= min_period:
+        return f0, rms
+    # Circular wrap-around only reaches lags beyond window + max_period, which are never read
+    n_fft = 1 << int(np.ceil(np.log2(max(frame_length, window + max_period + 2))))
+    lags = np.arange(max_period + 2)
+
+    for start in range(0, len(frames), _FRAME_BATCH):
+        x = frames[start:start + _FRAME_BATCH].astype(np.float64)
+        # d(tau) = E(0) + E(tau) - 2 * r(tau) over a window of `window` samples
+        r = np.fft.irfft(np.conj(np.fft.rfft(x[:, :window], n_fft)) * np.fft.rfft(x, n_fft), n_fft)[:, :max_period + 2]
+        energy = np.concatenate([np.zeros((len(x), 1)), np.cumsum(x ** 2, axis=1)], axis=1)
+        energy_tau = energy[:, lags + window] - energy[:, lags]
+        diff = np.maximum(energy_tau[:, :1] + energy_tau - 2 * r, 0)
+        # Cumulative mean normalised difference
+        cmnd = np.ones_like(diff)
+        cumulative = np.cumsum(diff[:, 1:], axis=1)
+        cmnd[:, 1:] = diff[:, 1:] * lags[1:] / np.maximum(cumulative, 1e-12)
+
+        search = cmnd[:, min_period:max_period + 1]
+        below = search < threshold
+        # First dip under the threshold (avoids octave errors), else the global minimum
+        first = np.where(below.any(axis=1), below.argmax(axis=1), search.argmin(axis=1))
+        # Walk down to the bottom of that dip within one minimum period
+        offsets = first[:, None] + np.arange(min_period)[None, :]
+        offsets = np.minimum(offsets, search.shape[1] - 1)
+        local = np.take_along_axis(search, offsets, axis=1)
+        best = np.take_along_axis(offsets, local.argmin(axis=1)[:, None], axis=1)[:, 0]
+        aperiodicity = search[np.arange(len(search)), best]
+        # Energy must be steady across the lag; onsets and offsets fail this
+        energy_ratio = energy_tau[np.arange(len(x)), best + min_period] / np.maximum(energy_tau[:, 0], 1e-12)
+        steady = (energy_ratio > 0.5) & (energy_ratio < 2.0)
+
+        # Parabolic interpolation around the chosen lag
+        tau = best + min_period
+        left = cmnd[np.arange(len(cmnd)), np.maximum(tau - 1, 1)]
+        centre = cmnd[np.arange(len(cmnd)), tau]
+        right = cmnd[np.arange(len(cmnd)), np.minimum(tau + 1, max_period + 1)]
+        denom = left - 2 * centre + right
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0)
+        period = tau + np.clip(shift, -1, 1)
+
+        voiced = (aperiodicity < threshold) & steady
+        f0[start:start + len(x)] = np.where(voiced, sr / period, np.nan)
+    return f0, rms
+
+def autocorr_candidates(audio, sr, fmin=65.0, fmax=500.0, frame_length=2048, hop_length=512,
+                        threshold=0.45, analysis_sr=8000, center=True):
+    """
+    Decimated normalised-autocorrelation f0 candidates per frame, before the energy gate.
+    Audio is decimated to about analysis_sr first, which shrinks every frame and FFT.
+    Args:
+        audio (np.array): Audio time series.
+        sr (int): Sampling rate.
+        fmin (float): Lowest f0 considered (Hz).
+        fmax (float): Highest f0 considered (Hz).
+        frame_length (int): Samples per analysis frame at the original rate.
+        hop_length (int): Hop between frames at the original rate.
+        threshold (float): Normalised autocorrelation peak above which a frame is voiced.
+        analysis_sr (int): Approximate rate after decimation.
+        center (bool): Centre frames as librosa does.
+    Returns:
+        tuple: f0 per frame in Hz (NaN for aperiodic frames) and the RMS of each frame.
+    """
+    factor = max(1, int(sr // analysis_sr))
+    while factor > 1 and hop_length % factor:
+        factor -= 1  # Keep frames aligned with the original hop
+    audio = np.asarray(audio, dtype=np.float32)
+    if factor > 1:
+        from scipy.signal import decimate  # scipy.signal is slow to import; load it on first use
+        audio = decimate(audio, factor, ftype='fir', zero_phase=True).astype(np.float32)
+    rate = sr / factor
+    frames = frame_audio(audio, frame_length // factor, hop_length // factor, center)
+    min_lag = max(1, int(np.floor(rate / fmax)))
+    max_lag = min(frames.shape[1] - 1, int(np.ceil(rate / fmin)))
+    f0 = np.full(len(frames), np.nan)
+    rms = _frame_rms(frames)
+    if len(frames) == 0 or max_lag <= min_lag:
+        return f0, rms
+    n_fft = 1 << int(np.ceil(np.log2(2 * frames.shape[1])))
+    window = np.hanning(frames.shape[1])
+    # Dividing by the window's own autocorrelation removes its bias towards short lags
+    window_spectrum = np.fft.rfft(window, n_fft)
+    window_ac = np.fft.irfft(np.abs(window_spectrum) ** 2, n_fft)[:max_lag + 2]
+    window_ac = window_ac / window_ac[0]
+
+    for start in range(0, len(frames), _FRAME_BATCH):
+        x = frames[start:start + _FRAME_BATCH].astype(np.float64)
+        x = (x - x.mean(axis=1, keepdims=True)) * window
+        spectrum = np.fft.rfft(x, n_fft)
+        ac = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n_fft)[:, :max_lag + 2]
+        ac = ac / np.maximum(ac[:, :1], 1e-12) / window_ac
+        search = ac[:, min_lag:max_lag + 1]
+        # Only true local maxima count, so the decaying slope near lag 0 is never picked;
+        # of those, the shortest lag close to the highest peak wins (avoids octave drops)
+        is_peak = (search >= ac[:, min_lag - 1:max_lag]) & (search >= ac[:, min_lag + 1:max_lag + 2])
+        peaks = np.where(is_peak, search, -np.inf)
+        strongest = peaks.max(axis=1, keepdims=True)
+        best = (peaks >= 0.9 * strongest).argmax(axis=1)
+        peak = np.where(is_peak.any(axis=1), search[np.arange(len(search)), best], 0)
+
+        lag = best + min_lag
+        left = ac[np.arange(len(ac)), lag - 1]
+        right = ac[np.arange(len(ac)), lag + 1]
+        denom = left - 2 * peak + right
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0)
+        period = lag + np.clip(shift, -1, 1)
+
+        voiced = peak > threshold
+        f0[start:start + len(x)] = np.where(voiced, rate / period, np.nan)
+    return f0, rms
+
+def trim_voicing_edges(f0):
+    """
+    Unvoice the first and last frame of every voiced run. Those frames straddle a
+    voicing onset/offset, which is where octave errors concentrate; isolated voiced
+    frames disappear entirely.
+    Args:
+        f0 (np.array): f0 per frame, NaN for unvoiced frames.
+    Returns:
+        np.array: Cleaned copy of f0.
+    """
+    voiced = ~np.isnan(f0)
+    padded = np.pad(voiced, 1)
+    interior = voiced & padded[:-2] & padded[2:]
+    return np.where(interior, f0, np.nan)
+
+def f0_candidates(audio, sr, backend='yin', frame_length=2048, hop_length=512, center=True):
+    """
+    Per-frame f0 candidates and frame RMS from the selected backend, before the
+    energy gate (which needs the loudest frame of the whole recording).
+    Args:
+        audio (np.array): Audio time series.
+        sr (int): Sampling rate.
+        backend (str): 'yin' or 'autocorr'.
+        frame_length (int): Samples per analysis frame.
+        hop_length (int): Hop between frames in samples.
+        center (bool): Centre frames as librosa does; False for pre-framed streaming blocks.
+    Returns:
+        tuple: f0 candidates (NaN for aperiodic frames) and RMS per frame.
+    """
+    if backend == 'yin':
+        return yin_candidates(audio, sr, frame_length=frame_length, hop_length=hop_length, center=center)
+    if backend == 'autocorr':
+        return autocorr_candidates(audio, sr, frame_length=frame_length, hop_length=hop_length, center=center)
+    raise ValueError(f"Unknown per-frame pitch backend '{backend}'; expected 'yin' or 'autocorr'")
+
+def voice_f0(f0, rms, silence_ratio=0.05):
+    """
+    Apply the energy gate (frames quieter than silence_ratio of the loudest frame
+    are unvoiced) and trim voiced-run edges.
+    Args:
+        f0 (np.array): f0 candidates per frame.
+        rms (np.array): RMS per frame.
+        silence_ratio (float): Gate relative to the loudest frame.
+    Returns:
+        np.array: f0 per frame in Hz, NaN for unvoiced frames.
+    """
+    loudest = rms.max() if len(rms) else 0
+    return trim_voicing_edges(np.where(rms >= silence_ratio * loudest, f0, np.nan))
+
+def estimate_f0(audio, sr, backend='yin', frame_length=2048, hop_length=512, center=True):
+    """
+    One f0 value per frame from the selected backend.
+    Args:
+        audio (np.array): Audio time series.
+        sr (int): Sampling rate.
+        backend (str): 'yin' or 'autocorr'.
+        frame_length (int): Samples per analysis frame.
+        hop_length (int): Hop between frames in samples.
+        center (bool): Centre frames as librosa does.
+    Returns:
+        np.array: f0 per frame in Hz, NaN for unvoiced frames (voiced-run edges trimmed).
+    """
+    return voice_f0(*f0_candidates(audio, sr, backend, frame_length, hop_length, center))
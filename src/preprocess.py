@@ -1,66 +1,285 @@
+import io
 import librosa
-import whisper
 import numpy as np
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from src.config import WHISPER_MODEL_SIZE, ANALYSIS_SR, TRANSCRIPTION_BATCHING, TIMING_FEATURES
+from src.model_registry import get_whisper_model, whisper_lock
+from src.metrics import timed, loaded_seconds, signal_seconds, file_seconds
+from src.transcription import WHISPER_SR, resample_for_whisper, get_transcription_service
+from src.vad import gate_for_whisper, map_words, report_saving
+from src.feature_extraction import extract_audio_features
 
+# Times map_audio_files replaces a broken worker pool before giving up on the
+# files still waiting
+MAX_POOL_RESTARTS = 3
+
+@timed('load_audio', audio_seconds=loaded_seconds)
 def load_audio(audio_path):
     """
-    Load audio file using librosa.
+    Load audio file using librosa, resampled to ANALYSIS_SR when it is set.
     Args:
         audio_path (str): Path to audio file (WAV/MP3/FLAC).
     Returns:
-        tuple: Audio time series (numpy array) and sampling rate.
+        tuple: Audio time series (float32 numpy array) and sampling rate.
     """
     try:
-        audio, sr = librosa.load(audio_path, sr=None)
+        audio, sr = librosa.load(audio_path, sr=ANALYSIS_SR)
         print(f"Loaded {audio_path}")
         return audio, sr
     except Exception as e:
         print(f"Error loading {audio_path}: {e}")
         return None, None
 
-def speech_to_text(audio_path):
+@timed('load_audio', audio_seconds=loaded_seconds)
+def load_audio_bytes(data):
+    """
+    Decode audio held in memory (WAV/MP3/FLAC through libsndfile) without a temp file.
+    Args:
+        data (bytes): Encoded audio file contents.
+    Returns:
+        tuple: Audio time series and sampling rate, or (None, None) if decoding fails.
+    """
+    try:
+        audio, sr = librosa.load(io.BytesIO(data), sr=ANALYSIS_SR)
+        return audio, sr
+    except Exception as e:
+        print(f"Error decoding {len(data)} bytes of audio: {e}")
+        return None, None
+
+@timed('transcription', audio_seconds=file_seconds)
+def speech_to_text(audio_path, model=None):
     """
     Convert speech to text using Whisper.
     Args:
         audio_path (str): Path to audio file.
+        model (whisper.Whisper): Loaded model; defaults to the process-wide registry model.
     Returns:
         str: Transcribed text or None if transcription fails.
     """
     try:
-        model = whisper.load_model("tiny")  # 'tiny' for speed, use 'base' for better accuracy
-        result = model.transcribe(audio_path)
+        model = model or get_whisper_model()
+        with whisper_lock:
+            result = model.transcribe(audio_path)
         print(f"Transcribed {audio_path}")
         return result["text"].lower()
     except Exception as e:
         print(f"Whisper transcription failed for {audio_path}: {e}")
         return None
 
-def preprocess_audio_files(audio_dir):
+@timed('transcription', audio_seconds=signal_seconds)
+def transcribe_segment(audio, sr, model=None):
     """
-    Preprocess all audio files in a directory.
+    Transcribe an in-memory audio segment with Whisper. With TRANSCRIPTION_BATCHING
+    on (and no explicit model), the segment goes through the shared batching
+    service so concurrent callers share decoder passes; otherwise concurrent
+    callers take turns on the model (see whisper_lock).
+    Args:
+        audio (np.array): Mono audio samples.
+        sr (int): Sampling rate (resampled to Whisper's 16 kHz if different).
+        model (whisper.Whisper): Loaded model; defaults to the process-wide registry model.
+    Returns:
+        str: Transcribed text or None if transcription fails.
+    """
+    if len(audio) == 0:
+        return ''
+    try:
+        if TRANSCRIPTION_BATCHING and model is None:
+            return get_transcription_service().transcribe(audio, sr).lower()
+        model = model or get_whisper_model()
+        with whisper_lock:
+            result = model.transcribe(resample_for_whisper(audio, sr))
+        return result["text"].lower()
+    except Exception as e:
+        print(f"Whisper transcription failed for a {len(audio) / sr:.1f}s segment: {e}")
+        return None
+
+def _whisper_input_seconds(result, audio, *args, **kwargs):
+    return file_seconds(result, audio) if isinstance(audio, str) else len(audio) / WHISPER_SR
+
+@timed('transcription', audio_seconds=_whisper_input_seconds)
+def transcribe_words(audio, model=None):
+    """
+    Transcribe with Whisper, keeping word-level timestamps (timing feature mode).
+    Args:
+        audio (str or np.array): Path to audio file, or 16 kHz float32 audio.
+        model (whisper.Whisper): Loaded model; defaults to the process-wide registry model.
+    Returns:
+        tuple: Lower-cased text and a list of (word, start, end) tuples in seconds,
+            or (None, None) if transcription fails.
+    """
+    if not isinstance(audio, str) and len(audio) == 0:
+        return '', []
+    try:
+        model = model or get_whisper_model()
+        with whisper_lock:
+            result = model.transcribe(audio, word_timestamps=True)
+        words = [(word['word'], word['start'], word['end'])
+                 for segment in result['segments'] for word in segment.get('words', [])]
+        return result["text"].lower(), words
+    except Exception as e:
+        print(f"Whisper transcription failed: {e}")
+        return None, None
+
+def preprocess_file(file_path, model=None):
+    """
+    Load, transcribe and extract the audio features of a single audio file. The
+    file is decoded once; Whisper transcribes the same buffer (already at its 16 kHz
+    unless ANALYSIS_SR says otherwise) instead of decoding the file again through
+    ffmpeg, with long silences cut by the voice-activity gate (VAD_ENABLED), which
+    reuses the RMS envelope of the audio features.
+    Args:
+        file_path (str): Path to audio file.
+        model (whisper.Whisper): Loaded model; defaults to the process-wide registry model.
+    Returns:
+        dict: Audio, sampling rate, text, Whisper word timestamps (None outside
+            the timing feature mode) and audio features (None if their extraction
+            failed), or None if the audio cannot be loaded.
+    """
+    audio, sr = load_audio(file_path)
+    if audio is None:
+        return None
+    audio_features, rms = extract_audio_features(audio, sr, return_rms=True)
+    whisper_audio, spans = gate_for_whisper(audio, sr, rms)
+    start = time.perf_counter()
+    # An explicit model keeps file transcription on model.transcribe, outside the batching service
+    if TIMING_FEATURES:
+        text, words = transcribe_words(whisper_audio, model or get_whisper_model())
+        words = map_words(words, spans)
+    else:
+        text, words = transcribe_segment(whisper_audio, WHISPER_SR, model or get_whisper_model()), None
+    report_saving(len(audio) / sr, spans, time.perf_counter() - start, os.path.basename(file_path))
+    return {'audio': audio, 'sr': sr, 'text': text, 'words': words, 'audio_features': audio_features}
+
+def list_audio_files(audio_dir):
+    """
+    List the audio files in a directory in a fixed (sorted) order.
     Args:
         audio_dir (str): Directory containing audio files.
     Returns:
-        dict: Mapping of file names to (audio, sr, text).
+        list: Audio file names, or an empty list if the directory is missing.
     """
     if not os.path.exists(audio_dir):
         print(f"Error: Directory {audio_dir} does not exist")
-        return {}
-    
-    audio_files = [f for f in os.listdir(audio_dir) if f.endswith(('.wav', '.mp3', '.flac'))]
+        return []
+    audio_files = sorted(f for f in os.listdir(audio_dir) if f.endswith(('.wav', '.mp3', '.flac')))
     if not audio_files:
         print(f"Warning: No audio files found in {audio_dir}")
+    return audio_files
+
+def _init_worker(model_size, num_threads):
+    """
+    Pool initializer: pin torch threads and warm this worker's own Whisper model
+    (skipped when model_size is None).
+    """
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    if model_size is not None:
+        get_whisper_model(model_size)
+
+def _safe_call(func, file_path):
+    """
+    Run func on one file, turning any exception into a None result.
+    """
+    try:
+        return func(file_path)
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
+
+def _isolated_call(func, file_path, initargs):
+    """
+    Run func on one file in a fresh single-worker pool, so a file that crashes its
+    worker only loses its own result.
+    """
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=initargs) as executor:
+        try:
+            return executor.submit(_safe_call, func, file_path).result()
+        except BrokenProcessPool as e:
+            print(f"Worker crashed on {file_path}, skipping it: {e}")
+            return None
+
+def map_audio_files(func, file_paths, num_workers=1, model_size=None):
+    """
+    Apply func to every file, in a process pool when num_workers > 1. A worker that
+    dies (e.g. killed for memory, or failing to start) breaks the whole pool; the
+    first unfinished file is then retried alone, so a file that crashes its worker
+    again is skipped, and the other unfinished files go to a fresh pool, up to
+    MAX_POOL_RESTARTS times.
+    Args:
+        func (callable): Picklable function taking a file path.
+        file_paths (list): Paths to process.
+        num_workers (int): Number of worker processes (1 runs in this process).
+        model_size (str): Whisper model each worker warms at startup.
+    Yields:
+        tuple: (file_path, result) in the order of file_paths; result is None for failed files.
+    """
+    if num_workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            yield file_path, _safe_call(func, file_path)
+        return
+
+    num_workers = min(num_workers, len(file_paths))
+    initargs = (model_size or WHISPER_MODEL_SIZE, max(1, (os.cpu_count() or 1) // num_workers))
+    remaining = list(file_paths)
+    restarts = 0
+    while remaining:
+        broken_at = None
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(remaining)), initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            futures = [executor.submit(_safe_call, func, file_path) for file_path in remaining]
+            for index, (file_path, future) in enumerate(zip(remaining, futures)):
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken_at = index
+                    break
+                except Exception as e:
+                    print(f"Worker failed on {file_path}: {e}")
+                    result = None
+                yield file_path, result
+        if broken_at is None:
+            return
+        remaining = remaining[broken_at:]
+        restarts += 1
+        if restarts > MAX_POOL_RESTARTS:
+            print(f"Worker pool broke {restarts} times; skipping the {len(remaining)} files still waiting")
+            for file_path in remaining:
+                yield file_path, None
+            return
+        print(f"Worker pool broke while {len(remaining)} files were waiting; retrying {remaining[0]} alone")
+        yield remaining[0], _isolated_call(func, remaining[0], initargs)
+        remaining = remaining[1:]
+
+def preprocess_audio_files(audio_dir, model=None, num_workers=1):
+    """
+    Preprocess all audio files in a directory.
+    Args:
+        audio_dir (str): Directory containing audio files.
+        model (whisper.Whisper): Loaded model for sequential runs; defaults to the process-wide registry model.
+        num_workers (int): Number of worker processes; each keeps its own warm model.
+    Returns:
+        dict: Mapping of file names to preprocess_file results, in sorted file order.
+    """
+    audio_files = list_audio_files(audio_dir)
+    if not audio_files:
         return {}
     
     print(f"Found {len(audio_files)} audio files in {audio_dir}: {audio_files}")
+    if num_workers > 1:
+        func = preprocess_file
+    else:
+        func = partial(preprocess_file, model=model or get_whisper_model())
+    file_paths = [os.path.join(audio_dir, f) for f in audio_files]
     processed_data = {}
-    for file_name in audio_files:
-        file_path = os.path.join(audio_dir, file_name)
-        audio, sr = load_audio(file_path)
-        if audio is None:
-            continue
-        text = speech_to_text(file_path)
-        processed_data[file_name] = {'audio': audio, 'sr': sr, 'text': text}
+    for file_path, data in map_audio_files(func, file_paths, num_workers):
+        if data is not None:
+            processed_data[os.path.basename(file_path)] = data
     print(f"Processed {len(processed_data)}/{len(audio_files)} files successfully")
-    return processed_data
\ No newline at end of file
+    return processed_data
@@ -0,0 +1,186 @@
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.config import RESULTS_STORE_DIR
+from src.schema import FEATURE_SCHEMA, FEATURE_NAMES, as_feature_table
+
+# Feature columns stored for every sample, typed as in the feature schema
+FEATURE_TYPES = {name: pa.from_numpy_dtype(np.dtype(dtype)) for name, dtype in FEATURE_SCHEMA}
+FEATURE_COLUMNS = list(FEATURE_NAMES)
+
+RESULTS_SCHEMA = pa.schema([
+    ('sample_id', pa.string()),
+    *FEATURE_TYPES.items(),
+    ('anomaly', pa.bool_()),
+    ('anomaly_score', pa.float64()),
+    ('risk_score', pa.float64()),
+    ('recorded_at', pa.timestamp('ms', tz='UTC'))
+])
+
+RUNS_SCHEMA = pa.schema([
+    ('started_at', pa.timestamp('ms', tz='UTC')),
+    ('finished_at', pa.timestamp('ms', tz='UTC')),
+    ('n_samples', pa.int64()),
+    ('whisper_model', pa.string()),
+    ('feature_signature', pa.string()),
+    ('anomaly_model_version', pa.int64()),
+    ('sklearn_version', pa.string()),
+    ('timings', pa.map_(pa.string(), pa.float64()))
+])
+
+# Both tables are partitioned by run id in hive layout: <table>/run_id=<id>/<file>.parquet
+_PARTITIONING = ds.partitioning(pa.schema([('run_id', pa.string())]), flavor='hive')
+
+def new_run_id():
+    """
+    Return a new run id; ids sort in the order runs were started.
+    """
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:6]}"
+
+def results_table(features, anomaly_results, risk_scores):
+    """
+    Build the typed results table for scored samples, one column at a time.
+    Args:
+        features (FeatureTable or dict): Features of the samples.
+        anomaly_results (dict): Anomaly detection results.
+        risk_scores (dict): Calculated risk scores.
+    Returns:
+        pa.Table: Table with RESULTS_SCHEMA.
+    """
+    table = as_feature_table(features)
+    sample_ids = table.keys()
+    columns = {'sample_id': sample_ids}
+    for name in FEATURE_COLUMNS:
+        # Missing features (NaN) are stored as null
+        columns[name] = pa.array(table.column(name), from_pandas=True).cast(FEATURE_TYPES[name])
+    columns['anomaly'] = [bool(anomaly_results[s]['is_anomaly']) for s in sample_ids]
+    columns['anomaly_score'] = [float(anomaly_results[s]['anomaly_score']) for s in sample_ids]
+    columns['risk_score'] = [float(risk_scores[s]) for s in sample_ids]
+    columns['recorded_at'] = [pd.Timestamp.now(tz='UTC')] * len(sample_ids)
+    return pa.table(columns, schema=RESULTS_SCHEMA)
+
+class ResultsStore:
+    """
+    Append-only, columnar store of pipeline results.
+
+    Scored samples go to <root>/samples and one metadata row per run (model
+    versions, timings) to <root>/runs, both as Parquet partitioned by run id.
+    Every append writes a new file, so nothing written earlier is rewritten, and
+    reads only load the requested columns and runs.
+    """
+
+    def __init__(self, root=RESULTS_STORE_DIR):
+        self.root = root
+
+    def _write(self, table_name, run_id, table):
+        partition = os.path.join(self.root, table_name, f"run_id={run_id}")
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, f"part-{time.time_ns()}-{os.getpid()}.parquet")
+        # Dot-prefixed files are ignored by readers until the rename makes them visible
+        tmp_path = os.path.join(partition, f".{os.path.basename(path)}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def _read(self, table_name, schema, columns=None, run_ids=None):
+        path = os.path.join(self.root, table_name)
+        full_schema = schema.append(pa.field('run_id', pa.string()))
+        if not os.path.isdir(path):
+            return full_schema.empty_table().select(columns or full_schema.names).to_pandas()
+        dataset = ds.dataset(path, schema=full_schema, format='parquet', partitioning=_PARTITIONING)
+        row_filter = ds.field('run_id').isin(list(run_ids)) if run_ids is not None else None
+        return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+    def append(self, run_id, features, anomaly_results, risk_scores):
+        """
+        Append scored samples to a run; a run may be appended to any number of times.
+        Args:
+            run_id (str): Run id from new_run_id.
+            features (FeatureTable or dict): Features of the samples.
+            anomaly_results (dict): Anomaly detection results.
+            risk_scores (dict): Calculated risk scores.
+        Returns:
+            str: Path of the written file.
+        """
+        path = self._write('samples', run_id, results_table(features, anomaly_results, risk_scores))
+        print(f"Appended {len(features)} results to run {run_id} in {self.root}")
+        return path
+
+    def record_run(self, run_id, started_at, n_samples, models, timings):
+        """
+        Store the metadata of a finished run.
+        Args:
+            run_id (str): Run id.
+            started_at (float): Start time as a Unix timestamp.
+            n_samples (int): Number of samples scored.
+            models (dict): 'whisper_model', 'feature_signature', 'anomaly_model_version'
+                and 'sklearn_version'.
+            timings (dict): Mapping of stage names to seconds.
+        """
+        row = {
+            'started_at': pd.Timestamp(started_at, unit='s', tz='UTC'),
+            'finished_at': pd.Timestamp.now(tz='UTC'),
+            'n_samples': n_samples,
+            **{name: models.get(name) for name in RUNS_SCHEMA.names if name in models},
+            'timings': list(timings.items())
+        }
+        columns = {name: [row.get(name)] for name in RUNS_SCHEMA.names}
+        self._write('runs', run_id, pa.table(columns, schema=RUNS_SCHEMA))
+
+    def read(self, columns=None, run_ids=None):
+        """
+        Read stored results, loading only the requested columns and runs.
+        Args:
+            columns (list): Columns to load (default all, plus 'run_id').
+            run_ids (list): Runs to load (default all).
+        Returns:
+            pd.DataFrame: One row per stored sample.
+        """
+        return self._read('samples', RESULTS_SCHEMA, columns, run_ids)
+
+    def runs(self):
+        """
+        Metadata of all recorded runs, oldest first.
+        Returns:
+            pd.DataFrame: One row per run, with 'timings' as a dict.
+        """
+        df = self._read('runs', RUNS_SCHEMA)
+        df['timings'] = [dict(t) if t is not None else {} for t in df['timings']]
+        return df.sort_values('run_id', ignore_index=True)
+
+    def run_ids(self):
+        """
+        Ids of all runs with stored results, oldest first.
+        """
+        path = os.path.join(self.root, 'samples')
+        if not os.path.isdir(path):
+            return []
+        return sorted(name.split('=', 1)[1] for name in os.listdir(path) if name.startswith('run_id='))
+
+    def latest_run_id(self):
+        """
+        Id of the most recent run with stored results, or None.
+        """
+        run_ids = self.run_ids()
+        return run_ids[-1] if run_ids else None
+
+    def export_csv(self, output_path, run_id=None):
+        """
+        Write one run's results (default the latest) to a CSV file for spreadsheet use.
+        Returns:
+            pd.DataFrame: The exported results.
+        """
+        run_id = run_id or self.latest_run_id()
+        df = self.read(columns=['sample_id', *FEATURE_COLUMNS, 'anomaly', 'anomaly_score', 'risk_score'],
+                       run_ids=[run_id])
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        df.to_csv(output_path, index=False, encoding='utf-8')
+        print(f"Exported {len(df)} results of run {run_id} to {output_path}")
+        return df
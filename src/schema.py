@@ -0,0 +1,150 @@
+import numpy as np
+
+from src.config import TIMING_FEATURES
+
+# The one definition of a sample's features: name and the type it is stored as
+# (results store, JSON). In memory every feature is a float64 column.
+FEATURE_SCHEMA = (
+    ('pause_co', 'int64'),
+    ('pause_avg', 'float64'),
+    ('pause_p90', 'float64'),
+    ('speech_ratio', 'float64'),
+    ('avg_spec', 'float64'),
+    ('ra_pitch', 'float64'),
+    ('vari', 'float64'),
+    ('hesitation', 'int64'),
+    ('lexical_div', 'float64'),
+    ('ttr', 'float64'),
+    ('mattr', 'float64'),
+    ('incompleteness', 'float64'),
+    ('semantic', 'int64')
+)
+# Added by the timing feature mode (see feature_extraction.timing_features)
+TIMING_SCHEMA = (
+    ('word_pause_avg', 'float64'),
+    ('hesitation_pause', 'float64')
+)
+if TIMING_FEATURES:
+    FEATURE_SCHEMA += TIMING_SCHEMA
+FEATURE_NAMES = tuple(name for name, _ in FEATURE_SCHEMA)
+FEATURE_DTYPE = np.dtype([(name, np.float64) for name in FEATURE_NAMES])
+
+class FeatureTable:
+    """
+    Fixed-schema features of many samples in one contiguous structured array.
+
+    Rows are FEATURE_DTYPE records; since every field is float64 the table is also
+    available as an (n_samples, n_features) matrix view without copying. The table
+    behaves like the dict of per-sample feature dicts it replaces (iteration over
+    sample ids, `in`, `table[sample_id]`, item assignment), so stages accept either.
+    Missing features are NaN.
+    """
+
+    __slots__ = ('_data', '_size', '_sample_ids', '_index')
+
+    def __init__(self, capacity=0):
+        self._data = np.zeros(capacity, dtype=FEATURE_DTYPE)
+        self._size = 0
+        self._sample_ids = []
+        self._index = {}
+
+    @classmethod
+    def from_dicts(cls, features):
+        """
+        Build a table from a mapping of sample ids to feature dicts.
+        """
+        table = cls(len(features))
+        for sample_id, feature_values in features.items():
+            table[sample_id] = feature_values
+        return table
+
+    @classmethod
+    def from_matrix(cls, sample_ids, matrix):
+        """
+        Build a table from sample ids and an (n_samples, n_features) array in FEATURE_NAMES order.
+        """
+        matrix = np.ascontiguousarray(matrix, dtype=np.float64).reshape(len(sample_ids), len(FEATURE_NAMES))
+        table = cls()
+        table._data = matrix.view(FEATURE_DTYPE).reshape(-1).copy()
+        table._size = len(sample_ids)
+        table._sample_ids = list(sample_ids)
+        table._index = {sample_id: i for i, sample_id in enumerate(table._sample_ids)}
+        return table
+
+    @property
+    def records(self):
+        """
+        Structured array of the stored rows (a view).
+        """
+        return self._data[:self._size]
+
+    @property
+    def matrix(self):
+        """
+        (n_samples, n_features) float64 view of the stored rows, columns in FEATURE_NAMES order.
+        """
+        return self.records.view(np.float64).reshape(self._size, len(FEATURE_NAMES))
+
+    @property
+    def sample_ids(self):
+        return list(self._sample_ids)
+
+    def column(self, name):
+        """
+        One feature for every sample (a view).
+        """
+        return self.records[name]
+
+    def __setitem__(self, sample_id, feature_values):
+        row = self._index.get(sample_id)
+        if row is None:
+            if self._size == len(self._data):
+                # Amortized growth, as with list.append
+                grown = np.zeros(max(16, 2 * len(self._data)), dtype=FEATURE_DTYPE)
+                grown[:self._size] = self._data[:self._size]
+                self._data = grown
+            row = self._size
+            self._size += 1
+            self._sample_ids.append(sample_id)
+            self._index[sample_id] = row
+        self._data[row] = tuple(float(feature_values.get(name, np.nan)) for name in FEATURE_NAMES)
+
+    def __getitem__(self, sample_id):
+        values = self._data[self._index[sample_id]]
+        return {name: float(values[name]) for name in FEATURE_NAMES}
+
+    def __contains__(self, sample_id):
+        return sample_id in self._index
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self._sample_ids)
+
+    def keys(self):
+        return list(self._sample_ids)
+
+    def items(self):
+        return ((sample_id, self[sample_id]) for sample_id in self._sample_ids)
+
+    def to_dicts(self):
+        """
+        Mapping of sample ids to feature dicts of Python floats.
+        """
+        return dict(self.items())
+
+    def to_frame(self):
+        """
+        DataFrame with one row per sample, indexed by sample id.
+        """
+        import pandas as pd  # Only needed here; keeps pandas out of the scoring import path
+        return pd.DataFrame(self.matrix, index=self._sample_ids, columns=list(FEATURE_NAMES))
+
+def as_feature_table(features):
+    """
+    Return features as a FeatureTable, converting a dict of per-sample feature dicts.
+    """
+    if isinstance(features, FeatureTable):
+        return features
+    return FeatureTable.from_dicts(features)
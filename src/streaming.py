@@ -0,0 +1,348 @@
+import os
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from src.config import (STFT_N_FFT, STFT_HOP_LENGTH, PITCH_BACKEND, STREAM_BLOCK_SECONDS, STREAM_UPDATE_SECONDS,
+                        TIMING_FEATURES)
+from src.feature_extraction import mel_db, tempo_from_onset, pitch_stats, transcript_features
+from src.metrics import timed, file_seconds
+from src.modeling import score_sample
+from src.pauses import PauseTracker
+from src.pitch import f0_candidates, voice_f0
+from src.preprocess import transcribe_segment, transcribe_words
+from src.transcription import resample_for_whisper
+
+def _to_mono_float(block):
+    """
+    Convert a (frames,) or (frames, channels) block of PCM or float samples to mono float32,
+    scaled like librosa.load.
+    """
+    if block.dtype == np.uint8:
+        block = (block.astype(np.float32) - 128) / 128
+    elif np.issubdtype(block.dtype, np.integer):
+        block = block.astype(np.float32) / float(-np.iinfo(block.dtype).min)
+    else:
+        block = block.astype(np.float32, copy=False)
+    if block.ndim > 1:
+        block = block.mean(axis=1)
+    return block
+
+def open_audio_blocks(audio_path, block_seconds=STREAM_BLOCK_SECONDS):
+    """
+    Open an audio file for block-wise reading without decoding it all at once.
+    PCM/float WAV files are memory-mapped; FLAC and other formats libsndfile
+    supports are streamed block by block.
+    Args:
+        audio_path (str): Path to audio file.
+        block_seconds (float): Length of each block in seconds.
+    Returns:
+        tuple: Native sampling rate and a generator of mono float32 blocks.
+    """
+    if audio_path.lower().endswith('.wav'):
+        from scipy.io import wavfile  # Only long batch recordings need it
+        try:
+            sr, data = wavfile.read(audio_path, mmap=True)
+        except Exception:
+            data = None  # e.g. 24-bit or compressed WAV: fall back to libsndfile
+        if data is not None:
+            block_frames = max(1, int(block_seconds * sr))
+            def wav_blocks():
+                for start in range(0, len(data), block_frames):
+                    yield _to_mono_float(np.asarray(data[start:start + block_frames]))
+            return sr, wav_blocks()
+
+    info = sf.info(audio_path)
+    block_frames = max(1, int(block_seconds * info.samplerate))
+    def sf_blocks():
+        with sf.SoundFile(audio_path) as f:
+            for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                yield block.mean(axis=1)
+    return info.samplerate, sf_blocks()
+
+def iter_audio_blocks(audio_path, block_seconds=STREAM_BLOCK_SECONDS, target_sr=None):
+    """
+    Read an audio file as mono float32 blocks, optionally resampled on the fly.
+    Args:
+        audio_path (str): Path to audio file.
+        block_seconds (float): Length of each block in seconds (at the native rate).
+        target_sr (int): Analysis rate to resample to; None keeps the native rate.
+    Returns:
+        tuple: Output sampling rate and a generator of blocks.
+    """
+    sr, blocks = open_audio_blocks(audio_path, block_seconds)
+    if not target_sr or target_sr == sr:
+        return sr, blocks
+
+    import soxr  # Streaming resampler used by librosa's default 'soxr_hq'
+
+    def resampled():
+        stream = soxr.ResampleStream(sr, target_sr, 1, dtype='float32', quality='HQ')
+        for block in blocks:
+            out = stream.resample_chunk(block)
+            if len(out):
+                yield out
+        tail = stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+        if len(tail):
+            yield tail
+    return target_sr, resampled()
+
+class StreamingAudioFeatures:
+    """
+    Audio features updated block by block.
+
+    Incoming samples are framed exactly like the whole-file STFT (centre padding
+    included), and only small per-frame summaries are kept: RMS, onset strength and
+    the pitch estimate. Feature values can be read at any time with features(), and
+    match extract_audio_features on the whole recording after finalize(), up to the
+    onset envelope's dB clipping, which uses the running rather than global maximum.
+    With speech_rate off (timing feature mode) no onset strength is kept and
+    avg_spec is left to timing_features.
+    """
+
+    def __init__(self, sr, n_fft=STFT_N_FFT, hop_length=STFT_HOP_LENGTH, pitch_backend=PITCH_BACKEND,
+                 speech_rate=not TIMING_FEATURES):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.pitch_backend = pitch_backend
+        self.speech_rate = speech_rate
+        self.n_samples = 0
+        self.finalized = False
+        self._buffer = np.zeros(n_fft // 2, dtype=np.float32)  # Centre padding
+        self._pauses = PauseTracker(sr, hop_length)
+        self._onset, self._f0, self._f0_rms = [], [], []
+        # Onset envelope is shifted by lag + n_fft // (2 * hop), as librosa does
+        self._onset.append(np.zeros(1 + n_fft // (2 * hop_length), dtype=np.float32))
+        self._prev_mel = None
+        self._mel_max = -np.inf
+        # Running count/mean/M2/min/max of piptrack values
+        self._pitch_count, self._pitch_mean, self._pitch_m2 = 0, 0.0, 0.0
+        self._pitch_min, self._pitch_max = np.inf, -np.inf
+
+    @property
+    def n_frames(self):
+        return self._pauses.n_frames
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sr
+
+    def update(self, block):
+        """
+        Feed the next block of mono samples.
+        Args:
+            block (np.array): Audio samples at self.sr.
+        """
+        if self.finalized:
+            raise RuntimeError("Cannot update a finalized StreamingAudioFeatures")
+        block = np.asarray(block, dtype=np.float32)
+        self.n_samples += len(block)
+        self._buffer = np.concatenate([self._buffer, block])
+        self._process_complete_frames()
+
+    def finalize(self):
+        """
+        Flush the trailing frames (with centre padding) and return the final features.
+        Returns:
+            dict: Audio features.
+        """
+        if not self.finalized:
+            self._buffer = np.concatenate([self._buffer, np.zeros(self.n_fft // 2, dtype=np.float32)])
+            self._process_complete_frames()
+            self._buffer = np.zeros(0, dtype=np.float32)
+            self.finalized = True
+        return self.features()
+
+    def _process_complete_frames(self):
+        n_frames = 1 + (len(self._buffer) - self.n_fft) // self.hop_length if len(self._buffer) >= self.n_fft else 0
+        if n_frames <= 0:
+            return
+        segment = self._buffer[:(n_frames - 1) * self.hop_length + self.n_fft]
+        self._process(segment)
+        self._buffer = self._buffer[n_frames * self.hop_length:].copy()
+
+    def _process(self, segment):
+        S = np.abs(librosa.stft(segment, n_fft=self.n_fft, hop_length=self.hop_length, center=False)).astype(np.float32)
+        self._pauses.update(librosa.feature.rms(S=S, frame_length=self.n_fft)[0])
+
+        if self.speech_rate:
+            # Onset strength: positive mel dB increase over the previous frame, median over bands
+            mel = mel_db(S, self.sr)
+            self._mel_max = max(self._mel_max, float(mel.max()))
+            mel = np.maximum(mel, self._mel_max - 80.0)
+            if self._prev_mel is not None:
+                mel = np.concatenate([self._prev_mel, mel], axis=1)
+            self._onset.append(np.median(np.maximum(0.0, mel[:, 1:] - mel[:, :-1]), axis=0).astype(np.float32))
+            self._prev_mel = mel[:, -1:]
+
+        if self.pitch_backend == 'piptrack':
+            pitches, magnitudes = librosa.piptrack(S=S, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+            self._update_pitch_stats(pitches[magnitudes > 0])
+        else:
+            f0, rms = f0_candidates(segment, self.sr, self.pitch_backend, self.n_fft, self.hop_length, center=False)
+            self._f0.append(f0.astype(np.float32))
+            self._f0_rms.append(rms.astype(np.float32))
+
+    def _update_pitch_stats(self, values):
+        """
+        Merge a block of pitch values into the running statistics (Chan et al.).
+        """
+        if len(values) == 0:
+            return
+        values = values.astype(np.float64)
+        count = len(values)
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self._pitch_count + count
+        delta = mean - self._pitch_mean
+        self._pitch_mean += delta * count / total
+        self._pitch_m2 += m2 + delta ** 2 * self._pitch_count * count / total
+        self._pitch_count = total
+        self._pitch_min = min(self._pitch_min, values.min())
+        self._pitch_max = max(self._pitch_max, values.max())
+
+    def features(self):
+        """
+        Features over everything processed so far (provisional until finalize()).
+        Returns:
+            dict: Audio features in the same format as extract_audio_features.
+        """
+        n_frames = self.n_frames
+        if n_frames == 0:
+            features = {'pause_co': 0, 'pause_avg': 0, 'pause_p90': 0, 'speech_ratio': 0, 'ra_pitch': 0, 'vari': 0}
+            if self.speech_rate:
+                features['avg_spec'] = 0
+            return features
+        features = self._pauses.stats()
+        if self.pitch_backend == 'piptrack':
+            if self._pitch_count:
+                ra_pitch = self._pitch_max - self._pitch_min
+                vari = self._pitch_m2 / self._pitch_count
+            else:
+                ra_pitch, vari = 0, 0
+        else:
+            f0 = voice_f0(np.concatenate(self._f0).astype(np.float64), np.concatenate(self._f0_rms))
+            ra_pitch, vari = pitch_stats(f0[~np.isnan(f0)])
+        features['ra_pitch'], features['vari'] = ra_pitch, vari
+        if self.speech_rate:
+            onset_env = np.concatenate(self._onset)[:n_frames]
+            features['avg_spec'] = tempo_from_onset(onset_env, self.sr, self.hop_length) if n_frames > 1 else 0
+        return features
+
+@timed('extract_audio_features', audio_seconds=file_seconds)
+def extract_audio_features_streaming(audio_path, target_sr=None, block_seconds=STREAM_BLOCK_SECONDS,
+                                     n_fft=STFT_N_FFT, hop_length=STFT_HOP_LENGTH, pitch_backend=PITCH_BACKEND):
+    """
+    Extract audio features from a file block by block, without holding the decoded signal.
+    Args:
+        audio_path (str): Path to audio file (WAV is memory-mapped, FLAC is streamed).
+        target_sr (int): Analysis rate to resample to; None keeps the native rate.
+        block_seconds (float): Length of each read block in seconds.
+        n_fft (int): FFT window size.
+        hop_length (int): Hop between frames in samples.
+        pitch_backend (str): Pitch estimator, see feature_extraction.pitch_features.
+    Returns:
+        dict: Audio features, or None if extraction fails.
+    """
+    try:
+        sr, blocks = iter_audio_blocks(audio_path, block_seconds, target_sr)
+        extractor = StreamingAudioFeatures(sr, n_fft, hop_length, pitch_backend)
+        for block in blocks:
+            extractor.update(block)
+        print(f"Streamed {os.path.basename(audio_path)} ({extractor.duration:.1f}s)")
+        return extractor.finalize()
+    except Exception as e:
+        print(f"Error extracting streaming audio features from {audio_path}: {e}")
+        return None
+
+def audio_duration(audio_path):
+    """
+    Duration in seconds from the file header, or None if it cannot be read without decoding.
+    """
+    try:
+        return sf.info(audio_path).duration
+    except Exception:
+        return None
+
+class StreamingSession:
+    """
+    Live analysis of an incoming audio stream.
+
+    Samples are fed as they arrive; every interval_seconds of audio the new audio is
+    transcribed (unless a transcript was supplied) and a provisional result with the
+    features so far and their anomaly/risk score is produced. finish() flushes the
+    remaining audio and returns the final result.
+    """
+
+    def __init__(self, sr, interval_seconds=STREAM_UPDATE_SECONDS, anomaly_model=None,
+                 transcript=None, transcribe=True, model=None):
+        self.sr = sr
+        self.interval = max(1, int(interval_seconds * sr))
+        self.anomaly_model = anomaly_model
+        self.model = model
+        self.audio = StreamingAudioFeatures(sr)
+        self.transcript_parts = [transcript.strip()] if transcript and transcript.strip() else []
+        # Whisper word timestamps in stream time (timing feature mode)
+        self.words = []
+        self.transcribe = transcribe and not self.transcript_parts
+        self._segment = []
+        self._next_update = self.interval
+
+    @property
+    def transcript(self):
+        return ' '.join(self.transcript_parts)
+
+    def feed(self, samples):
+        """
+        Add newly received samples.
+        Args:
+            samples (np.array): Mono audio samples at self.sr.
+        Returns:
+            list: Provisional results due after these samples (empty or one result).
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) == 0:
+            return []
+        self.audio.update(samples)
+        if self.transcribe:
+            self._segment.append(samples)
+        if self.audio.n_samples < self._next_update:
+            return []
+        self._next_update = (self.audio.n_samples // self.interval + 1) * self.interval
+        self._transcribe_segment()
+        return [self._result(self.audio.features(), final=False)]
+
+    def finish(self):
+        """
+        Flush the stream and return the final result.
+        """
+        features = self.audio.finalize()
+        self._transcribe_segment()
+        return self._result(features, final=True)
+
+    def _transcribe_segment(self):
+        if not self._segment:
+            return
+        segment = np.concatenate(self._segment)
+        self._segment = []
+        if TIMING_FEATURES:
+            offset = (self.audio.n_samples - len(segment)) / self.sr
+            text, words = transcribe_words(resample_for_whisper(segment, self.sr), self.model)
+            self.words.extend((word, start + offset, end + offset) for word, start, end in words or [])
+        else:
+            text = transcribe_segment(segment, self.sr, self.model)
+        if text and text.strip():
+            self.transcript_parts.append(text.strip())
+
+    def _result(self, audio_features, final):
+        feature_values = {**audio_features, **transcript_features(self.transcript, self.words, self.audio.duration)}
+        feature_values = {k: v.item() if isinstance(v, np.generic) else v for k, v in feature_values.items()}
+        return {
+            'type': 'final' if final else 'update',
+            'seconds': round(self.audio.duration, 3),
+            'features': feature_values,
+            'transcript': self.transcript,
+            **score_sample(feature_values, self.anomaly_model)
+        }
@@ -0,0 +1,254 @@
+import re
+import threading
+import numpy as np
+from src.config import NLTK_DATA_DIR, TEXT_TOKENIZER, NUM_WORKERS
+from src.metrics import timed, timer
+
+# Words counted as hesitations in transcripts. Like NLTK's tokens, word tokens are
+# matched case-sensitively.
+HESITATION_MARKERS = frozenset(('uh', 'um', 'er', 'ah'))
+
+# Abbreviations whose period never ends a sentence (lowercase, without the final
+# period). punkt's English model knows these too.
+ABBREVIATIONS = frozenset(('mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'jr', 'sr', 'vs', 'u.s'))
+
+# Tokens per window of the moving-average type-token ratio
+MATTR_WINDOW = 50
+
+# Transcripts per task handed to a worker process by extract_text_features_batch
+TEXT_BATCH_CHUNK = 256
+
+# Contractions split the way NLTK's Treebank tokenizer splits them (can not, gon na,
+# got ta, gim me, lem me, wan na, do n't, ca n't, 't is, 't was), as one pass that
+# inserts spaces before word tokenization. Texts containing none of
+# _CONTRACTION_KEYS (lowercased) skip the pass.
+_CONTRACTION_RE = re.compile(r"\b(?i:(can)(not)|(gon|got|gim|lem)(na|ta|me)|(wan)(na)(?![\w-]))\b"
+                             r"|(?<=\w)(?i:(n't)(?![\w-]))|(?<!\w)(?i:('t)(is|was))\b")
+_CONTRACTION_KEYS = ("'t", 'cannot', 'gonna', 'gotta', 'gimme', 'lemme', 'wanna')
+
+# Word tokens as the Treebank tokenizer splits them: runs of word characters
+# joined by hyphens, periods or apostrophes (commas and colons only before a
+# digit, as in 1,000 or 3:30), keeping a single trailing hyphen. A final period
+# stays on the token where punkt does not end a sentence: after an abbreviation
+# unless it ends the text, and after an initial or a number followed by a
+# lowercase (ASCII) chunk, the rules of sentence_counts.
+# Clitics ('s, 'm, 'd, 'll, 're, 've, and 't after the contraction split) match
+# the first branches, which have no group: NLTK's tokens for them start with an
+# apostrophe and are not words. Like NLTK's two passes, a clitic followed by
+# another one stays attached unless it is 's, 'm or 'd before 'll, 're or 've.
+_CLITIC = r"'(?i:(?:s|m|d)(?![\w-]|'(?:s|m|d|ll|re|ve)\b)|(?:ll|re|ve)(?![\w-]|'(?:ll|re|ve)\b))"
+# One fixed-width lookbehind per abbreviation, checked only before a period
+_ABBREVIATION_END = '|'.join(rf"(?<=(?<![\w.'-])(?i:{re.escape(abbreviation)}))" for abbreviation in ABBREVIATIONS)
+_CLOSING = r"[\"')\]}]*"
+_WORD_RE = re.compile(
+    rf"{_CLITIC}|'(?i:t)(?=\s)"
+    rf"|(\d+(?:[-.,:]\d+)*\.(?={_CLOSING}\s+[a-z])"
+    rf"|\w+(?:[-.]\w+|[,:]\d\w*|'(?!{_CLITIC[1:]})\w+)*"
+    rf"(?:-(?!-)|(?=\.)(?:(?:{_ABBREVIATION_END})\.(?!{_CLOSING}\s*\Z)"
+    rf"|(?<=(?<![\w.'-])[^\W\d_])\.(?={_CLOSING}\s+[a-z])))?)"
+)
+
+# Numbers (including times such as 3:30, which punkt splits at the colon) and
+# initials: punkt continues the sentence after their period when the next chunk
+# is lowercase
+_NUMBER_OR_INITIAL_RE = re.compile(r"-?[.,]?\d[\d,.:-]*$|[^\W\d]$")
+
+# A sentence break candidate, as in punkt: a whitespace-delimited chunk that ends in
+# . ? or ! (plus closing quotes or brackets) and is followed by another chunk
+_SENTENCE_END_RE = re.compile(r"(?<!\S)(\S*?)([.?!]+)([\"')\]}]*)(?=\s+(\S))")
+
+# NLTK sentence/word tokenizers, loaded on first use by get_tokenizers
+_tokenizers = None
+_tokenizers_lock = threading.Lock()
+
+def ensure_tokenizer_data(download=True):
+    """
+    Make NLTK's punkt_tab tokenizer data available. Data already installed (in
+    NLTK_DATA_DIR or NLTK's default locations) is used without touching the network;
+    otherwise it is downloaded to NLTK_DATA_DIR if download is True.
+    Returns:
+        bool: Whether the data is available.
+    """
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.append(NLTK_DATA_DIR)
+    try:
+        nltk.data.find('tokenizers/punkt_tab/english/')
+        return True
+    except LookupError:
+        if not download:
+            return False
+    print(f"NLTK punkt_tab data not found, downloading it to {NLTK_DATA_DIR}")
+    return nltk.download('punkt_tab', download_dir=NLTK_DATA_DIR, quiet=True)
+
+def get_tokenizers():
+    """
+    Return NLTK's (sent_tokenize, word_tokenize), importing NLTK on first use.
+    NLTK pulls in scipy.stats and more, so processes that never use the 'nltk'
+    tokenizer never pay for it.
+    """
+    global _tokenizers
+    if _tokenizers is None:
+        with _tokenizers_lock:
+            if _tokenizers is None:
+                ensure_tokenizer_data()
+                from nltk.tokenize import sent_tokenize, word_tokenize
+                _tokenizers = (sent_tokenize, word_tokenize)
+    return _tokenizers
+
+def sentence_counts(text):
+    """
+    Number of sentences and of complete sentences (ending in . ! or ?) in a text,
+    split by punkt's rules. A chunk ending in . ? or ! ends a sentence, except after
+    a known abbreviation, or after a number or an initial followed by a lowercase
+    chunk. An ellipsis ends one only before a capitalized chunk, which approximates
+    the orthographic heuristic of punkt's English model.
+    Args:
+        text (str): Transcript.
+    Returns:
+        tuple: (sentences, complete sentences).
+    """
+    if not text.strip():
+        return 0, 0
+    sentences, complete = 1, 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        body, terminal, closing, next_chunk = match.groups()
+        if terminal == '.':
+            word = body.lstrip('(["\'{')
+            if word.lower() in ABBREVIATIONS or (next_chunk[0].islower() and _NUMBER_OR_INITIAL_RE.match(word)):
+                continue
+        elif terminal.strip('.') == '' and not next_chunk[0].isupper():
+            continue
+        sentences += 1
+        complete += not closing
+    complete += text.rstrip().endswith(('.', '!', '?'))
+    return sentences, complete
+
+def word_tokens(text):
+    """
+    Word tokens of a text as NLTK's word_tokenize splits them (don't gives do and
+    n't), without punctuation and apostrophe clitics such as 's.
+    """
+    lower = text.lower()
+    if any(key in lower for key in _CONTRACTION_KEYS):
+        text = _CONTRACTION_RE.sub(_split_contraction, text)
+    return [token for token in _WORD_RE.findall(text) if token]
+
+def _split_contraction(match):
+    return ' ' + ' '.join(part for part in match.groups() if part) + ' '
+
+def mattr(ids, window=MATTR_WINDOW):
+    """
+    Moving-average type-token ratio: the mean share of distinct types over every
+    window of `window` tokens, computed without a Python loop. A token is the first
+    of its type in the windows that start after its previous occurrence, so each
+    token adds to a contiguous range of windows. Texts shorter than the window
+    return their type-token ratio.
+    Args:
+        ids (np.array): Integer type id of each token.
+        window (int): Window length in tokens.
+    Returns:
+        float: MATTR in the [0, 1] range (0 for no tokens).
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    n = len(ids)
+    if n == 0:
+        return 0.0
+    if n <= window:
+        return len(np.unique(ids)) / n
+    order = np.argsort(ids, kind='stable')
+    same = ids[order[1:]] == ids[order[:-1]]
+    previous = np.full(n, -1)
+    previous[order[1:][same]] = order[:-1][same]
+    positions = np.arange(n)
+    first = np.maximum(previous + 1, positions - window + 1)
+    last = np.minimum(positions, n - window)
+    return float(np.maximum(last - first + 1, 0).sum() / ((n - window + 1) * window))
+
+def text_features(text, tokenizer=TEXT_TOKENIZER):
+    """
+    Text features of one transcript (the untimed core of extract_text_features).
+    Args:
+        text (str): Transcribed text.
+        tokenizer (str): 'regex' or 'nltk' (see TEXT_TOKENIZER).
+    Returns:
+        dict: Text features.
+    """
+    if not text:
+        return {
+            'hesitation': 0,
+            'lexical_div': 0,
+            'ttr': 0,
+            'mattr': 0,
+            'incompleteness': 0,
+            'semantic': 0
+        }
+
+    if tokenizer == 'nltk':
+        sent_tokenize, word_tokenize = get_tokenizers()
+        sentences = sent_tokenize(text)
+        n_sentences = len(sentences)
+        complete_sentences = sum(1 for s in sentences if s.endswith(('.', '!', '?')))
+        tokens = [token for token in word_tokenize(text) if token[0].isalnum()]
+    else:
+        n_sentences, complete_sentences = sentence_counts(text)
+        tokens = word_tokens(text)
+
+    # Hesitation markers
+    hesitation = sum(map(HESITATION_MARKERS.__contains__, tokens))
+
+    # Hesitations per sentence, kept under its historical name
+    lexical_div = hesitation / n_sentences if n_sentences else 0
+
+    # Lexical diversity: type-token ratio and its length-independent moving average
+    types = {}
+    ids = [types.setdefault(token.lower(), len(types)) for token in tokens]
+    ttr = len(types) / len(ids) if ids else 0
+
+    # Incompleteness (inverse of sentence completion)
+    sentence_completion = complete_sentences / n_sentences if n_sentences else 0
+    incompleteness = 1 - sentence_completion if sentence_completion < 1 else 0
+
+    # Semantic (placeholder, based on incompleteness threshold)
+    semantic = 1 if incompleteness > 0.5 else 0
+
+    return {
+        'hesitation': hesitation,
+        'lexical_div': lexical_div,
+        'ttr': ttr,
+        'mattr': mattr(ids),
+        'incompleteness': incompleteness,
+        'semantic': semantic
+    }
+
+@timed('extract_text_features')
+def extract_text_features(text):
+    """
+    Extract text-based features (hesitations, lexical diversity, incompleteness, semantic).
+    Args:
+        text (str): Transcribed text.
+    Returns:
+        dict: Text features.
+    """
+    return text_features(text)
+
+def extract_text_features_batch(texts, num_workers=NUM_WORKERS, chunk_size=TEXT_BATCH_CHUNK, tokenizer=TEXT_TOKENIZER):
+    """
+    Text features of many transcripts, e.g. to re-score a transcript corpus without
+    its audio. Batches larger than one chunk are spread over a process pool.
+    Args:
+        texts (iterable): Transcripts.
+        num_workers (int): Worker processes (1 runs in this process).
+        chunk_size (int): Transcripts per worker task.
+        tokenizer (str): 'regex' or 'nltk' (see TEXT_TOKENIZER).
+    Returns:
+        list: Text feature dicts, in the order of texts.
+    """
+    texts = list(texts)
+    with timer('extract_text_features_batch'):
+        if num_workers <= 1 or len(texts) <= chunk_size:
+            return [text_features(text, tokenizer) for text in texts]
+        from concurrent.futures import ProcessPoolExecutor  # Only needed for large batches
+        num_workers = min(num_workers, -(-len(texts) // chunk_size))
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            return list(executor.map(text_features, texts, [tokenizer] * len(texts), chunksize=chunk_size))
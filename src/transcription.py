@@ -0,0 +1,212 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import librosa
+import numpy as np
+
+from src.config import WHISPER_BATCH_SIZE, WHISPER_MAX_WAIT_MS
+from src.model_registry import get_whisper_model, whisper_lock
+
+# Sampling rate Whisper expects for in-memory audio
+WHISPER_SR = 16000
+# Whisper's fixed input window: 30 seconds of 16 kHz audio
+SEGMENT_SAMPLES = 30 * WHISPER_SR
+
+def resample_for_whisper(audio, sr):
+    """
+    Convert mono audio to float32 at Whisper's 16 kHz.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if sr != WHISPER_SR:
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=WHISPER_SR)
+    return audio
+
+def split_segments(audio):
+    """
+    Split 16 kHz audio into consecutive 30-second segments (at least one).
+    """
+    return [audio[start:start + SEGMENT_SAMPLES] for start in range(0, max(len(audio), 1), SEGMENT_SAMPLES)]
+
+def decode_segments(model, segments):
+    """
+    Transcribe segments of up to 30 seconds in one batched decoder pass, holding
+    whisper_lock since direct transcribe calls may share the model.
+    Args:
+        model (whisper.Whisper): Loaded model.
+        segments (list): 16 kHz float32 arrays of at most 30 seconds.
+    Returns:
+        list: Text of each segment.
+    """
+    import torch
+    import whisper
+
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(segment), n_mels=model.dims.n_mels)
+        for segment in segments
+    ]).to(model.device)
+    options = whisper.DecodingOptions(fp16=False, without_timestamps=True)
+    with whisper_lock:
+        results = whisper.decode(model, mels, options)
+    return [result.text for result in results]
+
+class _Transcription:
+    """
+    Collects the segment texts of one submitted clip and resolves its future.
+    """
+
+    def __init__(self, n_segments):
+        self.future = Future()
+        self.texts = [None] * n_segments
+        self.remaining = n_segments
+        self.lock = threading.Lock()
+
+    def segment_done(self, index, text=None, error=None):
+        with self.lock:
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+                return
+            self.texts[index] = text.strip()
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.future.set_result(' '.join(t for t in self.texts if t))
+
+class TranscriptionService:
+    """
+    Local Whisper transcription queue with dynamic batching.
+
+    Callers submit in-memory audio and get a concurrent.futures.Future. Clips are
+    split into 30-second segments, and one background thread groups pending
+    segments from all callers into batched decoder passes: a batch is decoded as
+    soon as it holds batch_size segments or max_wait seconds after its first segment
+    arrived, whichever comes first. Each segment is decoded independently (greedy,
+    no temperature fallback or conditioning on the previous segment), trading a
+    little accuracy on long clips for throughput.
+    """
+
+    def __init__(self, model=None, batch_size=WHISPER_BATCH_SIZE, max_wait=WHISPER_MAX_WAIT_MS / 1000):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.segments = 0
+        self.clips = 0
+        self.decode_time = 0.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, audio, sr=WHISPER_SR):
+        """
+        Queue a clip for transcription.
+        Args:
+            audio (np.array): Mono audio samples.
+            sr (int): Sampling rate (resampled to 16 kHz if different).
+        Returns:
+            concurrent.futures.Future: Resolves to the transcript text.
+        """
+        segments = split_segments(resample_for_whisper(audio, sr))
+        job = _Transcription(len(segments))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Transcription service has been shut down")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='whisper-batcher', daemon=True)
+                self._thread.start()
+            self.clips += 1
+        for index, segment in enumerate(segments):
+            self._queue.put((job, index, segment))
+        return job.future
+
+    def transcribe(self, audio, sr=WHISPER_SR, timeout=None):
+        """
+        Transcribe a clip, blocking until its batch has been decoded.
+        """
+        return self.submit(audio, sr).result(timeout)
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        model = self.model
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            try:
+                model = model or get_whisper_model()
+                texts = decode_segments(model, [segment for _, _, segment in batch])
+            except Exception as e:
+                print(f"Batched Whisper decoding failed for {len(batch)} segments: {e}")
+                for job, index, _ in batch:
+                    job.segment_done(index, error=e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.segments += len(batch)
+                self.decode_time += time.perf_counter() - start
+            for (job, index, _), text in zip(batch, texts):
+                job.segment_done(index, text)
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting clips; already queued segments are still decoded.
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            if wait:
+                thread.join()
+
+    def stats(self):
+        """
+        Batching counters for this process.
+        Returns:
+            dict: Clips, segments, batches, mean batch size and decoder time.
+        """
+        with self._lock:
+            return {
+                'clips': self.clips,
+                'segments': self.segments,
+                'batches': self.batches,
+                'mean_batch_size': self.segments / self.batches if self.batches else 0.0,
+                'decode_time_s': self.decode_time
+            }
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_transcription_service():
+    """
+    Return the process-wide transcription service shared by every caller.
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = TranscriptionService()
+    return _service
@@ -0,0 +1,112 @@
+import numpy as np
+
+from src.config import VAD_ENABLED, VAD_MIN_SILENCE_SECONDS, VAD_PAD_SECONDS, STFT_N_FFT, STFT_HOP_LENGTH
+from src.feature_extraction import compute_spectrogram, frame_rms
+from src.metrics import timed, signal_seconds
+from src.pauses import segment_pauses
+from src.transcription import WHISPER_SR, resample_for_whisper
+
+def voiced_spans(rms, sr, hop_length, duration, min_silence=VAD_MIN_SILENCE_SECONDS, pad=VAD_PAD_SECONDS):
+    """
+    Time ranges of a clip to transcribe: everything except silences of at least
+    min_silence and the silence before the first and after the last sound. The
+    silences are found by the pause engine on the clip's frame RMS envelope (the one
+    the audio features use), and pad seconds of each silence are kept next to the speech.
+    Args:
+        rms (np.array): Frame RMS envelope of the clip.
+        sr (int): Sampling rate the envelope was computed at.
+        hop_length (int): Hop between RMS frames in samples.
+        duration (float): Clip length in seconds.
+        min_silence (float): Shortest silence (seconds) that is cut.
+        pad (float): Silence (seconds) kept on each side of the speech.
+    Returns:
+        np.array: (n_spans, 2) array of [start, end) times in seconds, empty when
+            the clip has no sound.
+    """
+    pad = min(pad, min_silence / 2)  # Spans of neighbouring speech never overlap
+    pauses = segment_pauses(rms, sr, hop_length, min_pause=min_silence)
+    if pauses['active_seconds'] == 0:
+        return np.zeros((0, 2))
+    active_end = pauses['active_start'] + pauses['active_seconds']
+    starts = np.concatenate(([pauses['active_start']], pauses['starts'] + pauses['durations'])) - pad
+    ends = np.concatenate((pauses['starts'], [active_end])) + pad
+    spans = np.clip(np.stack([starts, ends], axis=1), 0, duration)
+    return spans[spans[:, 1] > spans[:, 0]]
+
+@timed('vad', audio_seconds=signal_seconds)
+def gate_for_whisper(audio, sr, rms=None, n_fft=STFT_N_FFT, hop_length=STFT_HOP_LENGTH):
+    """
+    Whisper input for a decoded clip: 16 kHz float32 audio with long silences cut
+    when VAD_ENABLED is on.
+    Args:
+        audio (np.array): Mono audio samples.
+        sr (int): Sampling rate.
+        rms (np.array): The clip's frame RMS envelope from extract_audio_features
+            (return_rms=True). Only computed here, with the same STFT framing, when
+            it is not given (e.g. audio features came from the cache).
+        n_fft (int): FFT window size of the envelope.
+        hop_length (int): Hop between envelope frames in samples.
+    Returns:
+        tuple: The audio to transcribe, and the kept spans (in 16 kHz samples of the
+            original clip) or None when nothing was cut.
+    """
+    whisper_audio = resample_for_whisper(audio, sr)
+    if not VAD_ENABLED:
+        return whisper_audio, None
+    if rms is None:
+        rms = frame_rms(compute_spectrogram(audio, sr, n_fft, hop_length), n_fft)
+    spans = voiced_spans(rms, sr, hop_length, len(audio) / sr)
+    spans = np.clip(np.round(spans * WHISPER_SR), 0, len(whisper_audio)).astype(np.int64)
+    spans = spans[spans[:, 1] > spans[:, 0]]
+    if len(spans) == 1 and spans[0, 0] == 0 and spans[0, 1] == len(whisper_audio):
+        return whisper_audio, None
+    return np.concatenate([whisper_audio[start:end] for start, end in spans] or [whisper_audio[:0]]), spans
+
+def to_original_times(times, spans):
+    """
+    Map times (seconds) in gated audio back to the original clip's timeline.
+    Args:
+        times (np.array): Times in the audio returned by gate_for_whisper.
+        spans (np.array): Kept spans returned with it (None maps times unchanged).
+    Returns:
+        np.array: Times in the original clip.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if spans is None or len(spans) == 0:
+        return times
+    lengths = spans[:, 1] - spans[:, 0]
+    gated_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) / WHISPER_SR
+    span = np.clip(np.searchsorted(gated_starts, times, side='right') - 1, 0, len(spans) - 1)
+    return spans[span, 0] / WHISPER_SR + (times - gated_starts[span])
+
+def map_words(words, spans):
+    """
+    Map (word, start, end) timestamps from gated audio back to the original clip.
+    """
+    if not words or spans is None:
+        return words
+    starts = to_original_times([start for _, start, _ in words], spans)
+    # An end on a span boundary belongs to the span that ends there
+    ends = to_original_times([end - 1e-6 for _, _, end in words], spans) + 1e-6
+    return [(word, float(start), float(end)) for (word, _, _), start, end in zip(words, starts, ends)]
+
+def gated_seconds(spans, total_seconds):
+    """
+    Seconds of audio Whisper receives after gating (total_seconds without a gate).
+    """
+    return total_seconds if spans is None else float((spans[:, 1] - spans[:, 0]).sum()) / WHISPER_SR
+
+def report_saving(total_seconds, spans, transcription_seconds, name='clip'):
+    """
+    Print how much audio the gate cut and the transcription time it saved, assuming
+    Whisper's cost is proportional to audio length.
+    Returns:
+        float: Estimated seconds of transcription saved.
+    """
+    kept = gated_seconds(spans, total_seconds)
+    if kept >= total_seconds:
+        return 0.0
+    saved = transcription_seconds * (total_seconds - kept) / kept if kept else 0.0
+    print(f"VAD: transcribed {kept:.1f}s of {total_seconds:.1f}s of {name} "
+          f"({100 * (1 - kept / total_seconds):.0f}% cut), ~{saved:.2f}s of transcription saved")
+    return saved
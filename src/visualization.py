@@ -1,18 +1,36 @@
+import matplotlib
+matplotlib.use('Agg')  # Render to files only, also in worker processes
 import seaborn as sns
 import matplotlib.pyplot as plt
 import pandas as pd
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-def plot_feature_trends(features, output_path='results/plots/feature_trends.png'):
+from src.config import PLOT_WORKERS, PLOT_MAX_POINTS
+from src.metrics import timed
+from src.schema import FEATURE_NAMES
+from src.results_store import ResultsStore
+
+# Bump whenever plot code changes so cached plots are rendered again
+PLOT_VERSION = 2
+
+# Samples shown by name in the anomaly score bar chart (the highest scores)
+MAX_BARS = 50
+
+# Columns of the results store the plots need
+PLOT_COLUMNS = ['sample_id', *FEATURE_NAMES, 'anomaly', 'anomaly_score', 'risk_score']
+
+def plot_feature_trends(df, output_path='results/plots/feature_trends.png'):
     """
-    Plot trends for extracted features.
+    Plot the distribution of every feature across samples.
     Args:
-        features (dict): Feature dictionary.
+        df (pd.DataFrame): DataFrame with features.
         output_path (str): Path to save the plot.
     """
-    feature_df = pd.DataFrame.from_dict(features, orient='index')
     plt.figure(figsize=(12, 8))
-    sns.boxplot(data=feature_df)
+    sns.boxplot(data=df[list(FEATURE_NAMES)])
     plt.xticks(rotation=45)
     plt.title('Feature Distribution Across Samples')
     plt.tight_layout()
@@ -20,19 +38,22 @@ def plot_feature_trends(features, output_path='results/plots/feature_trends.png'
     plt.savefig(output_path)
     plt.close()
 
-def plot_anomaly_scores(anomaly_results, output_path='results/plots/anomaly_scores.png'):
+def plot_anomaly_scores(df, output_path='results/plots/anomaly_scores.png', max_bars=MAX_BARS):
     """
-    Plot anomaly scores for each sample.
+    Plot anomaly scores per sample (the max_bars highest for large cohorts).
     Args:
-        anomaly_results (dict): Anomaly detection results.
+        df (pd.DataFrame): DataFrame with 'sample_id' and 'anomaly_score'.
         output_path (str): Path to save the plot.
+        max_bars (int): Most samples shown.
     """
-    scores = {k: v['anomaly_score'] for k, v in anomaly_results.items()}
-    df = pd.DataFrame.from_dict(scores, orient='index', columns=['Anomaly Score'])
+    top = df.nlargest(max_bars, 'anomaly_score') if len(df) > max_bars else df
     plt.figure(figsize=(10, 6))
-    sns.barplot(x=df.index, y='Anomaly Score', data=df)
+    sns.barplot(x='sample_id', y='anomaly_score', data=top)
     plt.xticks(rotation=45)
-    plt.title('Anomaly Scores for Audio Samples')
+    plt.xlabel('')
+    plt.ylabel('Anomaly Score')
+    title = 'Anomaly Scores for Audio Samples'
+    plt.title(title if len(df) <= max_bars else f'{title} (top {max_bars} of {len(df)})')
     plt.tight_layout()
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     plt.savefig(output_path)
@@ -46,7 +67,7 @@ def plot_heatmap(df, output_path='results/plots/heatmap.png'):
         output_path (str): Path to save the plot.
     """
     plt.figure(figsize=(12, 8))
-    sns.heatmap(df.drop(columns=['sample_id', 'semantic_cluster', 'anomaly']).corr(), annot=True, cmap="coolwarm")
+    sns.heatmap(df[[*FEATURE_NAMES, 'risk_score']].corr(), annot=True, cmap="coolwarm")
     plt.title("Feature Correlation Heatmap")
     plt.tight_layout()
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -55,15 +76,15 @@ def plot_heatmap(df, output_path='results/plots/heatmap.png'):
 
 def plot_distributions(df, output_dir='results/plots'):
     """
-    Plot distributions of clusters and anomalies.
+    Plot distributions of the semantic flag and anomalies.
     Args:
         df (pd.DataFrame): DataFrame with features.
         output_dir (str): Directory to save plots.
     """
     os.makedirs(output_dir, exist_ok=True)
-    sns.countplot(x="semantic_cluster", data=df)
-    plt.title("Cluster Distribution")
-    plt.savefig(os.path.join(output_dir, "cluster_distribution.png"))
+    sns.countplot(x="semantic", data=df)
+    plt.title("Semantic Flag Distribution")
+    plt.savefig(os.path.join(output_dir, "semantic_distribution.png"))
     plt.close()
 
     sns.countplot(x="anomaly", data=df)
@@ -71,48 +92,150 @@ def plot_distributions(df, output_dir='results/plots'):
     plt.savefig(os.path.join(output_dir, "anomaly_distribution.png"))
     plt.close()
 
-def plot_pairwise(df, output_path='results/plots/pairplot.png'):
+def plot_pairwise(df, output_path='results/plots/pairplot.png', max_points=PLOT_MAX_POINTS):
     """
-    Plot pairwise feature comparisons.
+    Plot pairwise feature comparisons, on a fixed random sample for large cohorts.
     Args:
         df (pd.DataFrame): DataFrame with features.
         output_path (str): Path to save the plot.
+        max_points (int): Most samples drawn.
     """
-    selected = ["pause_avg", "avg_speech", "incompleteness", "lexical_div", "semantic_cluster"]
-    sns.pairplot(df[selected], hue="semantic_cluster")
-    plt.suptitle("Pairwise Feature Comparison", y=1.02)
+    selected = ["pause_avg", "avg_spec", "incompleteness", "lexical_div", "anomaly"]
+    data = df[selected]
+    if len(data) > max_points:
+        data = data.sample(n=max_points, random_state=0)
+    sns.pairplot(data, hue="anomaly", plot_kws={'s': 10 if len(data) > 500 else 40})
+    title = "Pairwise Feature Comparison"
+    plt.suptitle(title if len(df) <= max_points else f"{title} ({max_points} of {len(df)} samples)", y=1.02)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     plt.savefig(output_path)
     plt.close()
 
 def plot_box(df, output_dir='results/plots'):
     """
-    Plot box plots of features vs risk score.
+    Plot box plots of features per risk band.
     Args:
         df (pd.DataFrame): DataFrame with features.
         output_dir (str): Directory to save plots.
     """
     os.makedirs(output_dir, exist_ok=True)
+    risk_band = pd.cut(df['risk_score'], bins=[-0.01, 1 / 3, 2 / 3, 1.0], labels=['low', 'medium', 'high'])
     for col in ["pause_co", "incompleteness", "lexical_div"]:
-        sns.boxplot(x="risk_score", y=col, data=df)
+        sns.boxplot(x=risk_band, y=df[col], order=['low', 'medium', 'high'])
+        plt.xlabel("Risk Score")
         plt.title(f"{col} vs Risk Score")
         plt.savefig(os.path.join(output_dir, f"{col}_boxplot.png"))
         plt.close()
 
-def save_all_plots(df, output_dir='results/plots'):
+# Plot name -> (function taking (df, output target), columns it reads, files it writes).
+# Functions whose output target is a directory write several files.
+PLOTS = {
+    'heatmap': (plot_heatmap, [*FEATURE_NAMES, 'risk_score'], ['heatmap.png']),
+    'distributions': (plot_distributions, ['semantic', 'anomaly'],
+                      ['semantic_distribution.png', 'anomaly_distribution.png']),
+    'pairplot': (plot_pairwise, ["pause_avg", "avg_spec", "incompleteness", "lexical_div", "anomaly"], ['pairplot.png']),
+    'boxplots': (plot_box, ['pause_co', 'incompleteness', 'lexical_div', 'risk_score'],
+                 ['pause_co_boxplot.png', 'incompleteness_boxplot.png', 'lexical_div_boxplot.png']),
+    'feature_trends': (plot_feature_trends, list(FEATURE_NAMES), ['feature_trends.png']),
+    'anomaly_scores': (plot_anomaly_scores, ['sample_id', 'anomaly_score'], ['anomaly_scores.png'])
+}
+
+# Manifest of the data hash each plot was last rendered from
+_MANIFEST = '.plot_hashes.json'
+
+def data_hash(name, data):
+    """
+    Hash of a plot's input columns, row order included, plus the plot code version.
+    """
+    digest = hashlib.sha256(f"{PLOT_VERSION}.{name}".encode())
+    digest.update(','.join(data.columns).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _render(name, data, output_dir):
+    """
+    Render one plot; runs in a worker process.
     """
-    Save all visualizations.
+    func, _, files = PLOTS[name]
+    target = output_dir if len(files) > 1 else os.path.join(output_dir, files[0])
+    func(data, target)
+
+@timed('save_all_plots')
+def save_all_plots(df, output_dir='results/plots', num_workers=PLOT_WORKERS):
+    """
+    Render all visualizations, in parallel worker processes when num_workers > 1.
+    A plot is skipped when its input columns hash to the same value as when its
+    files were last written.
     Args:
-        df (pd.DataFrame): DataFrame with features.
+        df (pd.DataFrame): Results with PLOT_COLUMNS.
         output_dir (str): Directory to save all plots.
+        num_workers (int): Worker processes (1 renders in this process).
+    Returns:
+        dict: Mapping of plot names to 'rendered', 'unchanged' or 'failed'.
     """
     os.makedirs(output_dir, exist_ok=True)
-    plot_heatmap(df, os.path.join(output_dir, "heatmap.png"))
-    plot_distributions(df, output_dir)
-    plot_pairwise(df, os.path.join(output_dir, "pairplot.png"))
-    plot_box(df, output_dir)
-    plot_feature_trends(df.set_index('sample_id').to_dict(orient='index'), os.path.join(output_dir, "feature_trends.png"))
-    plot_anomaly_scores({row['sample_id']: {'anomaly_score': row['risk_score']} for row in df.to_dict(orient='records')}, os.path.join(output_dir, "anomaly_scores.png"))
-
-# Update pipeline.py to use save_all_plots
-# Note: This change is reflected in the pipeline.py update below
\ No newline at end of file
+    manifest_path = os.path.join(output_dir, _MANIFEST)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    status, jobs = {}, {}
+    for name, (_, columns, files) in PLOTS.items():
+        data = df[columns]
+        digest = data_hash(name, data)
+        if manifest.get(name) == digest and all(os.path.exists(os.path.join(output_dir, f)) for f in files):
+            status[name] = 'unchanged'
+        else:
+            jobs[name] = (data, digest)
+
+    def finished(name, error):
+        if error is None:
+            manifest[name] = jobs[name][1]
+            status[name] = 'rendered'
+        else:
+            print(f"Failed to render {name} plot: {error}")
+            manifest.pop(name, None)
+            status[name] = 'failed'
+
+    if num_workers <= 1 or len(jobs) <= 1:
+        for name, (data, _) in jobs.items():
+            try:
+                _render(name, data, output_dir)
+                finished(name, None)
+            except Exception as e:
+                finished(name, e)
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(jobs))) as executor:
+            futures = {name: executor.submit(_render, name, data, output_dir) for name, (data, _) in jobs.items()}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                    finished(name, None)
+                except Exception as e:
+                    finished(name, e)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Plots: {sum(s == 'rendered' for s in status.values())} rendered, "
+          f"{sum(s == 'unchanged' for s in status.values())} unchanged, "
+          f"{sum(s == 'failed' for s in status.values())} failed in {output_dir}")
+    return status
+
+def plot_run(run_id=None, output_dir='results/plots', store=None):
+    """
+    Render the plots of a stored pipeline run (default the latest).
+    Args:
+        run_id (str): Run id in the results store.
+        output_dir (str): Directory to save all plots.
+        store (ResultsStore): Store to read from (default the configured one).
+    Returns:
+        dict: Status of each plot, see save_all_plots.
+    """
+    store = store or ResultsStore()
+    run_id = run_id or store.latest_run_id()
+    if run_id is None:
+        print("No stored runs to plot")
+        return {}
+    return save_all_plots(store.read(columns=PLOT_COLUMNS, run_ids=[run_id]), output_dir)